@@ -0,0 +1,137 @@
+"""
+benchmarks.bench_logging
+~~~~~~~~~~~~~~~~~
+
+Measures what logging costs on the request path.
+
+The first table compares single calls: the ``print`` of a formatted message
+the request path used to make, a ``logger.debug`` call while the level is
+``INFO``, and a ``logger.info`` call handed to the :mod:`daemon.log` writer
+thread.
+
+The second table serves a JSON route hook through
+``HttpAdapter.handle_request`` together with the five per-request messages
+the server used to print (request line, MIME type, file loading, hook and
+proxy Host lines): printed as before, logged at ``DEBUG`` while the level is
+``INFO``, and logged at ``DEBUG`` with the level at ``DEBUG`` (queued to the
+writer thread).
+
+Output goes to ``os.devnull``, which is cheaper than a terminal or a pipe,
+so the gains shown are a lower bound.
+
+Usage::
+
+    python benchmarks/bench_logging.py
+"""
+
+import os
+import sys
+import time
+import logging
+import timeit
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from daemon import log
+from daemon.httpadapter import HttpAdapter
+from daemon.httpparser import HttpParser
+from daemon.router import Router
+
+CALLS = 100000
+
+REQUESTS = 20000
+
+ROUTED = (b"GET /api/status HTTP/1.1\r\nHost: localhost\r\n"
+          b"Cookie: auth=true\r\n\r\n")
+STATIC = (b"GET /login.html HTTP/1.1\r\nHost: localhost\r\n"
+          b"Accept-Encoding: identity\r\n\r\n")
+
+
+def status(headers, body):
+    return {"status": "ok"}
+
+
+def bench_calls(sink):
+    logger = logging.getLogger("daemon.bench")
+    addr, path = ("127.0.0.1", 50123), "/login.html"
+
+    def run_print():
+        for _ in range(CALLS):
+            print("[Response] {} path {} mime_type {}".format("GET", path, "text/html"), file=sink)
+
+    def run_disabled():
+        for _ in range(CALLS):
+            logger.debug("%s path %s mime_type %s", "GET", path, "text/html")
+
+    def run_queued():
+        for _ in range(CALLS):
+            logger.info("%s at Host: %s", addr, "localhost")
+
+    log.configure(level="INFO", stream=sink, force=True)
+    printed = min(timeit.repeat(run_print, number=1, repeat=3))
+    disabled = min(timeit.repeat(run_disabled, number=1, repeat=3))
+    queued = min(timeit.repeat(run_queued, number=1, repeat=3))
+    log.shutdown()
+
+    print("{:<34} {:>10}".format("call", "ns/call"))
+    for label, elapsed in (("print(str.format(...))", printed),
+                           ("logger.debug at INFO", disabled),
+                           ("logger.info, queued writer", queued)):
+        print("{:<34} {:>10.0f}".format(label, elapsed / CALLS * 1e9))
+
+
+def serve(adapter, router, emit):
+    start = time.perf_counter()
+    for _ in range(REQUESTS):
+        parser = HttpParser()
+        parser.feed(ROUTED)
+        parser.parse()
+        adapter.handle_request(parser, router)
+        emit()
+    return REQUESTS / (time.perf_counter() - start)
+
+
+def bench_requests(sink):
+    router = Router({("GET", "/api/status"): status}).compile()
+    adapter = HttpAdapter("127.0.0.1", 0, None, ("127.0.0.1", 0), router)
+    logger = logging.getLogger("daemon.bench")
+    addr, path = ("127.0.0.1", 50123), "/api/status"
+
+    def printed():
+        print("[Request] {} path {} version {}".format("GET", path, "HTTP/1.1"), file=sink)
+        print("[Response] processing MIME main_type={} sub_type={}".format("text", "html"), file=sink)
+        print("[Response] loading content from file: {}".format("www" + path), file=sink)
+        print("[HttpAdapter] hook in route-path METHOD {} PATH {}".format(path, ["GET"]), file=sink)
+        print("[Proxy] {} at Host: {}".format(addr, "localhost"), file=sink)
+
+    def logged():
+        logger.debug("%s path %s version %s", "GET", path, "HTTP/1.1")
+        logger.debug("processing MIME main_type=%s sub_type=%s", "text", "html")
+        logger.debug("loading content from file: %s", "www" + path)
+        logger.debug("hook in route-path METHOD %s PATH %s", path, ["GET"])
+        logger.debug("%s at Host: %s", addr, "localhost")
+
+    rows = []
+    log.configure(level="INFO", stream=sink, force=True)
+    rows.append(("print", max(serve(adapter, router, printed) for _ in range(3))))
+    rows.append(("logger.debug at INFO", max(serve(adapter, router, logged) for _ in range(3))))
+    log.configure(level="DEBUG", stream=sink, force=True)
+    rows.append(("logger.debug at DEBUG", max(serve(adapter, router, logged) for _ in range(3))))
+    log.shutdown()
+
+    print()
+    print("{:<34} {:>10} {:>8}".format("per-request messages", "req/s", "gain"))
+    for label, rate in rows:
+        print("{:<34} {:>10.0f} {:>7.2f}x".format(label, rate, rate / rows[0][1]))
+
+
+def main():
+    os.chdir(ROOT_DIR)
+    with open(os.devnull, "w") as sink:
+        bench_calls(sink)
+        bench_requests(sink)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+benchmarks.bench_metrics
+~~~~~~~~~~~~~~~~~
+
+Measures what recording a request in :mod:`daemon.metrics` costs.
+
+The first table times single calls from one thread: a counter increment and
+a histogram observation of a labelled series.
+
+The second table increments one counter series from several threads at once,
+with the per-thread cells of :mod:`daemon.metrics` and with a counter guarded
+by a single lock, the straightforward alternative.
+
+Usage::
+
+    python benchmarks/bench_metrics.py
+"""
+
+import os
+import sys
+import time
+import timeit
+import threading
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT_DIR)
+
+from daemon.metrics import Registry
+
+CALLS = 200000
+
+THREADS = (1, 4, 8, 16)
+
+
+class LockedCounter:
+    """One value behind one lock."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+
+def bench_calls(registry):
+    counter = registry.counter("calls_total", "", ("route", "method", "status"))
+    histogram = registry.histogram("calls_seconds", "", ("route", "method"))
+
+    def run_inc():
+        for _ in range(CALLS):
+            counter.labels("/peers/<int:port>", "GET", "200").inc()
+
+    def run_observe():
+        for _ in range(CALLS):
+            histogram.labels("/peers/<int:port>", "GET").observe(0.0042)
+
+    print("{:<34} {:>10}".format("call", "ns/call"))
+    for label, run in (("counter.labels(...).inc()", run_inc),
+                       ("histogram.labels(...).observe()", run_observe)):
+        elapsed = min(timeit.repeat(run, number=1, repeat=3))
+        print("{:<34} {:>10.0f}".format(label, elapsed / CALLS * 1e9))
+
+
+def contended(inc, threads):
+    per_thread = CALLS // threads
+
+    def work():
+        for _ in range(per_thread):
+            inc()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def bench_threads(registry):
+    cells = registry.counter("threads_total", "").labels()
+    locked = LockedCounter()
+
+    print()
+    print("{:<10} {:>14} {:>14} {:>8}".format("threads", "single lock/s", "cells/s", "gain"))
+    for threads in THREADS:
+        single = max(contended(locked.inc, threads) for _ in range(3))
+        per_thread = max(contended(cells.inc, threads) for _ in range(3))
+        print("{:<10} {:>14.0f} {:>14.0f} {:>7.2f}x".format(threads, single, per_thread, per_thread / single))
+
+
+def main():
+    registry = Registry()
+    bench_calls(registry)
+    bench_threads(registry)
+
+
+if __name__ == "__main__":
+    main()
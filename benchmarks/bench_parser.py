@@ -0,0 +1,130 @@
+"""
+benchmarks.bench_parser
+~~~~~~~~~~~~~~~~~
+
+Compares the request reading/parsing cost of the original implementation
+(``buffer += chunk``, full ``str`` decode, ``Request.prepare`` re-splitting the
+message) with :class:`HttpParser <HttpParser>` feeding
+``Request.prepare_from_parser``.
+
+Sockets are replaced by an in-memory source that returns the message in
+fixed-size segments, so only the parsing work is measured.
+
+Usage::
+
+    python benchmarks/bench_parser.py
+"""
+
+import io
+import os
+import sys
+import timeit
+import contextlib
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from daemon.request import Request
+from daemon.httpparser import HttpParser
+
+#: Size of the segments returned by one receive call.
+SEGMENT = 16384
+
+BODY_SIZES = (0, 1024, 64 * 1024, 1024 * 1024)
+
+
+class SegmentSource:
+    """Minimal socket stand-in serving one message in ``SEGMENT`` sized pieces."""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def recv(self, size):
+        chunk = self.data[self.pos:self.pos + min(size, SEGMENT)]
+        self.pos += len(chunk)
+        return bytes(chunk)
+
+    def recv_into(self, buffer):
+        n = min(len(buffer), SEGMENT, len(self.data) - self.pos)
+        buffer[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def build_message(body_size):
+    body = b"x" * body_size
+    head = (
+        "POST /submit-info HTTP/1.1\r\n"
+        "Host: 127.0.0.1:8000\r\n"
+        "User-Agent: Mozilla/5.0 (X11; Linux x86_64) Chrome/123.0.0.0\r\n"
+        "Accept: text/html,application/xhtml+xml,application/json;q=0.9\r\n"
+        "Accept-Language: en-US,en;q=0.9\r\n"
+        "Accept-Encoding: gzip, deflate\r\n"
+        "Content-Type: application/json\r\n"
+        "Cookie: auth=true; theme=dark\r\n"
+        "Connection: keep-alive\r\n"
+        "Content-Length: {}\r\n"
+        "\r\n"
+    ).format(body_size).encode()
+    return head + body
+
+
+def legacy(message):
+    """Reading and parsing as done before the incremental parser."""
+    conn = SegmentSource(message)
+    buffer = b""
+    while b"\r\n\r\n" not in buffer:
+        chunk = conn.recv(4096)
+        if not chunk:
+            break
+        buffer += chunk
+    headers_part, body_part = buffer.split(b"\r\n\r\n", 1)
+    content_length = 0
+    headers_str = headers_part.decode('utf-8', errors='ignore')
+    for line in headers_str.split('\r\n'):
+        if line.lower().startswith('content-length:'):
+            content_length = int(line.split(':')[1].strip())
+            break
+    while len(body_part) < content_length:
+        chunk = conn.recv(min(4096, content_length - len(body_part)))
+        if not chunk:
+            break
+        body_part += chunk
+    msg = (headers_part + b"\r\n\r\n" + body_part).decode('utf-8')
+    req = Request()
+    req.prepare(msg, {})
+    return req.body
+
+
+def incremental(message):
+    """Reading and parsing with :class:`HttpParser <HttpParser>`."""
+    conn = SegmentSource(message)
+    parser = HttpParser()
+    while not parser.parse():
+        if not parser.recv_from(conn):
+            break
+    req = Request()
+    req.prepare_from_parser(parser, {})
+    body = req.body
+    parser.consume()
+    return body
+
+
+def main():
+    print("{:>10} {:>14} {:>14} {:>8}".format("body", "legacy (us)", "parser (us)", "speedup"))
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        results = []
+        for size in BODY_SIZES:
+            message = build_message(size)
+            number = max(5, 20000 // (1 + size // 4096))
+            old = min(timeit.repeat(lambda: legacy(message), number=number, repeat=3)) / number
+            new = min(timeit.repeat(lambda: incremental(message), number=number, repeat=3)) / number
+            results.append((size, old, new))
+            sink.seek(0)
+            sink.truncate()
+    for size, old, new in results:
+        print("{:>10} {:>14.1f} {:>14.1f} {:>7.1f}x".format(size, old * 1e6, new * 1e6, old / new))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+benchmarks.bench_router
+~~~~~~~~~~~~~~~~~
+
+Compares route lookup with the original flat ``{(METHOD, path): hook}`` dict
+and with the compiled :class:`Router <Router>` as the number of routes grows.
+
+Each table has ``n`` static routes (``/api/v1/resource<i>/list``) and ``n``
+parametric ones (``/api/v1/resource<i>/<int:id>/items/<name>``). The dict can
+only serve the static half; the router serves both, so the parametric column
+has no dict counterpart.
+
+Usage::
+
+    python benchmarks/bench_router.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from daemon.router import Router
+
+ROUTE_COUNTS = (10, 100, 1000)
+
+LOOKUPS = 20000
+
+
+def handler(headers, body, **params):
+    return "HTTP/1.1 200 OK\r\n\r\n"
+
+
+def build(n):
+    routes = {}
+    for i in range(n):
+        routes[("GET", "/api/v1/resource{}/list".format(i))] = handler
+        routes[("GET", "/api/v1/resource{}/<int:id>/items/<name>".format(i))] = handler
+    return routes, Router(routes).compile()
+
+
+def dict_lookup(routes, method, path):
+    """Lookup as done by the original ``Request.prepare_hook``."""
+    path_without_query = path.split('?', 1)[0] if '?' in path else path
+    return routes.get((method, path_without_query))
+
+
+def main():
+    print("{:>7} {:>12} {:>14} {:>16}".format("routes", "dict (ns)", "router (ns)", "router param (ns)"))
+    for n in ROUTE_COUNTS:
+        routes, router = build(n)
+        static = ["/api/v1/resource{}/list".format(i % n) for i in range(LOOKUPS)]
+        param = ["/api/v1/resource{}/{}/items/name{}".format(i % n, i, i) for i in range(LOOKUPS)]
+
+        def run_dict():
+            for path in static:
+                dict_lookup(routes, "GET", path)
+
+        def run_router():
+            for path in static:
+                router.match("GET", path)
+
+        def run_param():
+            for path in param:
+                router.match("GET", path)
+
+        results = [min(timeit.repeat(fn, number=1, repeat=5)) / LOOKUPS * 1e9
+                   for fn in (run_dict, run_router, run_param)]
+        print("{:>7} {:>12.0f} {:>14.0f} {:>16.0f}".format(2 * n, *results))
+
+
+if __name__ == "__main__":
+    main()
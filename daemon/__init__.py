@@ -14,6 +14,7 @@ from .backend import create_backend
 from .proxy import create_proxy
 from .weaprous import WeApRous
 from .response import Response
+from .middleware import Middleware, CookieAuth, RequestLog, Timing, CORS, RequestMetrics
 from .request import Request
 from .backend import create_backend
 from .httpadapter import HttpAdapter
@@ -0,0 +1,448 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.assetcache
+~~~~~~~~~~~~~~~~~
+
+This module provides a process-wide cache of static assets (pages, styles,
+images) served by :meth:`Response.build_response <Response.build_response>`.
+
+An :class:`Asset <Asset>` keeps the MIME type, size, modification time and the
+pre-built ``Content-Type``/``Content-Length`` header block of one file, plus
+its bytes when the file is small enough. Serving a cached asset skips the MIME
+lookup, the directory selection and the disk read.
+
+Compressible assets also keep their gzip/deflate :class:`Variant <Variant>`
+objects, compressed once on first demand (see :mod:`daemon.compress`).
+
+Notes:
+------
+- Entries are keyed by the resolved file path; request paths are mapped to it
+  through an alias table so ``/`` and ``/index.html`` share one entry.
+- The cache is bounded by :data:`MAX_CACHE_BYTES` and evicts the least
+  recently used assets. Files larger than :data:`MAX_ASSET_SIZE` keep only
+  their metadata and are sent from disk with ``sendfile``.
+- A hit re-``stat``s the file at most once every :data:`CHECK_INTERVAL`
+  seconds; a changed size or mtime invalidates the entry.
+- A ``.gz`` sibling (``styles.css.gz``) at least as new as the file is used as
+  its gzip variant instead of compressing; it is looked up when the file is
+  loaded. Large files are only sent compressed through such a sibling.
+- Every representation carries a strong ``ETag`` (a digest of the bytes, or
+  size and mtime for files sent from disk) and ``Last-Modified``, so
+  :class:`Response <Response>` can answer conditional requests with 304.
+- ``Cache-Control`` comes from :data:`CACHE_POLICIES`, the longest matching
+  directory prefix winning; change it with :func:`set_cache_policy`.
+- Each worker process of a pre-forked backend has its own cache.
+
+Usage Example:
+--------------
+>>> asset = ASSET_CACHE.get("/index.html")
+>>> ASSET_CACHE.stats()
+{'hits': 10, 'misses': 2, ...}
+>>> set_cache_policy("static/images/", "public, max-age=604800, immutable")
+
+"""
+
+import os
+import time
+import hashlib
+import logging
+import threading
+from email.utils import formatdate
+from collections import OrderedDict
+
+from .compress import ENCODINGS, is_compressible, choose_encoding, compress
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+#: Upper bound of the bytes held by the cache.
+MAX_CACHE_BYTES = 32 * 1024 * 1024
+
+#: Larger files are never held in memory.
+MAX_ASSET_SIZE = 1024 * 1024
+
+#: Seconds between two freshness checks of the same asset.
+CHECK_INTERVAL = 1.0
+
+#: Cache-Control value per directory of the served file (relative to the
+#: working directory, with a trailing slash); "" is the default.
+CACHE_POLICIES = {
+    "": "no-cache",
+    "static/": "public, max-age=86400",
+}
+
+
+def set_cache_policy(directory, cache_control):
+    """
+    Set the Cache-Control value of the files under ``directory``.
+
+    :param directory (str): directory prefix, e.g. ``static/`` or ``www/``;
+                      ``""`` sets the default.
+    :param cache_control (str): header value, e.g. ``public, max-age=3600``.
+    """
+    directory = directory.strip("/")
+    CACHE_POLICIES[directory + "/" if directory else ""] = cache_control
+    # Header blocks already built carry the previous policy.
+    ASSET_CACHE.clear()
+
+
+def cache_policy(filepath):
+    """
+    :param filepath (str): resolved file path.
+    :rtype str: Cache-Control value of the longest matching directory prefix.
+    """
+    filepath = filepath.replace(os.sep, "/")
+    best = ""
+    for prefix in CACHE_POLICIES:
+        if len(prefix) > len(best) and filepath.startswith(prefix):
+            best = prefix
+    return CACHE_POLICIES.get(best, "no-cache")
+
+
+class Variant:
+    """A content-coded (gzip, deflate) version of an asset."""
+
+    __slots__ = ("encoding", "size", "content", "filepath",
+                 "etag", "validators", "header")
+
+    def __init__(self, asset, encoding, size, content=None, filepath=None):
+        self.encoding = encoding
+        self.size = size
+        #: Compressed bytes, or None when sent from ``filepath``.
+        self.content = content
+        #: ``.gz`` sibling holding the compressed body of a large asset.
+        self.filepath = filepath
+        self.etag, self.validators, self.header = asset.describe(size, encoding)
+
+
+class Asset:
+    """One cached file."""
+
+    __slots__ = ("filepath", "mime_type", "size", "mtime_ns", "content", "encoding",
+                 "compressible", "variants", "cache_control", "last_modified",
+                 "etag", "validators", "header", "checked")
+
+    def __init__(self, filepath, mime_type, size, mtime_ns, content):
+        self.filepath = filepath
+        self.mime_type = mime_type
+        self.size = size
+        self.mtime_ns = mtime_ns
+        #: File bytes, or None when the file is sent from disk.
+        self.content = content
+        #: The identity representation has no content coding.
+        self.encoding = None
+        self.compressible = is_compressible(mime_type)
+        #: Content coding -> Variant, or None when compressing did not pay off.
+        self.variants = {}
+        self.cache_control = cache_policy(filepath)
+        #: Seconds since the epoch, the resolution of Last-Modified.
+        self.last_modified = mtime_ns // 1000000000 if mtime_ns >= 0 else None
+
+        if content is not None:
+            tag = hashlib.blake2b(content, digest_size=8).hexdigest()
+        else:
+            tag = "{:x}-{:x}".format(size, max(mtime_ns, 0))
+        self.etag, self.validators, self.header = self.describe(size, tag=tag)
+        self.checked = time.monotonic()
+
+    def describe(self, length, encoding=None, tag=None):
+        """
+        Encode the header lines of one representation of this asset.
+
+        :param length (int): body size.
+        :param encoding (str): content coding of the body, if any.
+        :param tag (str): opaque ETag value; derived from the asset's by default.
+        :rtype tuple: (ETag, validator lines sent with 200 and 304 alike,
+                      every header line describing the body), the last two
+                      encoded, each line ending with CRLF.
+        """
+        if tag is None:
+            tag = self.etag.strip('"')
+        if encoding is not None:
+            tag = "{}-{}".format(tag, encoding)
+        etag = '"{}"'.format(tag)
+
+        lines = ["ETag: {}\r\n".format(etag)]
+        if self.last_modified is not None:
+            lines.append("Last-Modified: {}\r\n".format(formatdate(self.last_modified, usegmt=True)))
+        lines.append("Cache-Control: {}\r\n".format(self.cache_control))
+        if self.cache_control == "no-cache":
+            lines.append("Pragma: no-cache\r\n")
+        if self.compressible:
+            # The body depends on Accept-Encoding even when sent uncompressed.
+            lines.append("Vary: Accept-Encoding\r\n")
+        validators = "".join(lines).encode('latin-1')
+
+        body = ["Content-Type: {}\r\n".format(self.mime_type)]
+        if encoding is not None:
+            body.append("Content-Encoding: {}\r\n".format(encoding))
+        body.append("Content-Length: {}\r\nAccept-Ranges: bytes\r\n".format(length))
+        return etag, validators, "".join(body).encode('latin-1') + validators
+
+    @property
+    def memory(self):
+        """:rtype int: bytes accounted against the cache bound."""
+        total = len(self.header) + len(self.validators) + (len(self.content) if self.content is not None else 0)
+        for variant in self.variants.values():
+            if variant is not None:
+                total += len(variant.header) + len(variant.validators)
+                if variant.content is not None:
+                    total += len(variant.content)
+        return total
+
+    def matches(self, st):
+        """:rtype bool: whether ``st`` describes the cached version of the file."""
+        return st.st_size == self.size and st.st_mtime_ns == self.mtime_ns
+
+
+class AssetCache:
+    """
+    Thread-safe LRU cache of :class:`Asset <Asset>` objects.
+
+    Attributes:
+        max_bytes (int): upper bound of the cached bytes.
+        max_asset_size (int): largest file held in memory.
+        check_interval (float): seconds between freshness checks of an asset.
+        hits (int): lookups answered from the cache.
+        misses (int): lookups that had to go to disk.
+        invalidations (int): entries dropped because the file changed.
+        evictions (int): entries dropped to stay under ``max_bytes``.
+    """
+
+    __attrs__ = [
+        "max_bytes",
+        "max_asset_size",
+        "check_interval",
+        "hits",
+        "misses",
+        "invalidations",
+        "evictions",
+    ]
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, max_asset_size=MAX_ASSET_SIZE,
+                 check_interval=CHECK_INTERVAL):
+        """
+        Initialize a new AssetCache instance.
+
+        :param max_bytes (int): upper bound of the cached bytes.
+        :param max_asset_size (int): largest file held in memory.
+        :param check_interval (float): seconds between freshness checks of an asset.
+        """
+        self.max_bytes = max_bytes
+        self.max_asset_size = max_asset_size
+        self.check_interval = check_interval
+
+        self._lock = threading.Lock()
+        #: Resolved file path -> Asset, least recently used first.
+        self._assets = OrderedDict()
+        #: Request path -> resolved file path.
+        self._aliases = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def get(self, path):
+        """
+        Look up the asset serving the request ``path``.
+
+        :param path (str): request path, e.g. ``/static/css/styles.css``.
+        :rtype Asset: the fresh cached asset, or None on a miss.
+        """
+        with self._lock:
+            filepath = self._aliases.get(path)
+            asset = self._assets.get(filepath) if filepath is not None else None
+            if asset is None:
+                self.misses += 1
+                return None
+            self._assets.move_to_end(filepath)
+            now = time.monotonic()
+            if now - asset.checked < self.check_interval:
+                self.hits += 1
+                return asset
+
+        # stat outside the lock; a concurrent load simply replaces the entry.
+        try:
+            st = os.stat(asset.filepath)
+        except OSError:
+            st = None
+
+        with self._lock:
+            if st is not None and asset.matches(st):
+                asset.checked = now
+                self.hits += 1
+                return asset
+            self._drop(asset.filepath)
+            self.invalidations += 1
+            self.misses += 1
+        return None
+
+    def load(self, path, filepath, mime_type):
+        """
+        Read ``filepath`` and cache it as the asset of the request ``path``.
+
+        :param path (str): request path.
+        :param filepath (str): resolved file path.
+        :param mime_type (str): value of the Content-Type header.
+        :rtype Asset: the new asset, or None if the file cannot be opened.
+        """
+        try:
+            with open(filepath, 'rb') as f:
+                st = os.fstat(f.fileno())
+                content = f.read() if st.st_size <= self.max_asset_size else None
+        except OSError as e:
+            logger.info("cannot load %s: %s", filepath, e)
+            return None
+
+        if content is not None and len(content) != st.st_size:
+            # Modified while reading; serve what was read but do not keep it.
+            return Asset(filepath, mime_type, len(content), -1, content)
+
+        asset = Asset(filepath, mime_type, st.st_size, st.st_mtime_ns, content)
+        if asset.compressible:
+            self._load_sibling(asset)
+        with self._lock:
+            self._drop(filepath)
+            if asset.memory <= self.max_bytes:
+                self._assets[filepath] = asset
+                self._aliases[path] = filepath
+                self._bytes += asset.memory
+                self._evict()
+        return asset
+
+    def _load_sibling(self, asset):
+        """Use a fresh ``.gz`` sibling of ``asset`` as its gzip variant."""
+        gzpath = asset.filepath + ".gz"
+        try:
+            st = os.stat(gzpath)
+            if st.st_mtime_ns < asset.mtime_ns:
+                return
+            if asset.content is None:
+                asset.variants["gzip"] = Variant(asset, "gzip", st.st_size, filepath=gzpath)
+                return
+            with open(gzpath, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return
+        asset.variants["gzip"] = Variant(asset, "gzip", len(content), content=content)
+
+    def variant(self, asset, accept_encoding):
+        """
+        Negotiate the content coding of ``asset`` for a request.
+
+        The variant is compressed on first demand and kept with the asset.
+
+        :param asset (Asset): the asset to serve.
+        :param accept_encoding (str): the request's Accept-Encoding header.
+        :rtype Variant: the variant to send, or None for the identity body.
+        """
+        if not asset.compressible:
+            return None
+
+        if asset.content is None:
+            # Large files are never compressed on the fly.
+            offered = [e for e in ENCODINGS if asset.variants.get(e) is not None]
+        else:
+            offered = ENCODINGS
+        encoding = choose_encoding(accept_encoding, offered)
+        if encoding is None:
+            return None
+
+        variants = asset.variants
+        if encoding in variants:
+            return variants[encoding]
+
+        body = compress(asset.content, encoding)
+        variant = Variant(asset, encoding, len(body), content=body) if body is not None else None
+        with self._lock:
+            if encoding in variants:
+                return variants[encoding]
+            variants[encoding] = variant
+            if variant is not None and self._assets.get(asset.filepath) is asset:
+                self._bytes += len(variant.header) + len(variant.validators) + len(body)
+                self._evict()
+        return variant
+
+    def invalidate(self, filepath):
+        """
+        Forget the asset of ``filepath``, e.g. after it was found modified.
+
+        :param filepath (str): resolved file path.
+        """
+        with self._lock:
+            if self._drop(filepath):
+                self.invalidations += 1
+
+    def clear(self):
+        """Forget every asset; the counters are kept."""
+        with self._lock:
+            self._assets.clear()
+            self._aliases.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Report the cache counters and occupancy.
+
+        :rtype dict: hits, misses, hit_ratio, invalidations, evictions,
+                     entries, bytes and max_bytes.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "evictions": self.evictions,
+                "entries": len(self._assets),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, filepath):
+        """Remove one entry; the lock must be held."""
+        asset = self._assets.pop(filepath, None)
+        if asset is None:
+            return False
+        self._bytes -= asset.memory
+        return True
+
+    def _evict(self):
+        """Evict least recently used entries above the bound; the lock must be held."""
+        while self._bytes > self.max_bytes and self._assets:
+            _, asset = self._assets.popitem(last=False)
+            self._bytes -= asset.memory
+            self.evictions += 1
+        if len(self._aliases) > 2 * len(self._assets) + 64:
+            self._aliases = {path: filepath for path, filepath in self._aliases.items()
+                             if filepath in self._assets}
+
+
+#: Cache shared by every connection of the process.
+ASSET_CACHE = AssetCache()
+
+for _name, _help in (("hits", "Asset cache lookups served from memory."),
+                     ("misses", "Asset cache lookups that loaded the file."),
+                     ("invalidations", "Assets reloaded because the file changed."),
+                     ("evictions", "Assets evicted to stay under the byte budget.")):
+    REGISTRY.counter("asset_cache_{}_total".format(_name), _help,
+                     func=lambda key=_name: ASSET_CACHE.stats()[key])
+for _name, _help in (("entries", "Assets held by the cache."),
+                     ("bytes", "Memory held by the cached assets."),
+                     ("max_bytes", "Byte budget of the cache.")):
+    REGISTRY.gauge("asset_cache_{}".format(_name), _help,
+                   func=lambda key=_name: ASSET_CACHE.stats()[key])
@@ -0,0 +1,402 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.asyncserver
+~~~~~~~~~~~~~~~~~
+
+This module provides the ``asyncio`` backend engine. Every client connection
+is an :class:`asyncio.Protocol` fed by the event loop, so an idle keep-alive
+connection only costs a protocol object and a small parse buffer.
+
+Route hooks declared with ``async def`` are awaited on the loop, between the
+steps of their middleware pipeline. Plain hooks, the login form handler and
+static files run with their middleware in a thread executor so a
+blocking handler never stalls the other connections. Streamed bodies are
+pulled chunk by chunk, waiting for the transport to drain in between: async
+generators on the loop, sync generators in the executor.
+
+Connections and requests over the limits of the :class:`Limiter
+<daemon.overload.Limiter>` are answered with 503; a request waiting for a
+slot is a suspended task, not a blocked thread.
+
+The idle, header, body and write deadlines of :mod:`daemon.timeouts` are kept
+on one timer wheel advanced by the loop instead of a ``call_later`` handle
+per connection and request.
+
+Requirements:
+--------------
+- asyncio: event loop, transports and the thread executor.
+- httpadapter: the class for handling HTTP requests.
+- httpparser: incremental request parsing.
+- overload: connection and request limits.
+- timeouts: connection deadlines.
+
+Usage Example:
+--------------
+>>> run_asyncio("127.0.0.1", 9000, routes={})
+
+"""
+
+import asyncio
+import inspect
+import logging
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+from .httpadapter import (
+    HttpAdapter,
+    frame_response,
+    consume_request,
+    CONTINUE_RESPONSE,
+    KEEPALIVE_MAX_REQUESTS,
+    SENDFILE_BLOCK,
+)
+from .httpparser import HttpParser, HttpParseError
+from .request import RequestContext
+from .middleware import endpoint_error
+from .eventloop import DEFAULT_WORKERS
+from .overload import Limiter
+from .timeouts import TimerWheel, Deadline
+from .response import FileResponse, StreamResponse
+
+logger = logging.getLogger(__name__)
+
+#: Initial parse buffer of a connection; it only grows for large requests.
+CONNECTION_BUFFER = 1024
+
+
+class HttpProtocol(asyncio.Protocol):
+    """
+    One HTTP/1.1 client connection served by the asyncio engine.
+
+    Requests on a connection are handled one at a time: reading is paused
+    while a request is being served, which also applies backpressure to
+    pipelining clients, and resumed once the response has been written.
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.loop = server.loop
+        self.transport = None
+        self.parser = HttpParser(size=CONNECTION_BUFFER)
+        self.adapter = None
+        self.served = 0
+        self.busy = False
+        self.deadline = None
+        self.drain_waiter = None
+        self.counted = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if not self.server.limiter.connect():
+            transport.write(self.server.limiter.response)
+            transport.close()
+            return
+        self.counted = True
+        sock = transport.get_extra_info('socket')
+        addr = transport.get_extra_info('peername')
+        self.adapter = HttpAdapter(self.server.ip, self.server.port, sock, addr, self.server.routes)
+        self.deadline = Deadline(self.server.wheel, "backend", on_expire=self._timeout)
+        self.deadline.arm("idle")
+
+    def connection_lost(self, exc):
+        if self.counted:
+            self.server.limiter.disconnect()
+        if self.deadline is not None:
+            self.deadline.cancel()
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+
+    def data_received(self, data):
+        if not self.counted:
+            return
+        self.parser.feed(data)
+        if not self.busy:
+            self._process()
+
+    def pause_writing(self):
+        self.drain_waiter = self.loop.create_future()
+
+    def resume_writing(self):
+        if self.drain_waiter is not None and not self.drain_waiter.done():
+            self.drain_waiter.set_result(None)
+        self.drain_waiter = None
+
+    def _timeout(self):
+        logger.debug("Client %s timed out (%s)", self.adapter.connaddr, self.deadline.phase)
+        # Unsent data of a stalled client is dropped, not flushed.
+        self.transport.abort()
+
+    async def _drain(self):
+        """Wait for the transport to drain, under the write deadline."""
+        self.deadline.arm("write")
+        await self.drain_waiter
+        self.deadline.cancel()
+
+    def _process(self):
+        """Start serving the buffered request once it is complete."""
+        try:
+            if not self.parser.parse():
+                if self.parser.expect_continue:
+                    self.parser.expect_continue = False
+                    self.transport.write(CONTINUE_RESPONSE)
+                self.deadline.reading(self.parser)
+                return
+        except HttpParseError as e:
+            logger.info("Bad request from %s: %s", self.adapter.connaddr, e)
+            response = self.adapter.build_error_response(e.status, e.reason)
+            self.transport.write(frame_response(response, False)[0])
+            self.transport.close()
+            return
+
+        self.busy = True
+        self.deadline.cancel()
+        self.transport.pause_reading()
+        self.loop.create_task(self._serve())
+
+    async def _serve(self):
+        adapter = self.adapter
+        self.served += 1
+        limiter = self.server.limiter
+        if not await self.server.admit():
+            logger.debug("Shed request from %s", adapter.connaddr)
+            self.transport.write(limiter.response)
+            self.transport.close()
+            return
+        try:
+            response = await self.server.dispatch(adapter, self.parser)
+            keep_alive = (self.served < KEEPALIVE_MAX_REQUESTS
+                          and adapter.request.wants_keep_alive())
+        except Exception:
+            logger.exception("Error dispatching request from %s", adapter.connaddr)
+            response = adapter.build_error_response(500, "Internal Server Error")
+            keep_alive = False
+        finally:
+            limiter.release()
+        response, keep_alive = frame_response(response, keep_alive, adapter.request.method)
+        consume_request(self.parser, response)
+
+        if self.transport.is_closing():
+            if isinstance(response, FileResponse):
+                response.close()
+            elif isinstance(response, StreamResponse):
+                await response.aclose()
+            return
+        if isinstance(response, FileResponse):
+            keep_alive = await self._send_file(response) and keep_alive
+        elif isinstance(response, StreamResponse):
+            keep_alive = await self._send_stream(response) and keep_alive
+        elif isinstance(response, list):
+            self.transport.writelines(response)
+        else:
+            self.transport.write(response)
+        if self.drain_waiter is not None:
+            await self._drain()
+
+        if not keep_alive:
+            self.transport.close()
+            return
+
+        self.busy = False
+        self.transport.resume_reading()
+        # A pipelined request may already be waiting in the buffer.
+        self._process()
+
+
+    async def _send_file(self, response):
+        """
+        Write the header of ``response`` and its body parts, file slices with
+        ``loop.sendfile`` in blocks of :data:`SENDFILE_BLOCK` bytes, each
+        under the write deadline.
+
+        :rtype bool: False if the body could not be sent completely.
+        """
+        try:
+            self.transport.write(response.header)
+            for part in response.parts:
+                if isinstance(part, tuple):
+                    offset, count = part
+                    while count > 0:
+                        block = min(count, SENDFILE_BLOCK)
+                        self.deadline.arm("write")
+                        await self.loop.sendfile(self.transport, response.file, offset, block)
+                        self.deadline.cancel()
+                        offset += block
+                        count -= block
+                else:
+                    self.transport.write(part)
+            return True
+        except (OSError, RuntimeError) as e:
+            logger.debug("Error sending file to %s: %s", self.adapter.connaddr, e)
+            return False
+        finally:
+            response.close()
+
+    async def _send_stream(self, response):
+        """
+        Write the header of ``response`` and then its chunks, producing each
+        one only after the transport has drained below its high-water mark.
+
+        :rtype bool: False if the body ended early.
+        """
+        try:
+            self.transport.write(response.header)
+            while True:
+                if self.drain_waiter is not None:
+                    await self._drain()
+                if self.transport.is_closing():
+                    return False
+                chunk = await response.anext_chunk(self.server.executor)
+                self.transport.writelines(response.frame(chunk))
+                if chunk is None:
+                    return True
+        except Exception as e:
+            logger.info("Streamed response to %s aborted: %s", self.adapter.connaddr, e)
+            return False
+        finally:
+            await response.aclose()
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AsyncServer:
+    """
+    The asyncio HTTP backend.
+
+    Attributes:
+        ip (str): IP address to bind the server.
+        port (int): Port number to listen on.
+        routes (dict): Mapping of route paths to handler functions.
+        workers (int): Size of the executor running synchronous handlers.
+        limiter (Limiter): connection and request limits.
+    """
+
+    __attrs__ = [
+        "ip",
+        "port",
+        "routes",
+        "workers",
+        "limiter",
+    ]
+
+    def __init__(self, ip, port, routes, workers=DEFAULT_WORKERS, limiter=None):
+        """
+        Initialize a new AsyncServer instance.
+
+        :param ip (str): IP address to bind the server.
+        :param port (int): Port number to listen on.
+        :param routes (dict): Mapping of route paths to handler functions.
+        :param workers (int): Size of the executor running synchronous handlers.
+        :param limiter (Limiter): connection and request limits, defaults if None.
+        """
+        self.ip = ip
+        self.port = port
+        self.routes = routes
+        self.workers = workers
+        self.limiter = limiter or Limiter("backend")
+        self.wheel = TimerWheel()
+        self.loop = None
+        self.executor = None
+
+    async def admit(self):
+        """
+        Take a request slot of the limiter, waiting in its queue if needed.
+
+        :rtype bool: False if the request must be shed.
+        """
+        waiter = self.loop.create_future()
+
+        def grant():
+            # Called by the thread that released the slot.
+            self.loop.call_soon_threadsafe(_wake, waiter)
+
+        admitted = self.limiter.acquire(grant)
+        if admitted is not None:
+            return admitted
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.limiter.queue_timeout)
+            return True
+        except asyncio.TimeoutError:
+            # Granted between the timeout and the cancellation: keep the slot.
+            return not self.limiter.cancel(grant)
+
+    def _advance_wheel(self):
+        """Run the due connection deadlines, then again one slot later."""
+        self.wheel.advance()
+        self.loop.call_later(self.wheel.resolution, self._advance_wheel)
+
+    async def dispatch(self, adapter, parser):
+        """
+        Serve the request held by ``parser``.
+
+        :rtype: bytes - The raw HTTP response bytes.
+        """
+        adapter.prepare_request(parser, self.routes)
+        req = adapter.request
+
+        if req.hook is not None and inspect.iscoroutinefunction(req.hook):
+            # The middleware steps run on the loop around the awaited hook.
+            pipeline = adapter.pipeline_for(req)
+            ctx = RequestContext(req)
+            response = pipeline.before(ctx)
+            if response is None:
+                try:
+                    hook_result = await adapter.call_hook(req, ctx)
+                    response = adapter.build_hook_response(req, hook_result)
+                except Exception:
+                    response = endpoint_error(ctx)
+            response = pipeline.after(ctx, response)
+        else:
+            response = await self.loop.run_in_executor(self.executor, adapter.dispatch_request)
+
+        if response is None:
+            response = adapter.build_error_response(500, "Internal Server Error")
+        return response
+
+    async def serve(self, server=None):
+        """
+        Serve forever on ``server`` (or a new socket bound to ``ip``/``port``).
+
+        :param server (socket.socket, optional): an already bound listening socket.
+        """
+        self.loop = asyncio.get_running_loop()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="hook")
+
+        if server is not None:
+            srv = await self.loop.create_server(lambda: HttpProtocol(self), sock=server)
+        else:
+            srv = await self.loop.create_server(lambda: HttpProtocol(self), self.ip, self.port,
+                                                backlog=socket.SOMAXCONN, reuse_address=True)
+        logger.info("asyncio engine with %d executor threads", self.workers)
+        self._advance_wheel()
+        try:
+            async with srv:
+                await srv.serve_forever()
+        finally:
+            self.executor.shutdown(wait=False)
+
+
+def run_asyncio(ip, port, routes, server=None, limiter=None):
+    """
+    Entry point of the asyncio engine.
+
+    :param ip (str): IP address to bind the server.
+    :param port (int): Port number to listen on.
+    :param routes (dict): Mapping of route paths to handler functions.
+    :param server (socket.socket, optional): an already bound listening socket.
+    :param limiter (Limiter, optional): connection and request limits.
+    """
+    asyncio.run(AsyncServer(ip, port, routes, limiter=limiter).serve(server))
@@ -26,29 +26,61 @@ Requirements:
 - response: response utilities.
 - httpadapter: the class for handling HTTP requests.
 - CaseInsensitiveDict: provides dictionary for managing headers or routes.
+- eventloop: the opt-in selector based engine.
+- asyncserver: the opt-in asyncio engine.
+- prefork: supervisor for multi-process backends.
+- overload: connection and request limits with 503 load shedding.
+- log: queue-based logging of the daemon package.
 
 
 Notes:
 ------
-- The server create daemon threads for client handling.
-- The current implementation error handling is minimal, socket errors are printed to the console.
+- Two engines are available: ``threading`` (default) creates one daemon thread
+  per client, ``selector`` multiplexes every client on one event loop and runs
+  route hooks on a bounded worker pool (see :mod:`daemon.eventloop`),
+  ``asyncio`` serves clients as asyncio protocols and awaits ``async def``
+  route hooks on the loop (see :mod:`daemon.asyncserver`).
+- Every engine applies the limits of a :class:`Limiter
+  <daemon.overload.Limiter>`: connections and requests beyond them are
+  answered with ``503 Service Unavailable`` (see :mod:`daemon.overload`).
+- The current implementation error handling is minimal, socket errors are logged.
+- :func:`run_backend` configures the package logging (see :mod:`daemon.log`)
+  unless the application already did.
 - The actual request processing is delegated to the HttpAdapter class.
 
 Usage Example:
 --------------
 >>> create_backend("127.0.0.1", 9000, routes={})
+>>> create_backend("127.0.0.1", 9000, routes={}, mode="selector")
+>>> create_backend("127.0.0.1", 9000, routes={}, mode="asyncio")
+>>> create_backend("127.0.0.1", 9000, routes={}, workers=4)
+>>> create_backend("127.0.0.1", 9000, routes={}, limiter=Limiter(max_connections=256))
 
 """
 
 import socket
+import logging
 import threading
 import argparse
 
 from .response import *
 from .httpadapter import HttpAdapter
 from .dictionary import CaseInsensitiveDict
+from .eventloop import SelectorServer
+from .asyncserver import run_asyncio
+from .prefork import run_prefork, can_fork
+from .overload import Limiter
+from . import log
 
-def handle_client(ip, port, conn, addr, routes):
+logger = logging.getLogger(__name__)
+
+#: Engines accepted by :func:`run_backend`.
+SERVER_MODES = ("threading", "selector", "asyncio")
+
+#: Listen backlog; the kernel caps it at net.core.somaxconn.
+LISTEN_BACKLOG = socket.SOMAXCONN
+
+def handle_client(ip, port, conn, addr, routes, limiter=None):
     """
     Initializes an HttpAdapter instance and delegates the client handling logic to it.
 
@@ -57,52 +89,124 @@ def handle_client(ip, port, conn, addr, routes):
     :param conn (socket.socket): Client connection socket.
     :param addr (tuple): client address (IP, port).
     :param routes (dict): Dictionary of route handlers.
+    :param limiter (Limiter): limits of the server; the connection was counted
+                    by its ``connect()`` already.
     """
     daemon = HttpAdapter(ip, port, conn, addr, routes)
 
     # Handle client
-    daemon.handle_client(conn, addr, routes)
+    try:
+        daemon.handle_client(conn, addr, routes, limiter)
+    finally:
+        if limiter is not None:
+            limiter.disconnect()
 
-def run_backend(ip, port, routes):
+def create_server_socket(ip, port, backlog=LISTEN_BACKLOG):
     """
-    Starts the backend server, binds to the specified IP and port, and listens for incoming
-    connections. Each connection is handled in a separate thread. The backend accepts incoming
-    connections and spawns a thread for each client.
-
+    Creates the listening TCP socket of a backend.
 
     :param ip (str): IP address to bind the server.
     :param port (int): Port number to listen on.
-    :param routes (dict): Dictionary of route handlers.
+    :param backlog (int): Listen backlog.
+
+    :rtype socket.socket: bound and listening server socket.
     """
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((ip, port))
+    server.listen(backlog)
+    return server
 
+def serve(server, ip, port, routes, mode="threading", limiter=None):
+    """
+    Runs the accept loop of one backend process on an already listening socket.
+
+    :param server (socket.socket): listening server socket.
+    :param ip (str): IP address the server is bound to.
+    :param port (int): Port number the server is listening on.
+    :param routes (dict): Dictionary of route handlers.
+    :param mode (str): Engine name, one of :data:`SERVER_MODES`.
+    :param limiter (Limiter): connection and request limits.
+    """
+    if limiter is None:
+        limiter = Limiter("backend")
     try:
-        server.bind((ip, port))
-        server.listen(50)
-        print("[Backend] Listening on port {}".format(port))
-        if routes != {}:
-            print("[Backend] route settings {}".format(routes))
+        if mode == "selector":
+            SelectorServer(ip, port, routes, limiter=limiter).serve_forever(server)
+            return
+        if mode == "asyncio":
+            run_asyncio(ip, port, routes, server, limiter)
+            return
 
         while True:
             conn, addr = server.accept()
+            if not limiter.connect():
+                limiter.reject(conn)
+                continue
             #
             #  TODO: implement the step of the client incomping connection
             #        using multi-thread programming with the
             #        provided handle_client routine
             #
-            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes))
+            client_thread = threading.Thread(target=handle_client,
+                                             args=(ip, port, conn, addr, routes, limiter))
             client_thread.daemon = True
             client_thread.start()
     except socket.error as e:
-      print("Socket error: {}".format(e))
+      logger.error("Socket error: %s", e)
+
+def run_backend(ip, port, routes, mode="threading", workers=1, limiter=None):
+    """
+    Starts the backend server, binds to the specified IP and port, and listens for incoming
+    connections. With the ``threading`` engine each connection is handled in a separate
+    thread; the ``selector`` and ``asyncio`` engines multiplex connections on one event
+    loop instead.
+
+    With ``workers`` greater than one, the listening socket is shared by that many
+    forked worker processes under a supervisor (see :mod:`daemon.prefork`).
+
+
+    :param ip (str): IP address to bind the server.
+    :param port (int): Port number to listen on.
+    :param routes (dict): Dictionary of route handlers.
+    :param mode (str): Engine name, one of :data:`SERVER_MODES`.
+    :param workers (int): Number of worker processes.
+    :param limiter (Limiter): connection and request limits of each worker,
+                    :class:`Limiter <daemon.overload.Limiter>` defaults if None.
+    """
+    if mode not in SERVER_MODES:
+        raise ValueError("Unknown backend mode {!r}, expected one of {}".format(mode, SERVER_MODES))
+
+    log.configure()
+    try:
+        server = create_server_socket(ip, port)
+    except socket.error as e:
+        logger.error("Socket error: %s", e)
+        return
+
+    logger.info("Listening on port %s", port)
+    if routes:
+        logger.info("route settings %s", routes)
+
+    if workers > 1 and not can_fork():
+        logger.warning("fork is not available, running a single process")
+        workers = 1
+
+    if workers > 1:
+        run_prefork(serve, (server, ip, port, routes, mode, limiter), workers)
+    else:
+        serve(server, ip, port, routes, mode, limiter)
 
-def create_backend(ip, port, routes={}):
+def create_backend(ip, port, routes={}, mode="threading", workers=1, limiter=None):
     """
     Entry point for creating and running the backend server.
 
     :param ip (str): IP address to bind the server.
     :param port (int): Port number to listen on.
     :param routes (dict, optional): Dictionary of route handlers. Defaults to empty dict.
+    :param mode (str, optional): Engine name, ``threading``, ``selector`` or ``asyncio``.
+    :param workers (int, optional): Number of pre-forked worker processes.
+    :param limiter (Limiter, optional): connection and request limits.
     """
 
-    run_backend(ip, port, routes)
\ No newline at end of file
+    run_backend(ip, port, routes, mode, workers, limiter)
@@ -0,0 +1,342 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.balancer
+~~~~~~~~~~~~~~~~~
+
+This module provides the load balancing policies of the proxy, selected per
+host block with ``dist_policy``:
+
+- ``round-robin``: every upstream in turn.
+- ``weighted-round-robin``: in turn, proportionally to the ``weight=`` of
+  each ``proxy_pass`` (default 1), smoothly interleaved: weights 3 and 1
+  give ``a a b a`` rather than ``a a a b``.
+- ``least-conn``: the upstream with the fewest requests in flight relative
+  to its weight; ties go round-robin.
+- ``p2c``: power of two choices: of two upstreams drawn at random, the one
+  with the lower EWMA latency times requests in flight (plus one).
+
+Every policy skips the upstreams that failed their health checks or are
+ejected (see :mod:`daemon.health`). If none is left, all of them are used,
+so a host block whose upstreams are all marked down still tries them.
+
+Notes:
+------
+- Picking takes no lock. Rotations read an ``itertools.count``, the
+  requests in flight of an upstream are the leases in a set (``add`` and
+  ``discard`` are atomic in CPython), and the EWMA is a float overwritten
+  by each measurement; two measurements racing may lose one, which only
+  makes the average slightly less smooth.
+- An upstream shared by several host blocks (same address) is one
+  :class:`Upstream <Upstream>`, so its load is seen by all of them; its
+  weight belongs to each host block.
+- Requests in flight, EWMA latency and availability are exported by
+  upstream in :data:`daemon.metrics.REGISTRY`.
+
+Usage Example:
+--------------
+>>> balancer = Balancer(["127.0.0.1:9000 weight=3", "127.0.0.1:9001"], "p2c")
+>>> upstream = balancer.pick()
+>>> lease = upstream.acquire()
+>>> upstream.observe(0.012)
+>>> upstream.release(lease)
+
+"""
+
+import time
+import random
+import itertools
+import threading
+
+from .metrics import REGISTRY
+from .health import Health, watch
+
+#: Policies accepted by ``dist_policy``.
+POLICIES = ("round-robin", "weighted-round-robin", "least-conn", "p2c")
+
+#: Policy of host blocks without ``dist_policy``.
+DEFAULT_POLICY = "round-robin"
+
+#: Weight of the newest latency measurement in the EWMA.
+EWMA_ALPHA = 0.3
+
+
+class Upstream:
+    """
+    One backend address with its load.
+
+    Attributes:
+        address (str): ``host:port``.
+        host (str): IP address.
+        port (int): port number.
+        ewma (float): moving average of the response latency in seconds,
+                      0.0 before the first measurement.
+        health (Health): its :class:`Health <daemon.health.Health>`.
+    """
+
+    __attrs__ = [
+        "address",
+        "host",
+        "port",
+        "ewma",
+        "health",
+    ]
+
+    def __init__(self, address):
+        """
+        :param address (str): ``host:port``.
+        """
+        host, port = address.rsplit(':', 1)
+        self.address = address
+        self.host = host
+        self.port = int(port)
+        self.ewma = 0.0
+        self.health = Health(address)
+        self._leases = set()
+
+    def __repr__(self):
+        return "<Upstream {} {} in_flight={} ewma={:.4f}>".format(
+            self.address, self.health.state(), self.in_flight, self.ewma)
+
+    @property
+    def in_flight(self):
+        """Requests being served by the upstream."""
+        return len(self._leases)
+
+    def acquire(self):
+        """
+        Count a request sent to the upstream.
+
+        :rtype object: the lease to give back to :meth:`release`.
+        """
+        lease = object()
+        self._leases.add(lease)
+        return lease
+
+    def release(self, lease):
+        """Forget a request counted by :meth:`acquire`."""
+        self._leases.discard(lease)
+
+    def observe(self, latency):
+        """Fold a latency measurement in seconds into :attr:`ewma`."""
+        ewma = self.ewma
+        self.ewma = latency if ewma == 0.0 else ewma + EWMA_ALPHA * (latency - ewma)
+
+    def stats(self):
+        """
+        :rtype dict: in_flight, ewma and the :meth:`Health.stats
+                     <daemon.health.Health.stats>`.
+        """
+        return dict(self.health.stats(), in_flight=self.in_flight, ewma=self.ewma)
+
+
+#: Every upstream by address.
+_upstreams = {}
+_upstreams_lock = threading.Lock()
+
+def get_upstream(address):
+    """
+    The :class:`Upstream <Upstream>` of ``address``, created on first use.
+
+    :rtype Upstream
+    """
+    upstream = _upstreams.get(address)
+    if upstream is None:
+        with _upstreams_lock:
+            upstream = _upstreams.get(address)
+            if upstream is None:
+                upstream = _upstreams[address] = Upstream(address)
+    return upstream
+
+def parse_options(words):
+    """
+    Parse the ``name=value`` options of a directive.
+
+    :param words (list): the options.
+    :rtype dict: option names to string values.
+    :raise ValueError: on a word without ``=``.
+    """
+    options = {}
+    for option in words:
+        name, sep, value = option.partition('=')
+        if not sep:
+            raise ValueError("malformed option {!r}".format(option))
+        options[name] = value
+    return options
+
+def parse_target(target):
+    """
+    Parse a ``proxy_pass`` target with its options.
+
+    :param target (str): ``host:port`` optionally followed by ``name=value``
+                   options, e.g. ``127.0.0.1:9000 weight=3``.
+    :rtype tuple: (address, options dict).
+    :raise ValueError: on a malformed option or weight.
+    """
+    parts = target.split()
+    options = parse_options(parts[1:])
+    if "weight" in options:
+        weight = int(options["weight"])
+        if weight < 1:
+            raise ValueError("proxy_pass weight must be at least 1")
+        options["weight"] = weight
+    return parts[0], options
+
+def smooth_schedule(weights):
+    """
+    One cycle of smooth weighted round-robin: each index appears as often as
+    its weight, spread out as evenly as possible.
+
+    :param weights (list): positive integer weights.
+    :rtype list: indices into ``weights``, ``sum(weights)`` long.
+    """
+    total = sum(weights)
+    current = [0] * len(weights)
+    schedule = []
+    for _ in range(total):
+        for i, weight in enumerate(weights):
+            current[i] += weight
+        best = max(range(len(weights)), key=current.__getitem__)
+        current[best] -= total
+        schedule.append(best)
+    return schedule
+
+
+class Balancer:
+    """
+    The upstreams of one host block and the policy choosing among them.
+
+    Attributes:
+        upstreams (list): the :class:`Upstream <Upstream>` objects.
+        weights (list): the weight of each upstream, from its ``weight=``
+                        option (default 1).
+        policy (str): one of :data:`POLICIES`.
+    """
+
+    __attrs__ = [
+        "upstreams",
+        "weights",
+        "policy",
+    ]
+
+    def __init__(self, targets, policy=DEFAULT_POLICY, health_check=None):
+        """
+        :param targets (str or list): ``proxy_pass`` target(s), see
+                       :func:`parse_target`.
+        :param policy (str): one of :data:`POLICIES`.
+        :param health_check (dict): settings of the active checks of the
+                             upstreams (see :func:`daemon.health.watch`),
+                             None for no checks.
+        :raise ValueError: on an unknown policy or a malformed target.
+        """
+        if isinstance(targets, str):
+            targets = [targets]
+        policy = (policy or DEFAULT_POLICY).lower()
+        if policy not in POLICIES:
+            raise ValueError("Unknown dist_policy {!r}, expected one of {}".format(policy, POLICIES))
+        self.policy = policy
+        self.upstreams = []
+        self.weights = []
+        for target in targets:
+            address, options = parse_target(target)
+            self.upstreams.append(get_upstream(address))
+            self.weights.append(options.get("weight", 1))
+
+        weights = [1] * len(self.upstreams)
+        if policy == "weighted-round-robin":
+            weights = self.weights
+        self._schedule = smooth_schedule(weights)
+        self._counter = itertools.count()
+        self._pick = getattr(self, "_pick_" + policy.replace('-', '_'))
+        if health_check is not None:
+            for upstream in self.upstreams:
+                watch(upstream, **health_check)
+
+    def __repr__(self):
+        return "<Balancer {} {}>".format(self.policy, [u.address for u in self.upstreams])
+
+    def pick(self, exclude=()):
+        """
+        Choose the upstream of the next request among the available ones.
+
+        :param exclude (tuple): upstreams not to choose, e.g. those a request
+                        failed to connect to; ignored if they are all left.
+        :rtype Upstream
+        """
+        upstreams = self.upstreams
+        if len(upstreams) == 1:
+            return upstreams[0]
+        now = time.monotonic()
+        usable = [u.health.available(now) and u not in exclude for u in upstreams]
+        if not any(usable):
+            usable = [u not in exclude for u in upstreams]
+            if not any(usable):
+                usable = [True] * len(upstreams)
+        return self._pick(usable)
+
+    def _pick_round_robin(self, usable):
+        schedule = self._schedule
+        count = len(schedule)
+        start = next(self._counter)
+        for i in range(count):
+            j = schedule[(start + i) % count]
+            if usable[j]:
+                return self.upstreams[j]
+
+    _pick_weighted_round_robin = _pick_round_robin
+
+    def _pick_least_conn(self, usable):
+        upstreams = self.upstreams
+        weights = self.weights
+        count = len(upstreams)
+        start = next(self._counter)
+        best = None
+        best_load = None
+        for i in range(count):
+            j = (start + i) % count
+            if not usable[j]:
+                continue
+            load = upstreams[j].in_flight / weights[j]
+            if best is None or load < best_load:
+                best, best_load = upstreams[j], load
+        return best
+
+    def _pick_p2c(self, usable):
+        candidates = [u for u, ok in zip(self.upstreams, usable) if ok]
+        if len(candidates) == 1:
+            return candidates[0]
+        first, second = random.sample(candidates, 2)
+        # Unmeasured upstreams cost 0 and are tried first.
+        if first.ewma * (first.in_flight + 1) <= second.ewma * (second.in_flight + 1):
+            return first
+        return second
+
+    def stats(self):
+        """
+        :rtype dict: policy and the stats and weight of each upstream by address.
+        """
+        upstreams = {}
+        for upstream, weight in zip(self.upstreams, self.weights):
+            upstreams[upstream.address] = dict(upstream.stats(), weight=weight)
+        return {"policy": self.policy, "upstreams": upstreams}
+
+
+REGISTRY.gauge("proxy_upstream_in_flight", "Requests being served by each upstream.", ("upstream",),
+               func=lambda: {(a,): u.in_flight for a, u in list(_upstreams.items())})
+REGISTRY.gauge("proxy_upstream_latency_ewma_seconds",
+               "Moving average of each upstream's response header latency.", ("upstream",),
+               func=lambda: {(a,): u.ewma for a, u in list(_upstreams.items())})
+REGISTRY.gauge("proxy_upstream_available",
+               "Whether each upstream receives requests (1) or is unhealthy or ejected (0).",
+               ("upstream",),
+               func=lambda: {(a,): int(u.health.available()) for a, u in list(_upstreams.items())})
@@ -0,0 +1,92 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.byterange
+~~~~~~~~~~~~~~~~~
+
+This module provides parsing of the ``Range`` request header (RFC 9110,
+section 14) for the static file path.
+
+Notes:
+------
+- Only the ``bytes`` unit is supported; any other unit, or a syntax error,
+  makes the server ignore the header and send the whole representation.
+- Overlapping or adjacent ranges are coalesced, and requests asking for more
+  than :data:`MAX_RANGES` ranges are answered with the whole representation.
+
+Usage Example:
+--------------
+>>> parse_range("bytes=0-99,-100", 1000)
+[(0, 99), (900, 999)]
+
+"""
+
+#: Largest number of ranges honoured in one request.
+MAX_RANGES = 16
+
+
+def parse_range(value, size):
+    """
+    Resolves a Range header against a representation of ``size`` bytes.
+
+    :param value (str): the request's Range header.
+    :param size (int): length of the selected representation.
+    :rtype list: sorted, non-overlapping ``(first, last)`` inclusive byte
+                 positions; an empty list if no range is satisfiable, or None
+                 if the header must be ignored.
+    """
+    unit, _, spec = value.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    items = [item.strip() for item in spec.split(",")]
+    items = [item for item in items if item]
+    if not items or len(items) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for item in items:
+        first, dash, last = item.partition("-")
+        first, last = first.strip(), last.strip()
+        if not dash:
+            return None
+
+        if first:
+            if not first.isdigit() or (last and not last.isdigit()):
+                return None
+            start = int(first)
+            if last:
+                end = int(last)
+                if end < start:
+                    return None
+            if start >= size:
+                continue
+            end = min(end, size - 1) if last else size - 1
+        else:
+            # Suffix range: the last N bytes.
+            if not last.isdigit():
+                return None
+            length = int(last)
+            if length == 0 or size == 0:
+                continue
+            start, end = max(0, size - length), size - 1
+        ranges.append((start, end))
+
+    ranges.sort()
+    merged = []
+    for start, end in ranges:
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
@@ -0,0 +1,124 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.compress
+~~~~~~~~~~~~~~~~~
+
+This module provides the content-coding helpers used for static assets:
+``Accept-Encoding`` negotiation and gzip/deflate compression.
+
+Notes:
+------
+- Only textual MIME types are compressed; images and archives are already
+  compressed and are always sent as they are.
+- Bodies smaller than :data:`MIN_COMPRESS_SIZE`, or that do not shrink below
+  :data:`MAX_COMPRESS_RATIO` of their size, are not worth a variant.
+- gzip output is produced with a zero mtime so a variant is byte-identical
+  across processes and restarts.
+
+Usage Example:
+--------------
+>>> choose_encoding("gzip, deflate;q=0.5", ("gzip", "deflate"))
+'gzip'
+>>> compress(data, "gzip")
+
+"""
+
+import gzip
+import zlib
+
+#: Content codings offered for compressible assets, in order of preference.
+ENCODINGS = ("gzip", "deflate")
+
+#: Bodies below this size are sent uncompressed.
+MIN_COMPRESS_SIZE = 512
+
+#: A variant is kept only if it is at most this fraction of the original size.
+MAX_COMPRESS_RATIO = 0.9
+
+#: Compression level used for cached variants.
+COMPRESS_LEVEL = 6
+
+_COMPRESSIBLE_TYPES = (
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+def is_compressible(mime_type):
+    """
+    Tells whether content of ``mime_type`` benefits from compression.
+
+    :param mime_type (str): value of the Content-Type header.
+    :rtype bool:
+    """
+    mime_type = mime_type.split(";", 1)[0].strip().lower()
+    return mime_type.startswith("text/") or mime_type in _COMPRESSIBLE_TYPES
+
+
+def choose_encoding(accept_encoding, offered=ENCODINGS):
+    """
+    Selects the content coding to use for a request.
+
+    :param accept_encoding (str): the request's Accept-Encoding header.
+    :param offered (tuple): available codings, preferred first.
+    :rtype str: the chosen coding, or None to send the identity body.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params[:2].lower() == "q=":
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name] = q
+
+    best, best_q = None, 0.0
+    for name in offered:
+        q = weights.get(name, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = name, q
+    return best
+
+
+def compress(data, encoding):
+    """
+    Compresses ``data`` with ``encoding`` if that pays off.
+
+    :param data (bytes): identity body.
+    :param encoding (str): ``gzip`` or ``deflate``.
+    :rtype bytes: the compressed body, or None if it is not worth sending.
+    """
+    if len(data) < MIN_COMPRESS_SIZE:
+        return None
+    if encoding == "gzip":
+        out = gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    elif encoding == "deflate":
+        # HTTP "deflate" is the zlib format (RFC 9110, section 8.4.1.2).
+        out = zlib.compress(data, COMPRESS_LEVEL)
+    else:
+        raise ValueError("Unsupported content coding {!r}".format(encoding))
+    if len(out) > len(data) * MAX_COMPRESS_RATIO:
+        return None
+    return out
@@ -0,0 +1,457 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.eventloop
+~~~~~~~~~~~~~~~~~
+
+This module provides a selector based backend engine. A single event loop thread
+accepts, reads and writes every client socket in non-blocking mode, and hands each
+complete request to a bounded pool of worker threads that run the
+:class:`HttpAdapter <HttpAdapter>` route hooks.
+
+Requirements:
+--------------
+- selectors: readiness notification (epoll on Linux, kqueue on BSD).
+- concurrent.futures: bounded worker pool for request dispatching.
+- httpadapter: the class for handling HTTP requests.
+
+Notes:
+------
+- Idle connections only cost a selector registration and a small buffer,
+  instead of a whole thread as in the threading engine.
+- Workers never touch sockets; the finished response is passed back to the
+  loop through a wakeup socket pair and written without blocking; the header
+  and body of a hook response go out in one ``sendmsg`` call.
+- Static file bodies are sent with non-blocking ``os.sendfile`` after the
+  header, resuming at the saved offset when the socket buffer fills up.
+- Streamed hook bodies are pulled one chunk at a time by a worker; the next
+  chunk is only requested once the loop has written the previous one, so a
+  slow client pauses the generator.
+- Requests over the limit of the :class:`Limiter <daemon.overload.Limiter>`
+  wait in its queue without holding a worker; the queue timeouts are
+  checked once a second.
+- The idle, header, body and write deadlines of :mod:`daemon.timeouts` are
+  kept on a timer wheel advanced by the loop, so an expired connection is
+  closed on the loop thread; no deadline runs while a worker owns a request.
+
+Usage Example:
+--------------
+>>> SelectorServer("127.0.0.1", 9000, routes={}).serve_forever()
+
+"""
+
+import os
+import time
+import logging
+import queue
+import socket
+import selectors
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from .httpadapter import (
+    HttpAdapter,
+    frame_response,
+    consume_request,
+    write_buffers,
+    CONTINUE_RESPONSE,
+    KEEPALIVE_MAX_REQUESTS,
+)
+from .response import FileResponse, StreamResponse
+from .httpparser import HttpParser, HttpParseError
+from .overload import Limiter
+from .timeouts import TimerWheel, Deadline
+
+logger = logging.getLogger(__name__)
+
+#: Number of worker threads running route hooks.
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+class _Connection:
+    """Per-socket state kept by the event loop."""
+
+    __slots__ = ("sock", "addr", "parser", "outbuf", "outfile", "stream",
+                 "adapter", "served", "keep_alive", "deadline")
+
+    def __init__(self, sock, addr):
+        self.sock = sock
+        self.addr = addr
+        self.parser = HttpParser()
+        #: memoryviews of the response still to be sent.
+        self.outbuf = None
+        #: FileResponse whose body follows ``outbuf``.
+        self.outfile = None
+        #: StreamResponse whose next chunk follows ``outbuf``.
+        self.stream = None
+        #: Adapter (and its Request/Response) reused for every request.
+        self.adapter = None
+        self.served = 0
+        self.keep_alive = False
+        #: Idle/read/write Deadline on the server's timer wheel.
+        self.deadline = None
+
+
+class SelectorServer:
+    """
+    Non-blocking, selector driven HTTP backend.
+
+    Attributes:
+        ip (str): IP address to bind the server.
+        port (int): Port number to listen on.
+        routes (dict): Mapping of route paths to handler functions.
+        workers (int): Size of the hook worker pool.
+        backlog (int): Listen backlog of the server socket.
+        limiter (Limiter): connection and request limits.
+    """
+
+    __attrs__ = [
+        "ip",
+        "port",
+        "routes",
+        "workers",
+        "backlog",
+        "limiter",
+    ]
+
+    def __init__(self, ip, port, routes, workers=DEFAULT_WORKERS, backlog=socket.SOMAXCONN,
+                 limiter=None):
+        """
+        Initialize a new SelectorServer instance.
+
+        :param ip (str): IP address to bind the server.
+        :param port (int): Port number to listen on.
+        :param routes (dict): Mapping of route paths to handler functions.
+        :param workers (int): Size of the hook worker pool.
+        :param backlog (int): Listen backlog of the server socket.
+        :param limiter (Limiter): connection and request limits, defaults if None.
+        """
+        self.ip = ip
+        self.port = port
+        self.routes = routes
+        self.workers = workers
+        self.backlog = backlog
+        self.limiter = limiter or Limiter("backend")
+
+        self.selector = selectors.DefaultSelector()
+        self.wheel = TimerWheel()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="hook")
+        self.completed = queue.SimpleQueue()
+        self._wakeup_r, self._wakeup_w = socket.socketpair()
+        self._wakeup_r.setblocking(False)
+        self._wakeup_w.setblocking(False)
+
+    def serve_forever(self, server=None):
+        """
+        Run the event loop forever.
+
+        :param server (socket.socket, optional): an already bound listening socket.
+                     A new one is created on ``ip``/``port`` when omitted.
+        """
+        if server is None:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            server.bind((self.ip, self.port))
+            server.listen(self.backlog)
+        server.setblocking(False)
+
+        self.server = server
+        self.selector.register(server, selectors.EVENT_READ)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ)
+        logger.info("selector engine (%s) with %d workers",
+                    type(self.selector).__name__, self.workers)
+
+        next_sweep = time.monotonic() + 1.0
+        try:
+            while True:
+                now = time.monotonic()
+                self.wheel.advance(now)
+                if now >= next_sweep:
+                    self.limiter.expire(now)
+                    next_sweep = now + 1.0
+
+                for key, mask in self.selector.select(timeout=self.wheel.resolution):
+                    if key.fileobj is server:
+                        self._accept(server)
+                    elif key.fileobj is self._wakeup_r:
+                        self._drain_completed()
+                    elif mask & selectors.EVENT_READ:
+                        self._read(key.data)
+                    elif mask & selectors.EVENT_WRITE:
+                        self._write(key.data)
+        finally:
+            self.pool.shutdown(wait=False)
+            self.selector.close()
+
+    def _accept(self, server):
+        """Accept every pending connection on the listening socket."""
+        while True:
+            try:
+                sock, addr = server.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                logger.warning("accept error: %s", e)
+                return
+            if not self.limiter.connect():
+                self.limiter.reject(sock)
+                continue
+            sock.setblocking(False)
+            connection = _Connection(sock, addr)
+            connection.deadline = Deadline(self.wheel, "backend",
+                                           on_expire=functools.partial(self._timeout, connection))
+            connection.deadline.arm("idle")
+            self.selector.register(sock, selectors.EVENT_READ, connection)
+
+    def _read(self, connection):
+        """Read what is available and dispatch the request once complete."""
+        try:
+            received = connection.parser.recv_from(connection.sock)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            received = 0
+
+        if not received:
+            self._close(connection)
+            return
+
+        self._try_dispatch(connection, registered=True)
+
+    def _try_dispatch(self, connection, registered=False):
+        """
+        Submit the buffered request, if complete, to the worker pool. A
+        malformed request is answered with 400 and the connection closed.
+
+        :param registered (bool): whether the socket is watched for reading;
+                          it is unregistered while a worker owns the request.
+        :rtype bool: False if more bytes are needed.
+        """
+        try:
+            if not connection.parser.parse():
+                if connection.parser.expect_continue:
+                    connection.parser.expect_continue = False
+                    try:
+                        connection.sock.send(CONTINUE_RESPONSE)
+                    except (BlockingIOError, InterruptedError):
+                        # The client sends the body anyway after a short wait.
+                        pass
+                connection.deadline.reading(connection.parser)
+                return False
+        except HttpParseError as e:
+            connection.deadline.cancel()
+            if registered:
+                self.selector.unregister(connection.sock)
+            logger.info("Bad request from %s: %s", connection.addr, e)
+            response = self._adapter(connection).build_error_response(e.status, e.reason)
+            response, connection.keep_alive = frame_response(response, False)
+            connection.outbuf = [memoryview(response)]
+            self._write(connection, registered=False)
+            return True
+
+        connection.deadline.cancel()
+        if registered:
+            self.selector.unregister(connection.sock)
+        self._admit(connection)
+        return True
+
+    def _admit(self, connection):
+        """Submit the request to the worker pool once the limiter has a slot
+        for it, or answer 503."""
+        admitted = self.limiter.acquire(
+            functools.partial(self.pool.submit, self._dispatch, connection),
+            functools.partial(self._shed, connection))
+        if admitted:
+            self.pool.submit(self._dispatch, connection)
+        elif admitted is False:
+            self._shed(connection)
+
+    def _shed(self, connection):
+        """Loop side: answer a request the limiter refused and close."""
+        logger.debug("Shed request from %s", connection.addr)
+        connection.keep_alive = False
+        connection.outbuf = [memoryview(self.limiter.response)]
+        self._write(connection, registered=False)
+
+    def _adapter(self, connection):
+        """Return the adapter bound to ``connection``, creating it on first use."""
+        if connection.adapter is None:
+            connection.adapter = HttpAdapter(self.ip, self.port, connection.sock,
+                                             connection.addr, self.routes)
+        return connection.adapter
+
+    def _dispatch(self, connection):
+        """Worker side: run the adapter and hand the reply back to the loop."""
+        adapter = self._adapter(connection)
+        connection.served += 1
+
+        try:
+            response = adapter.handle_request(connection.parser, self.routes)
+            keep_alive = (connection.served < KEEPALIVE_MAX_REQUESTS
+                          and adapter.request.wants_keep_alive())
+        except Exception:
+            logger.exception("Error dispatching request from %s", connection.addr)
+            response = adapter.build_error_response(500, "Internal Server Error")
+            keep_alive = False
+        finally:
+            self.limiter.release()
+        response, connection.keep_alive = frame_response(response, keep_alive,
+                                                         adapter.request.method)
+        consume_request(connection.parser, response)
+        self._complete(connection, response)
+
+    def _next_chunk(self, connection):
+        """Worker side: produce the next chunk of a streamed response."""
+        stream = connection.stream
+        try:
+            chunk = stream.next_chunk()
+            buffers = stream.frame(chunk)
+        except Exception as e:
+            logger.info("Streamed response to %s aborted: %s", connection.addr, e)
+            chunk, buffers = None, []
+            connection.keep_alive = False
+        if chunk is None:
+            stream.close()
+            connection.stream = None
+        self._complete(connection, buffers)
+
+    def _complete(self, connection, response):
+        """Hand ``response`` over to the loop for writing."""
+        self.completed.put((connection, response))
+        try:
+            self._wakeup_w.send(b"\0")
+        except (BlockingIOError, InterruptedError):
+            # The pipe is already full of wakeups; the loop will drain everything.
+            pass
+
+    def _drain_completed(self):
+        """Loop side: start writing every response finished by the workers."""
+        try:
+            while self._wakeup_r.recv(4096):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+
+        while True:
+            try:
+                connection, response = self.completed.get_nowait()
+            except queue.Empty:
+                return
+            if isinstance(response, FileResponse):
+                connection.outfile = response
+                response = response.header
+            elif isinstance(response, StreamResponse):
+                connection.stream = response
+                response = response.header
+            if isinstance(response, list):
+                connection.outbuf = [memoryview(buffer) for buffer in response]
+            else:
+                connection.outbuf = [memoryview(response)]
+            self._write(connection, registered=False)
+
+    def _write(self, connection, registered=True):
+        """Send as much of the pending response as the socket accepts."""
+        try:
+            while connection.outbuf:
+                connection.outbuf = write_buffers(connection.sock, connection.outbuf)
+            if connection.outfile is not None:
+                self._send_file(connection)
+        except (BlockingIOError, InterruptedError):
+            if not registered:
+                connection.deadline.arm("write")
+                self.selector.register(connection.sock, selectors.EVENT_WRITE, connection)
+            else:
+                connection.deadline.touch()
+            return
+        except OSError:
+            connection.keep_alive = False
+            if connection.stream is not None:
+                self.pool.submit(connection.stream.close)
+                connection.stream = None
+
+        connection.deadline.cancel()
+        if registered:
+            self.selector.unregister(connection.sock)
+        connection.outbuf = None
+        if connection.outfile is not None:
+            connection.outfile.close()
+            connection.outfile = None
+        if connection.stream is not None:
+            # Written out: let a worker produce the next chunk.
+            self.pool.submit(self._next_chunk, connection)
+            return
+
+        if not connection.keep_alive:
+            self._close(connection)
+            return
+
+        # A pipelined request may already be waiting in the buffer.
+        if not self._try_dispatch(connection):
+            self.selector.register(connection.sock, selectors.EVENT_READ, connection)
+
+    def _send_file(self, connection):
+        """
+        Send the remaining body parts of ``connection.outfile``, file slices
+        with ``os.sendfile``.
+
+        :raise BlockingIOError: when the socket buffer is full; the progress
+                                is saved in the first part.
+        :raise OSError: when the file ends before the announced size.
+        """
+        response = connection.outfile
+        parts = response.parts
+        sock = connection.sock
+        out_fd = sock.fileno()
+        in_fd = response.file.fileno()
+        while parts:
+            part = parts[0]
+            if isinstance(part, tuple):
+                offset, count = part
+                try:
+                    while count > 0:
+                        sent = os.sendfile(out_fd, in_fd, offset, count)
+                        if sent == 0:
+                            raise OSError("file truncated while sending")
+                        offset += sent
+                        count -= sent
+                finally:
+                    parts[0] = (offset, count)
+            else:
+                view = memoryview(part)
+                try:
+                    while view:
+                        view = view[sock.send(view):]
+                finally:
+                    parts[0] = view
+            parts.popleft()
+
+    def _timeout(self, connection):
+        """Loop side: close a connection whose deadline has passed."""
+        logger.debug("Client %s timed out (%s)", connection.addr, connection.deadline.phase)
+        if connection.outfile is not None:
+            connection.outfile.close()
+            connection.outfile = None
+        if connection.stream is not None:
+            self.pool.submit(connection.stream.close)
+            connection.stream = None
+        self._close(connection)
+
+    def _close(self, connection):
+        """Forget a connection and close its socket."""
+        connection.deadline.cancel()
+        try:
+            self.selector.unregister(connection.sock)
+        except (KeyError, ValueError):
+            pass
+        connection.sock.close()
+        self.limiter.disconnect()
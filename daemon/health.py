@@ -0,0 +1,343 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.health
+~~~~~~~~~~~~~~~~~
+
+This module provides the health state of the proxy's upstreams, which the
+balancer policies consult to skip the ones that are down.
+
+Two mechanisms take an upstream out of rotation:
+
+- Active checks, enabled per host block with ``health_check``: a daemon
+  thread per upstream requests ``path`` every ``interval`` seconds. ``fall``
+  consecutive failed checks (no connection, no response within ``timeout``,
+  or a status other than 2xx/3xx) mark the upstream unhealthy, ``rise``
+  consecutive passed checks healthy again.
+- Passive ejection, always on: :data:`MAX_FAILS` consecutive failed
+  requests (connection errors, timeouts or 5xx responses) eject the
+  upstream for :data:`EJECT_TIME` seconds. Once readmitted it is on
+  probation: one more failure ejects it again for twice as long, up to
+  :data:`MAX_EJECT_TIME`; :data:`MAX_FAILS` consecutive successes end the
+  probation.
+
+Notes:
+------
+- Each :class:`Upstream <daemon.balancer.Upstream>` has one :class:`Health
+  <Health>`, whichever host blocks use it; the first ``health_check`` of an
+  upstream starts its checks, later ones are ignored.
+- Requests report their outcome without taking a lock unless it changes the
+  state of the upstream.
+- The state of each upstream (1 when it receives requests), ejections and
+  checks are recorded in :data:`daemon.metrics.REGISTRY`.
+
+Usage Example:
+--------------
+>>> health = Health("127.0.0.1:9000")
+>>> health.failure("connection refused")
+>>> health.available()
+True
+>>> watch(upstream, path="/health", interval=5)
+
+"""
+
+import time
+import socket
+import logging
+import threading
+
+from .metrics import REGISTRY
+from .upstream import read_head, parse_response_head, UpstreamError
+
+logger = logging.getLogger(__name__)
+
+#: Consecutive failed requests that eject an upstream.
+MAX_FAILS = 5
+
+#: Seconds of the first ejection; each ejection on probation doubles it.
+EJECT_TIME = 10.0
+
+#: Longest ejection in seconds.
+MAX_EJECT_TIME = 300.0
+
+#: Defaults of ``health_check``.
+CHECK_PATH = "/"
+CHECK_INTERVAL = 5.0
+CHECK_TIMEOUT = 2.0
+CHECK_RISE = 2
+CHECK_FALL = 3
+
+EJECTIONS = REGISTRY.counter(
+    "proxy_upstream_ejections_total", "Upstreams ejected after consecutive failures.", ("upstream",))
+CHECKS = REGISTRY.counter(
+    "proxy_upstream_health_checks_total", "Active health checks by result.", ("upstream", "result"))
+
+
+def check_settings(options):
+    """
+    Validate the options of a ``health_check`` directive.
+
+    :param options (dict): option names to string values, among ``path``,
+                    ``interval``, ``timeout``, ``rise`` and ``fall``.
+    :rtype dict: keyword arguments of :func:`watch`.
+    :raise ValueError: on an unknown option or a bad value.
+    """
+    settings = {}
+    for name, value in options.items():
+        if name == "path":
+            if not value.startswith("/"):
+                raise ValueError("health_check path must start with /")
+            settings[name] = value
+        elif name in ("interval", "timeout"):
+            settings[name] = float(value)
+            if settings[name] <= 0:
+                raise ValueError("health_check {} must be positive".format(name))
+        elif name in ("rise", "fall"):
+            settings[name] = int(value)
+            if settings[name] < 1:
+                raise ValueError("health_check {} must be at least 1".format(name))
+        else:
+            raise ValueError("unknown health_check option {!r}".format(name))
+    return settings
+
+
+class Health:
+    """
+    Health of one upstream.
+
+    Attributes:
+        address (str): ``host:port`` of the upstream.
+        healthy (bool): verdict of the active checks, True without checks.
+        ejected_until (float): monotonic time a passive ejection ends, 0.0
+                               when not ejected.
+        ejections (int): ejections since the upstream last left probation.
+    """
+
+    __attrs__ = [
+        "address",
+        "healthy",
+        "ejected_until",
+        "ejections",
+    ]
+
+    def __init__(self, address):
+        """
+        :param address (str): ``host:port`` of the upstream.
+        """
+        self.address = address
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.ejections = 0
+        #: Consecutive failed requests, or successes while on probation.
+        self.fails = 0
+        self.successes = 0
+        #: Consecutive passed or failed checks, towards rise or fall.
+        self.streak = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._ejected = EJECTIONS.labels(address)
+
+    def __repr__(self):
+        return "<Health {} {}>".format(self.address, self.state())
+
+    def available(self, now=None):
+        """Whether the upstream should receive requests."""
+        if not self.healthy:
+            return False
+        until = self.ejected_until
+        return not until or (time.monotonic() if now is None else now) >= until
+
+    def state(self):
+        """:rtype str: ``healthy``, ``ejected`` or ``unhealthy``."""
+        if not self.healthy:
+            return "unhealthy"
+        if not self.available():
+            return "ejected"
+        return "healthy"
+
+    def success(self):
+        """Record a request the upstream answered without a 5xx."""
+        if self.fails:
+            self.fails = 0
+        if not self.ejections:
+            return
+        with self._lock:
+            self.successes += 1
+            if self.ejections and self.successes >= MAX_FAILS:
+                logger.info("Upstream %s is off probation", self.address)
+                self.ejections = 0
+                self.successes = 0
+
+    def failure(self, reason):
+        """
+        Record a request that failed on the upstream.
+
+        :param reason (str): error or status, kept for the stats and logs.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self.last_error = reason
+            self.successes = 0
+            if now < self.ejected_until:
+                # Requests sent before the ejection.
+                return
+            self.fails += 1
+            if self.fails < (1 if self.ejections else MAX_FAILS):
+                return
+            self.fails = 0
+            self.ejections += 1
+            duration = min(EJECT_TIME * 2 ** (self.ejections - 1), MAX_EJECT_TIME)
+            self.ejected_until = now + duration
+        self._ejected.inc()
+        logger.warning("Upstream %s ejected for %.0fs: %s", self.address, duration, reason)
+
+    def check(self, passed, reason=None, rise=CHECK_RISE, fall=CHECK_FALL):
+        """
+        Record the result of an active check.
+
+        :param passed (bool): whether the check passed.
+        :param reason (str): why it failed.
+        :param rise (int): consecutive passes that mark the upstream healthy.
+        :param fall (int): consecutive failures that mark it unhealthy.
+        """
+        with self._lock:
+            if passed == self.healthy:
+                self.streak = 0
+                return
+            self.streak += 1
+            if self.streak < (rise if passed else fall):
+                return
+            self.streak = 0
+            self.healthy = passed
+        if passed:
+            logger.info("Upstream %s passed its health checks", self.address)
+        else:
+            self.last_error = reason
+            logger.warning("Upstream %s failed its health checks: %s", self.address, reason)
+
+    def stats(self):
+        """
+        :rtype dict: state, ejections, seconds left of the ejection and the
+                     last error.
+        """
+        return {
+            "state": self.state(),
+            "ejections": self.ejections,
+            "ejected_for": max(0.0, self.ejected_until - time.monotonic()),
+            "last_error": self.last_error,
+        }
+
+
+class HealthCheck:
+    """
+    Active checks of one upstream, run by a daemon thread.
+
+    Attributes:
+        upstream (Upstream): the :class:`Upstream <daemon.balancer.Upstream>`.
+        path (str): path requested with GET.
+        interval (float): seconds between checks.
+        timeout (float): seconds a check may take.
+        rise (int): consecutive passes that mark the upstream healthy.
+        fall (int): consecutive failures that mark it unhealthy.
+    """
+
+    __attrs__ = [
+        "upstream",
+        "path",
+        "interval",
+        "timeout",
+        "rise",
+        "fall",
+    ]
+
+    def __init__(self, upstream, path=CHECK_PATH, interval=CHECK_INTERVAL,
+                 timeout=CHECK_TIMEOUT, rise=CHECK_RISE, fall=CHECK_FALL):
+        self.upstream = upstream
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.request = (
+            "GET {} HTTP/1.1\r\n"
+            "Host: {}\r\n"
+            "User-Agent: WeApRous-health-check\r\n"
+            "Connection: close\r\n"
+            "\r\n"
+        ).format(path, upstream.address).encode('latin-1')
+        self._passed = CHECKS.labels(upstream.address, "passed")
+        self._failed = CHECKS.labels(upstream.address, "failed")
+        self._thread = None
+
+    def __repr__(self):
+        return "<HealthCheck {} {} every {}s>".format(self.upstream.address, self.path, self.interval)
+
+    def probe(self):
+        """
+        Request :attr:`path` once.
+
+        :rtype str: None if the check passed, else why it failed.
+        """
+        try:
+            with socket.create_connection((self.upstream.host, self.upstream.port),
+                                          self.timeout) as sock:
+                sock.sendall(self.request)
+                buf, head_end = read_head(sock)
+                status = parse_response_head(bytes(buf[:head_end]))[1]
+        except (OSError, UpstreamError) as e:
+            return str(e) or type(e).__name__
+        if not status.startswith((b"2", b"3")):
+            return "status " + status.decode('latin-1')
+        return None
+
+    def run_once(self):
+        """Probe the upstream and record the result."""
+        reason = self.probe()
+        (self._failed if reason else self._passed).inc()
+        self.upstream.health.check(reason is None, reason, self.rise, self.fall)
+
+    def start(self):
+        """Check the upstream from a daemon thread; idempotent."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name="health-check " + self.upstream.address)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Health check of %s failed", self.upstream.address)
+            time.sleep(self.interval)
+
+
+#: Active checks by upstream address.
+_checks = {}
+_checks_lock = threading.Lock()
+
+def watch(upstream, **settings):
+    """
+    Start the active checks of ``upstream`` unless it is checked already.
+
+    :param upstream (Upstream): the :class:`Upstream <daemon.balancer.Upstream>`.
+    :param settings: keyword arguments of :class:`HealthCheck <HealthCheck>`,
+                     see :func:`check_settings`.
+    :rtype HealthCheck: the checks of the upstream.
+    """
+    with _checks_lock:
+        check = _checks.get(upstream.address)
+        if check is None:
+            check = _checks[upstream.address] = HealthCheck(upstream, **settings)
+    return check.start()
@@ -21,9 +21,237 @@ Request and Response objects to handle client-server communication.
 """
 
 import socket
-from .request import Request
-from .response import Response
+import asyncio
+import inspect
+import logging
+from .request import Request, RequestContext
+from .httpparser import HttpParser, HttpParseError
+from .response import Response, FileResponse, StreamResponse, error_response
+from .middleware import Pipeline, CookieAuth
 from .dictionary import CaseInsensitiveDict
+from .timeouts import WHEEL, Deadline
+
+logger = logging.getLogger(__name__)
+
+#: Requests served on one persistent connection before it is closed.
+KEEPALIVE_MAX_REQUESTS = 100
+
+#: Largest file slice sent in one ``sendfile`` call; the write deadline is
+#: extended between slices.
+SENDFILE_BLOCK = 1024 * 1024
+
+#: Status codes whose responses never carry a body.
+_BODYLESS_STATUS = (b"1", b"204", b"304")
+
+_HAS_SENDMSG = hasattr(socket.socket, "sendmsg")
+
+#: Interim response sent to clients waiting on ``Expect: 100-continue``.
+CONTINUE_RESPONSE = b"HTTP/1.1 100 Continue\r\n\r\n"
+
+#: Middleware of backends started with a plain route dict instead of a
+#: :class:`WeApRous <WeApRous>` app: the login cookie guards every hook and
+#: ``/index.html``.
+DEFAULT_PIPELINE = Pipeline([CookieAuth()])
+
+
+def frame_response(response, keep_alive, method=None):
+    """
+    Make a raw HTTP response safe to send on a persistent connection.
+
+    A Content-Length header is added when the response does not declare its
+    own framing, and the Connection header is set to reflect ``keep_alive``.
+    Responses that explicitly ask for ``Connection: close`` or that cannot be
+    parsed turn keep-alive off. The response to a HEAD request keeps its
+    headers, Content-Length included, and loses its body, whatever produced
+    it: a hook, a middleware, an error or the static file server.
+
+    A :class:`Response <Response>` returned by a route hook is rendered into
+    a list of buffers (header and body) to be sent with one vectored write, or
+    into a :class:`StreamResponse <StreamResponse>` for a streamed body.
+
+    :param response (bytes, list, FileResponse or Response): raw HTTP
+                     response, the header and body buffers of a cached static
+                     file or a file response, whose header is framed in place,
+                     or a response object to render.
+    :param keep_alive (bool): whether the connection should stay open.
+    :param method (str): method of the request answered, None if unknown.
+
+    :rtype: tuple - (framed response, effective keep_alive).
+    """
+    head = method == 'HEAD'
+    if isinstance(response, Response):
+        response, keep_alive = response.render(keep_alive)
+        if head and isinstance(response, StreamResponse):
+            response.close()
+            return response.header, keep_alive
+        if head and isinstance(response, list):
+            del response[1:]
+        return response, keep_alive
+    if isinstance(response, FileResponse):
+        response.header, keep_alive = frame_response(response.header, keep_alive)
+        if head:
+            response.close()
+            return response.header, keep_alive
+        return response, keep_alive
+    if isinstance(response, list):
+        response[0], keep_alive = frame_response(response[0], keep_alive)
+        if head:
+            del response[1:]
+        return response, keep_alive
+
+    head_end = response.find(b"\r\n\r\n")
+    if head_end < 0:
+        return response, False
+
+    lines = response[:head_end].split(b"\r\n")
+    body = response[head_end + 4:]
+
+    headers = [lines[0]]
+    framed = False
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        if name == b"connection":
+            if b"close" in value.lower():
+                keep_alive = False
+            continue
+        if name in (b"content-length", b"transfer-encoding"):
+            framed = True
+        headers.append(line)
+
+    status = lines[0].split(b" ", 2)[1:2]
+    if not framed and not (status and status[0].startswith(_BODYLESS_STATUS)):
+        headers.append(b"Content-Length: " + str(len(body)).encode())
+    headers.append(b"Connection: keep-alive" if keep_alive else b"Connection: close")
+
+    if head:
+        body = b""
+    return b"\r\n".join(headers) + b"\r\n\r\n" + body, keep_alive
+
+
+def consume_request(parser, response):
+    """
+    Discard the served request from ``parser`` once its response is framed.
+
+    The generator of a :class:`StreamResponse <StreamResponse>` may still
+    read the request body while it is sent, so a streamed request body is
+    handed over to the response and closed with it. A body held in the
+    parser buffer stays valid until the next request is read.
+
+    :param parser (HttpParser): the connection's parser.
+    :param response: the framed response.
+    """
+    if isinstance(response, StreamResponse) and parser.body_stream is not None:
+        response.request_body = parser.detach_body()
+    parser.consume()
+
+
+def write_buffers(sock, buffers):
+    """
+    Send as much of ``buffers`` as ``sock`` accepts in one vectored write
+    (``sendmsg``), or a single ``send`` where ``sendmsg`` is unavailable.
+
+    :param sock (socket): connected socket, blocking or not.
+    :param buffers (list): non-empty list of memoryviews.
+    :rtype: list - the memoryviews still to be sent.
+    :raise BlockingIOError: if a non-blocking socket accepts nothing.
+    """
+    sent = sock.sendmsg(buffers) if _HAS_SENDMSG else sock.send(buffers[0])
+    index = 0
+    while index < len(buffers) and sent >= len(buffers[index]):
+        sent -= len(buffers[index])
+        index += 1
+    buffers = buffers[index:]
+    if sent:
+        buffers[0] = buffers[0][sent:]
+    return buffers
+
+
+def send_buffers(conn, buffers, deadline=None):
+    """
+    Send every buffer of ``buffers`` on a blocking (or timeout) socket.
+
+    :param conn (socket): The client socket connection.
+    :param buffers (list): bytes-like objects, sent in order.
+    :param deadline (Deadline): write deadline extended after each write.
+    """
+    buffers = [memoryview(buffer) for buffer in buffers if len(buffer)]
+    while buffers:
+        buffers = write_buffers(conn, buffers)
+        if deadline is not None:
+            deadline.touch()
+
+
+def send_stream(conn, response, deadline=None):
+    """
+    Send a :class:`StreamResponse <StreamResponse>` on a blocking (or timeout)
+    socket. The next chunk is only produced once the previous one has been
+    handed to the kernel, so the socket's blocking sends pace the generator.
+
+    :param conn (socket): The client socket connection.
+    :param response (StreamResponse): framed streamed response.
+    :param deadline (Deadline): write deadline extended after each write.
+    :rtype: bool - False if the body ended early; the connection must be closed.
+    """
+    try:
+        send_buffers(conn, [response.header], deadline)
+        while True:
+            chunk = response.next_chunk()
+            send_buffers(conn, response.frame(chunk), deadline)
+            if chunk is None:
+                return True
+    except Exception as e:
+        logger.info("Streamed response aborted: %s", e)
+        return False
+    finally:
+        response.close()
+
+
+def send_response(conn, response, deadline=None):
+    """
+    Send a framed response on a blocking (or timeout) socket.
+
+    The buffers of a rendered :class:`Response <Response>` go out with
+    vectored writes. The file slices of a :class:`FileResponse <FileResponse>`
+    are sent with ``socket.sendfile`` and its file closed afterwards. The
+    chunks of a :class:`StreamResponse <StreamResponse>` are sent as they are
+    produced.
+
+    :param conn (socket): The client socket connection.
+    :param response (bytes, list, FileResponse or StreamResponse): framed response.
+    :param deadline (Deadline): write deadline extended after each part.
+    :rtype: bool - False if the response could not be completed.
+    """
+    if isinstance(response, list):
+        send_buffers(conn, response, deadline)
+        return True
+    if isinstance(response, StreamResponse):
+        return send_stream(conn, response, deadline)
+    if not isinstance(response, FileResponse):
+        conn.sendall(response)
+        return True
+    try:
+        conn.sendall(response.header)
+        parts = response.parts
+        while parts:
+            part = parts.popleft()
+            if isinstance(part, tuple):
+                offset, count = part
+                while count > 0:
+                    block = min(count, SENDFILE_BLOCK)
+                    conn.sendfile(response.file, offset, block)
+                    if deadline is not None:
+                        deadline.touch()
+                    offset += block
+                    count -= block
+            else:
+                conn.sendall(part)
+            if deadline is not None:
+                deadline.touch()
+        return True
+    finally:
+        response.close()
+
 
 class HttpAdapter:
     """
@@ -81,126 +309,247 @@ class HttpAdapter:
         #: Response
         self.response = Response()
 
-    def handle_client(self, conn, addr, routes):
+    def handle_client(self, conn, addr, routes, limiter=None):
         """
         Handle an incoming client connection.
 
-        This method reads the request from the socket, prepares the request object,
+        This method reads requests from the socket, prepares the request object,
         invokes the appropriate route handler if available, builds the response,
-        and sends it back to the client.
+        and sends it back to the client. HTTP/1.1 persistent connections are
+        honoured: requests are served in a loop until the client asks to close,
+        a read or write deadline of :mod:`daemon.timeouts` passes or
+        :data:`KEEPALIVE_MAX_REQUESTS` requests have been served.
 
         :param conn (socket): The client socket connection.
         :param addr (tuple): The client's address.
         :param routes (dict): The route mapping for dispatching requests.
+        :param limiter (Limiter): request limits; a request that gets no slot
+                        is answered with 503 and the connection closed.
         """
 
         # Connection handler.
         self.conn = conn        
         # Connection address.
         self.connaddr = addr
-        # Request handler
-        req = self.request
-        # Response handler
-        resp = self.response
+        # Idle, read and write deadlines, enforced by the shared timer wheel.
+        deadline = Deadline(WHEEL, "backend", conn)
+
+        parser = HttpParser()
+        served = 0
+        keep_alive = True
 
-        
-        # Handle the request
         try:
-            buffer = b""
-            
-            # 1. Read until we have headers (Double CRLF)
-            while b"\r\n\r\n" not in buffer:
-                chunk = conn.recv(4096)
-                if not chunk:
-                    break
-                buffer += chunk
-            
-            if not buffer:
-                print("[HttpAdapter] Empty request received from {}:{}".format(addr[0], addr[1]))
-                conn.close()
-                return
-
-            # 2. Extract Content-Length to know how much body to read
-            headers_part, body_part = buffer.split(b"\r\n\r\n", 1)
-            content_length = 0
-            
-            # Simple parsing to find Content-Length in the binary headers
-            # We decode just the headers to search for the string
-            try:
-                headers_str = headers_part.decode('utf-8', errors='ignore')
-                for line in headers_str.split('\r\n'):
-                    if line.lower().startswith('content-length:'):
-                        content_length = int(line.split(':')[1].strip())
+            while keep_alive:
+                try:
+                    if not self.read_request(conn, parser, deadline):
+                        if served == 0:
+                            logger.debug("Empty request received from %s:%s", addr[0], addr[1])
                         break
-            except Exception as e:
-                print(f"[HttpAdapter] Error parsing content length: {e}")
-
-            # 3. Read the rest of the body if we haven't received it all yet
-            while len(body_part) < content_length:
-                to_read = content_length - len(body_part)
-                # We read up to 4096 or exactly what's left, whichever is smaller
-                chunk = conn.recv(min(4096, to_read))
-                if not chunk:
+                except HttpParseError as e:
+                    logger.info("Bad request from %s: %s", addr, e)
+                    conn.sendall(frame_response(self.build_error_response(e.status, e.reason), False)[0])
                     break
-                body_part += chunk
-
-            # Combine headers and full body back into a string for existing logic
-            msg = (headers_part + b"\r\n\r\n" + body_part).decode('utf-8')
-            req.prepare(msg, routes)
-
-            public_path = [
-                '/login.html',
-                ]
-                
-            is_public = (
-                req.path in public_path or
-                req.path.startswith('/static/') or
-                req.path.startswith('/api/') or 
-                req.path.startswith('/images/')
-            )
-
-            # Handle request hook
-            if req.hook:
-                print("[HttpAdapter] hook in route-path METHOD {} PATH {}".format(req.hook._route_path,req.hook._route_methods))
-                
-                hook_result = req.hook(headers=str(req.headers), body = req.body)
-                
-
-                if hook_result is not None:
-                    if req.hook._route_path == '/login' and req.hook._route_methods == ['POST']:
-                        response = hook_result.encode('utf-8')
-                        print("[HttpAdapter] Hook processed for login {}".format(response))  
-                    else:
-                        if req.cookies.get('auth','') == 'true':
-                            response = hook_result.encode('utf-8')
-                            if req.hook._route_path != '/ping': 
-                                print("[HttpAdapter] Hook processed for protected route {}".format(response))
-                        else:
-                            response = self.build_error_response(401, "Unauthorized")
-                            print("[HttpAdapter] Unauthorized access attempt to protected route via hook")
-
-            elif req.method == 'POST' and req.path == '/login':
-                print("[HttpAdapter] Handling login POST request")
-                response = self.handle_login(req, resp)
-            elif (req.path == '/index.html' or req.path == '/') and not is_public:
-                print("[HttpAdapter] Handling protected route request")
-                response = self.handle_protected_route(req, resp)
-            else:
-                print("[HttpAdapter] Handling general request")
-                response = resp.build_response(req)
-                #
-                # TODO: handle for App hook here
-                #
-
-            # Build response
-        except Exception as e:
-            print(f"[HttpAdapter] Error handling client {addr}: {e}")
+                served += 1
+
+                if limiter is not None and not limiter.acquire_blocking():
+                    logger.debug("Shed request from %s", addr)
+                    conn.sendall(limiter.response)
+                    break
+                try:
+                    response = self.handle_request(parser, routes)
+                    keep_alive = (served < KEEPALIVE_MAX_REQUESTS
+                                  and self.request.wants_keep_alive())
+                except Exception:
+                    logger.exception("Error handling client %s", addr)
+                    response = self.build_error_response(500, "Internal Server Error")
+                    keep_alive = False
+                finally:
+                    if limiter is not None:
+                        limiter.release()
+                response, keep_alive = frame_response(response, keep_alive,
+                                                      self.request.method)
+                consume_request(parser, response)
+                deadline.arm("write")
+                sent = send_response(conn, response, deadline)
+                deadline.cancel()
+                if not sent:
+                    break
+        except OSError as e:
+            logger.debug("Socket error with client %s: %s", addr, e)
+        finally:
+            deadline.cancel()
+            if deadline.expired:
+                logger.debug("Client %s timed out", addr)
+            conn.close()
+
+    def read_request(self, conn, parser, deadline=None):
+        """
+        Receive bytes into ``parser`` until it holds one complete request.
+
+        :param conn (socket): The client socket connection.
+        :param parser (HttpParser): The connection's incremental parser; bytes
+                      of pipelined requests stay buffered in it.
+        :param deadline (Deadline): idle/header/body deadline of the connection,
+                        disarmed once the request is complete.
+
+        :rtype: bool - False when the client closed the connection first, or
+                its deadline passed.
+        :raise HttpParseError: if the request is malformed or its body too large.
+        """
+        while not parser.parse():
+            if parser.expect_continue:
+                parser.expect_continue = False
+                conn.sendall(CONTINUE_RESPONSE)
+            if deadline is not None:
+                deadline.reading(parser)
+            if not parser.recv_from(conn):
+                return False
+        if deadline is not None:
+            deadline.cancel()
+        return True
+
+    def handle_request(self, msg, routes):
+        """
+        Dispatch one complete HTTP request message and build the reply.
+
+        This is the socket-free half of :meth:`handle_client`, so engines that
+        read requests themselves (see :mod:`daemon.eventloop`) can reuse the
+        routing, hook and static file logic.
+
+        :param msg (HttpParser or str): A parser holding a complete request, or
+                   the full HTTP request text.
+        :param routes (dict): The route mapping for dispatching requests.
+        :rtype: bytes, list, FileResponse or Response - The raw HTTP response
+                bytes, the header and body buffers or the header and file of
+                a static file, or the response built from a hook result.
+        """
+        try:
+            self.prepare_request(msg, routes)
+            response = self.dispatch_request()
+        except Exception:
+            logger.exception("Error handling request from %s", self.connaddr)
             response = self.build_error_response(500, "Internal Server Error")
 
-            #print(response)
-        conn.sendall(response)
-        conn.close()
-        
+        if response is None:
+            response = self.build_error_response(500, "Internal Server Error")
+        return response
+
+    def prepare_request(self, msg, routes):
+        """
+        Reset the reusable :class:`Request <Request>`/:class:`Response <Response>`
+        pair and prepare the request from ``msg``.
+
+        :param msg (HttpParser or str): A parser holding a complete request, or
+                   the full HTTP request text.
+        :param routes (dict): The route mapping for dispatching requests.
+        """
+        # The same objects serve every request of a keep-alive connection
+        self.request.reset()
+        self.response.reset()
+
+        if isinstance(msg, HttpParser):
+            self.request.prepare_from_parser(msg, routes)
+        else:
+            self.request.prepare(msg, routes)
+
+    def pipeline_for(self, req):
+        """
+        The middleware :class:`Pipeline <Pipeline>` of the prepared request:
+        the one compiled for its route hook, or the one of unrouted requests.
+        Backends started with a plain route dict use :data:`DEFAULT_PIPELINE`.
+
+        :param req: The prepared :class:`Request <Request>`.
+        :rtype: Pipeline
+        """
+        if req.hook is not None:
+            pipeline = getattr(req.hook, '_route_pipeline', None)
+        else:
+            pipeline = getattr(req.routes, 'pipeline', None)
+        return DEFAULT_PIPELINE if pipeline is None else pipeline
+
+    def dispatch_request(self):
+        """
+        Serve the prepared request through its middleware pipeline, which
+        wraps the route hook or the static file server.
+
+        :rtype: bytes, list, FileResponse or Response - The raw HTTP response, or None.
+        """
+        return self.pipeline_for(self.request)(RequestContext(self.request), self.serve)
+
+    def serve(self, ctx):
+        """
+        Endpoint of the middleware pipeline: run the route hook, or answer
+        405 for a path routed for other methods only, or serve the static
+        login form handler and files.
+
+        :param ctx: The :class:`RequestContext <RequestContext>` of the request.
+        :rtype: bytes, list, FileResponse or Response - The raw HTTP response, or None.
+        """
+        req = self.request
+        resp = self.response
+
+        if req.hook is not None:
+            hook_result = self.call_hook(req, ctx)
+            if inspect.isawaitable(hook_result):
+                # async def hook served by a synchronous engine
+                hook_result = asyncio.run(hook_result)
+            return self.build_hook_response(req, hook_result)
+
+        if req.allowed_methods:
+            return self.build_error_response(405, "Method Not Allowed",
+                                             {"Allow": ", ".join(req.allowed_methods)})
+        if req.method == 'POST' and ctx.path == '/login':
+            return self.handle_login(req, resp)
+        return resp.build_response(req)
+
+    def call_hook(self, req, ctx=None):
+        """
+        Invoke the route hook of ``req``. Path parameters captured by the
+        router are passed as keyword arguments. Hooks registered with a
+        ``request`` first parameter get a :class:`RequestContext
+        <RequestContext>`, the others the ``headers`` and ``body`` strings.
+
+        :param req: The prepared :class:`Request <Request>`.
+        :param ctx: The request's context, if the pipeline already made one.
+        :rtype: the hook result, or an awaitable for ``async def`` hooks.
+        """
+        if getattr(req.hook, '_route_context', False):
+            return req.hook(ctx or RequestContext(req), **req.path_params)
+        return req.hook(headers=str(req.headers), body=req.body, **req.path_params)
+
+    def build_hook_response(self, req, hook_result):
+        """
+        Turn the value returned by a route hook into a response.
+
+        A hook may return:
+
+        - a str holding a complete raw HTTP response, sent as it is;
+        - a dict or list, sent as a ``200 OK`` JSON body;
+        - bytes, sent as a ``200 OK`` ``application/octet-stream`` body;
+        - a generator or async generator of str/bytes chunks, streamed with
+          chunked transfer coding;
+        - a :class:`Response <Response>`, e.g. from :meth:`Response.make`,
+          for a custom status, headers or cookies.
+
+        :param req: The :class:`Request <Request>` the hook served.
+        :param hook_result: Value returned by the hook.
+        :rtype: bytes or Response - The raw HTTP response bytes, the response
+                to render, or None.
+        """
+        if hook_result is None:
+            return None
+        if isinstance(hook_result, str):
+            return hook_result.encode('utf-8')
+        if isinstance(hook_result, Response):
+            hook_result.request = req
+            return hook_result
+
+        # Plain data: serialized into the adapter's reusable response.
+        response = self.response
+        response.status_code = 200
+        response.set_content(hook_result)
+        response.request = req
+        return response
 
     def extract_cookies(self, req):
         """
@@ -281,20 +630,20 @@ class HttpAdapter:
 
         :param req: The incoming :class:`Request <Request>`.
         :param resp: The :class:`Response <Response>` object to build the reply.
-        :rtype: bytes - The raw HTTP response bytes.
+        :rtype: bytes, list or FileResponse - The raw HTTP response.
         """
         # Dummy login logic for demonstration
         form_data = req.parse_form_data()
         username = form_data.get('username', '')
         password = form_data.get('password', '')
 
-        print ("[HttpAdapter] Login attempt with username: {}, password: {}".format(username, password))
+        logger.debug("Login attempt with username: %s", username)
 
         if username == 'admin' and password == 'admin':
             resp.status_code = 200
             resp.set_cookie('auth', 'true')
             req.path = '/index.html'
-            print("[HttpAdapter] Login successful for user: {}".format(username))
+            logger.info("Login successful for user: %s", username)
             return resp.build_response(req)
         else:
             return self.build_error_response(401, "Unauthorized")
@@ -305,73 +654,32 @@ class HttpAdapter:
 
         :param req: The incoming :class:`Request <Request>`.
         :param resp: The :class:`Response <Response>` object to build the reply.
-        :rtype: bytes - The raw HTTP response bytes.
+        :rtype: bytes, list or FileResponse - The raw HTTP response.
         """
         # Dummy login logic for demonstration
         form_data = req.parse_form_data()
         username = form_data.get('username', '')
         password = form_data.get('password', '')
 
-        print ("[HttpAdapter] Login attempt with username: {}, password: {}".format(username, password))
+        logger.debug("Login attempt with username: %s", username)
 
         if username == 'admin' and password == 'admin':
             resp.status_code = 200
             resp.set_cookie('auth', 'true')
             req.path = '/index.html'
-            print("[HttpAdapter] Login successful for user: {}".format(username))
+            logger.info("Login successful for user: %s", username)
             return resp.build_response(req)
         else:
             return self.build_error_response(401, "Unauthorized")
 
 
-    def handle_protected_route(self, req, resp):
-        """
-        Handle access to protected routes.
-
-        :param req: The incoming :class:`Request <Request>`.
-        :param resp: The :class:`Response <Response>` object to build the reply.
-        :rtype: bytes - The raw HTTP response bytes.
-        """
-        cookies = req.cookies
-        auth_cookie = cookies.get('auth', '')
-
-        if auth_cookie == 'true':
-            if req.path == '/':
-                req.path = '/index.html'
-            return resp.build_response(req)
-        else:
-            return self.build_error_response(401, "Unauthorized")
-        
-    def build_error_response(self, status_code, message):
+    def build_error_response(self, status_code, message, headers=None):
         """
         Build an error response.
 
         :param status_code: HTTP status code.
         :param message: Error message.
+        :param headers (dict): extra response headers, e.g. ``Allow``.
         :rtype: bytes - The raw HTTP response bytes.
         """
-        if status_code == 401:
-            response_body = """
-            <html><body>
-            <h1>401 Unauthorized</h1>
-            <p>{}</p>
-            <a href="/login.html">Login Here for Access /index.html</a>
-            <a href="/loginchat.html">Login here toGo to Chat Room</a>
-            </body></html>
-            """.format(message)
-        else:
-            response_body = """
-            <html><body>
-            <h1>{} {}</h1>
-            <p>An error occurred: {}</p>
-            </body></html>
-            """.format(status_code, message, message)
-        
-        response_text = """HTTP/1.1 {} {}
-            Content-Type: text/html
-            Content-Length: {}
-            Connection: close
-
-            {}""".format(status_code, message, len(response_body), response_body)
-                    
-        return response_text.encode('utf-8')
\ No newline at end of file
+        return error_response(status_code, message, headers)
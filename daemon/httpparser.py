@@ -0,0 +1,527 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.httpparser
+~~~~~~~~~~~~~~~~~
+
+This module provides an incremental HTTP/1.x request parser shared by the
+backend engines and the proxy.
+
+Bytes are received straight into one reusable ``bytearray`` with
+``socket.recv_into``. The end of the header section is searched only in the
+newly received bytes, the request line and header boundaries are located once,
+and consumers get :class:`memoryview` slices of the buffer (header block, body,
+whole message) instead of copies.
+
+Notes:
+------
+- All offsets are relative to the start of the current message, so the buffer
+  can be compacted or grown without invalidating a partially parsed request.
+- Bodies announced with a Content-Length up to :data:`SPOOL_THRESHOLD` stay
+  in the receive buffer. Chunked bodies and larger ones are decoded while
+  they arrive and moved into a :class:`RequestBody <RequestBody>`, which
+  spills to a temporary file, so the receive buffer stays small.
+- Bodies larger than :data:`MAX_BODY_SIZE` are rejected with a 413 as soon
+  as the size is known (:func:`set_body_limits` changes both limits).
+- Views returned by :meth:`HttpParser.body` and :meth:`HttpParser.message`
+  are only valid until :meth:`HttpParser.consume` is called. The header
+  source returned by :meth:`HttpParser.header_source` stays valid, so headers
+  can be decoded later with :func:`decode_headers`.
+
+Usage Example:
+--------------
+>>> parser = HttpParser()
+>>> while not parser.parse():
+...     if not parser.recv_from(conn):
+...         break
+>>> parser.method, parser.target, parser.header("host")
+>>> parser.consume()
+
+"""
+
+from .requestbody import RequestBody
+
+#: Initial size of the receive buffer.
+INITIAL_BUFFER = 8192
+
+#: Minimum free space offered to one ``recv_into`` call.
+MIN_READ = 4096
+
+#: Largest accepted request line plus header section.
+MAX_HEADER_SIZE = 65536
+
+#: Largest accepted request body, decoded.
+MAX_BODY_SIZE = 64 * 1024 * 1024
+
+#: Bodies above this size are streamed into a spooled RequestBody.
+SPOOL_THRESHOLD = 1024 * 1024
+
+#: Free space offered to ``recv_into`` while a body is streamed.
+STREAM_READ = 65536
+
+#: Longest accepted chunk-size or trailer line.
+MAX_CHUNK_LINE = 4096
+
+# Body decoding states.
+_CHUNK_SIZE, _CHUNK_DATA, _CHUNK_END, _TRAILER, _BODY_DATA, _BODY_DONE = range(6)
+
+
+class HttpParseError(ValueError):
+    """
+    Raised when the received bytes are not a valid HTTP/1.x request.
+
+    Attributes:
+        status (int): status code of the error response.
+        reason (str): reason phrase of the error response.
+    """
+
+    def __init__(self, message, status=400, reason="Bad Request"):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+
+
+def set_body_limits(max_body_size=None, spool_threshold=None):
+    """
+    Change the request body limits of the parsers created afterwards.
+
+    :param max_body_size (int): largest accepted body, None to keep the
+                         current limit.
+    :param spool_threshold (int): size above which bodies are spooled to
+                           disk, None to keep the current threshold.
+    """
+    global MAX_BODY_SIZE, SPOOL_THRESHOLD
+    if max_body_size is not None:
+        MAX_BODY_SIZE = max_body_size
+    if spool_threshold is not None:
+        SPOOL_THRESHOLD = spool_threshold
+
+
+def decode_headers(text, offsets):
+    """
+    Decode header lines located by the parser.
+
+    :param text (str): the decoded header section of a message.
+    :param offsets (list): ``(line_start, colon, line_end)`` of its header lines.
+    :rtype dict: lower-cased header names mapped to their values.
+    """
+    return {text[line_start:colon].strip().lower(): text[colon + 1:line_end].strip()
+            for line_start, colon, line_end in offsets}
+
+
+def find_header(text, offsets, name, default=None):
+    """
+    Look up a single header line located by the parser without decoding
+    the others.
+
+    :param text (str): the decoded header section of a message.
+    :param offsets (list): ``(line_start, colon, line_end)`` of its header lines.
+    :param name (str): header name, case-insensitive.
+    :rtype str: header value or ``default``.
+    """
+    wanted = name.lower()
+    for line_start, colon, line_end in offsets:
+        if colon - line_start == len(wanted) and text[line_start:colon].lower() == wanted:
+            return text[colon + 1:line_end].strip()
+    return default
+
+
+class HttpParser:
+    """
+    Incremental parser for HTTP/1.x requests framed by Content-Length or
+    chunked transfer coding.
+
+    Attributes:
+        method (str): request method of the current message.
+        target (str): request target (path and query) of the current message.
+        version (str): HTTP version of the current message.
+        header_offsets (list): ``(line_start, colon, line_end)`` of every header
+                               line, relative to the message start.
+        content_length (int): announced body size; the decoded size once a
+                              streamed body is complete.
+        chunked (bool): whether the body uses chunked transfer coding.
+        body_stream (RequestBody): sink of a streamed body, else None.
+        expect_continue (bool): the client waits for ``100 Continue`` before
+                                sending the body; engines clear it once sent.
+        head_end (int): offset of the blank line ending the header section.
+        message_end (int): offset just past the body.
+    """
+
+    __attrs__ = [
+        "method",
+        "target",
+        "version",
+        "header_offsets",
+        "content_length",
+        "chunked",
+        "body_stream",
+        "expect_continue",
+        "head_end",
+        "message_end",
+    ]
+
+    def __init__(self, size=INITIAL_BUFFER, max_header_size=MAX_HEADER_SIZE,
+                 max_body_size=None, spool_threshold=None):
+        """
+        Initialize a new HttpParser instance.
+
+        :param size (int): initial buffer size.
+        :param max_header_size (int): limit for the request line plus headers.
+        :param max_body_size (int): limit for a decoded body, default
+                             :data:`MAX_BODY_SIZE`.
+        :param spool_threshold (int): size above which bodies are streamed,
+                               default :data:`SPOOL_THRESHOLD`.
+        """
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        #: Start of the current message in the buffer.
+        self._start = 0
+        #: End of the received bytes in the buffer.
+        self._end = 0
+        self.max_header_size = max_header_size
+        self.max_body_size = MAX_BODY_SIZE if max_body_size is None else max_body_size
+        self.spool_threshold = SPOOL_THRESHOLD if spool_threshold is None else spool_threshold
+        self.body_stream = None
+        self._reset_message()
+
+    def _reset_message(self):
+        self._scan = 0
+        self._head = ""
+        self.method = None
+        self.target = None
+        self.version = None
+        self.header_offsets = []
+        self.content_length = 0
+        self.chunked = False
+        self.expect_continue = False
+        if self.body_stream is not None:
+            self.body_stream.close()
+        self.body_stream = None
+        self._state = _BODY_DONE
+        self._remaining = 0
+        self.head_end = -1
+        self.message_end = -1
+
+    @property
+    def buffered(self):
+        """Number of received bytes that belong to the current and following messages."""
+        return self._end - self._start
+
+    def _reserve(self, wanted):
+        """Make sure at least ``wanted`` bytes are free at the buffer tail."""
+        if len(self._buf) - self._end >= wanted:
+            return
+
+        used = self._end - self._start
+        if used + wanted <= len(self._buf):
+            # Same-size slice assignment: allowed even while views are exported.
+            # The ranges may overlap, so the bytes are copied out first.
+            self._buf[0:used] = bytes(self._view[self._start:self._end])
+        else:
+            size = len(self._buf)
+            while size < used + wanted:
+                size *= 2
+            buf = bytearray(size)
+            buf[0:used] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._start = 0
+        self._end = used
+
+    def recv_from(self, sock):
+        """
+        Receive available bytes from ``sock`` directly into the buffer.
+
+        When the body size is already known, space for the whole remaining body
+        is reserved at once so large uploads grow the buffer only once.
+
+        :param sock (socket.socket): socket to read from.
+        :rtype int: number of bytes received, 0 on end of stream.
+        """
+        wanted = MIN_READ
+        if self.body_stream is not None:
+            wanted = STREAM_READ
+        elif self.message_end >= 0:
+            wanted = max(wanted, self.message_end - self.buffered)
+        self._reserve(wanted)
+
+        n = sock.recv_into(self._view[self._end:])
+        self._end += n
+        return n
+
+    def feed(self, data):
+        """
+        Append already received bytes (e.g. from ``asyncio``) to the buffer.
+
+        :param data (bytes): received bytes.
+        """
+        self._reserve(len(data))
+        self._buf[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def parse(self):
+        """
+        Advance parsing over the buffered bytes.
+
+        :rtype bool: True once a complete message is buffered.
+        :raise HttpParseError: malformed or oversized header section, malformed
+                               chunked body or body above the size limit.
+        """
+        if self.body_stream is not None and self._state != _BODY_DONE:
+            return self._stream_body()
+
+        if self.message_end < 0:
+            if not self.parse_head():
+                return False
+            if self.content_length > self.max_body_size:
+                raise HttpParseError("request body too large", 413, "Content Too Large")
+            if self.chunked or self.content_length > self.spool_threshold:
+                self.body_stream = RequestBody(self.spool_threshold)
+                if self.chunked:
+                    self._state = _CHUNK_SIZE
+                else:
+                    self._state, self._remaining = _BODY_DATA, self.content_length
+                return self._stream_body()
+            self.message_end = self.head_end + 4 + self.content_length
+
+        return self.buffered >= self.message_end
+
+    def parse_head(self):
+        """
+        Advance parsing up to the end of the header section only; the body
+        bytes stay in the buffer. Relays use it to forward the body as it
+        arrives; :meth:`parse` may still be called afterwards.
+
+        :rtype bool: True once the header section is parsed.
+        :raise HttpParseError: malformed or oversized header section.
+        """
+        if self.head_end >= 0:
+            return True
+
+        # Tolerate empty lines before a request (RFC 9112, section 2.2).
+        while self._scan == 0 and self._end - self._start >= 2 \
+                and self._buf[self._start:self._start + 2] == b"\r\n":
+            self._start += 2
+
+        begin = self._start + self._scan
+        idx = self._buf.find(b"\r\n\r\n", begin, self._end)
+        if idx < 0:
+            if self.buffered > self.max_header_size:
+                raise HttpParseError("header section too large")
+            # Resume the search just before the bytes received next.
+            self._scan = max(0, self.buffered - 3)
+            return False
+
+        self.head_end = idx - self._start
+        self._parse_head()
+        return True
+
+    def buffered_body(self):
+        """
+        The body bytes received so far, for a message parsed with
+        :meth:`parse_head` only.
+
+        :rtype memoryview: at most ``content_length`` bytes after the header.
+        """
+        start = self._start + self.head_end + 4
+        return self._view[start:min(self._end, start + self.content_length)]
+
+    def _stream_body(self):
+        """
+        Decode the buffered body bytes into :attr:`body_stream` and drop them
+        from the buffer; bytes of a pipelined request after the body are kept
+        right behind the header section.
+
+        :rtype bool: True once the body is complete.
+        """
+        body_start = self._start + self.head_end + 4
+        pos, end = body_start, self._end
+        buf, view, stream = self._buf, self._view, self.body_stream
+
+        while pos < end:
+            state = self._state
+            if state == _BODY_DATA or state == _CHUNK_DATA:
+                count = min(self._remaining, end - pos)
+                stream.write(view[pos:pos + count])
+                pos += count
+                self._remaining -= count
+                if self._remaining == 0:
+                    self._state = _BODY_DONE if state == _BODY_DATA else _CHUNK_END
+            elif state == _CHUNK_END:
+                if end - pos < 2:
+                    break
+                if buf[pos:pos + 2] != b"\r\n":
+                    raise HttpParseError("missing CRLF after chunk data")
+                pos += 2
+                self._state = _CHUNK_SIZE
+            else:
+                line_end = buf.find(b"\r\n", pos, end)
+                if line_end < 0:
+                    if end - pos > MAX_CHUNK_LINE:
+                        raise HttpParseError("chunk line too long")
+                    break
+                line = buf[pos:line_end]
+                pos = line_end + 2
+                if state == _TRAILER:
+                    # Trailer fields are not used; the empty line ends the body.
+                    if not line:
+                        self._state = _BODY_DONE
+                        break
+                    continue
+                size = line.split(b";", 1)[0].strip()
+                if not size or size.strip(b"0123456789abcdefABCDEF"):
+                    raise HttpParseError("invalid chunk size")
+                size = int(size, 16)
+                if stream.size + size > self.max_body_size:
+                    raise HttpParseError("request body too large", 413, "Content Too Large")
+                if size == 0:
+                    self._state = _TRAILER
+                else:
+                    self._state, self._remaining = _CHUNK_DATA, size
+            if self._state == _BODY_DONE:
+                break
+
+        # Move the undecoded bytes down to the end of the header section.
+        left = end - pos
+        if left and pos != body_start:
+            buf[body_start:body_start + left] = bytes(view[pos:end])
+        self._end = body_start + left
+
+        if self._state != _BODY_DONE:
+            return False
+        self.content_length = stream.size
+        self.message_end = self.head_end + 4
+        return True
+
+    def _parse_head(self):
+        """Locate the request line and header lines of the current message.
+
+        The header section is decoded once as ISO-8859-1, which maps every byte
+        to one character, so the recorded offsets index both the text and the
+        buffer.
+        """
+        text = self._head = str(self._view[self._start:self._start + self.head_end], 'iso-8859-1')
+        lines = text.split("\r\n")
+
+        parts = lines[0].split()
+        if len(parts) != 3:
+            raise HttpParseError("malformed request line")
+        self.method, self.target, self.version = parts
+
+        offsets = self.header_offsets
+        pos = len(lines[0]) + 2
+        has_length = expect = False
+        for line in lines[1:]:
+            colon = line.find(":")
+            if colon > 0:
+                offsets.append((pos, pos + colon, pos + len(line)))
+                if colon == 14 and line[:14].lower() == "content-length":
+                    value = line[15:].strip()
+                    if not value.isdigit():
+                        raise HttpParseError("invalid Content-Length")
+                    self.content_length = int(value)
+                    has_length = True
+                elif colon == 17 and line[:17].lower() == "transfer-encoding":
+                    codings = [coding.strip() for coding in line[18:].lower().split(",")]
+                    if codings != ["chunked"]:
+                        raise HttpParseError("unsupported transfer coding", 501, "Not Implemented")
+                    self.chunked = True
+                elif colon == 6 and line[:6].lower() == "expect":
+                    expect = line[7:].strip().lower() == "100-continue"
+            pos += len(line) + 2
+
+        if self.chunked and has_length:
+            # Ambiguous framing is a request smuggling vector (RFC 9112, 6.3).
+            raise HttpParseError("both Transfer-Encoding and Content-Length")
+        self.expect_continue = expect and (self.chunked or self.content_length > 0)
+
+    def headers(self):
+        """
+        Decode the header lines of the current message.
+
+        :rtype dict: lower-cased header names mapped to their values.
+        """
+        return decode_headers(self._head, self.header_offsets)
+
+    def header(self, name, default=None):
+        """
+        Look up a single header without decoding the others.
+
+        :param name (str): header name, case-insensitive.
+        :rtype str: header value or ``default``.
+        """
+        return find_header(self._head, self.header_offsets, name, default)
+
+    def header_source(self):
+        """
+        The header text and line offsets of the current message, for
+        :func:`decode_headers`. Unlike the buffer views they remain valid
+        after :meth:`consume`.
+
+        :rtype tuple: (header text, header offsets).
+        """
+        return self._head, self.header_offsets
+
+    def header_lines(self):
+        """
+        Iterate over the raw header lines of the current message.
+
+        :rtype iterator: ``(lower-cased name, memoryview of the whole line)`` pairs.
+        """
+        view = self._view
+        base = self._start
+        text = self._head
+        for line_start, colon, line_end in self.header_offsets:
+            yield text[line_start:colon].strip().lower(), view[base + line_start:base + line_end]
+
+    def request_line(self):
+        """:rtype memoryview: the request line, without its CRLF."""
+        if self.header_offsets:
+            return self._view[self._start:self._start + self.header_offsets[0][0] - 2]
+        return self._view[self._start:self._start + self.head_end]
+
+    def head(self):
+        """:rtype memoryview: request line and headers, including the blank line."""
+        return self._view[self._start:self._start + self.head_end + 4]
+
+    def body(self):
+        """:rtype memoryview: body of the current message; the decoded body of
+        a streamed message (see :attr:`body_stream`)."""
+        if self.body_stream is not None:
+            return self.body_stream.view()
+        return self._view[self._start + self.head_end + 4:self._start + self.message_end]
+
+    def message(self):
+        """:rtype memoryview: the complete current message; only the header
+        section for a streamed body."""
+        return self._view[self._start:self._start + self.message_end]
+
+    def consume(self):
+        """
+        Discard the current message, keeping any pipelined bytes after it.
+        """
+        if self.message_end >= 0:
+            self._start += self.message_end
+        if self._start >= self._end:
+            self._start = self._end = 0
+        self._reset_message()
+
+    def detach_body(self):
+        """
+        Hand the streamed body of the current message over to the caller,
+        who closes it; :meth:`consume` then leaves it open.
+
+        :rtype RequestBody: the body, or None if it is not streamed.
+        """
+        stream, self.body_stream = self.body_stream, None
+        return stream
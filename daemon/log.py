@@ -0,0 +1,196 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.log
+~~~~~~~~~~~~~~~~~
+
+This module provides the logging setup of the ``daemon`` package. Every
+module logs to its own :mod:`logging` logger (``daemon.httpadapter``,
+``daemon.proxy``, ...), so levels can be set per module, and records are
+written to the output by a background thread.
+
+Notes:
+------
+- Messages use ``%``-style arguments (``logger.debug("path %s", path)``): the
+  text is only built if the record is emitted, and then by the writer thread.
+  Arguments must not be objects that change after the call (the request and
+  response objects are reused), pass the values instead.
+- Per-request messages are logged at ``DEBUG``. At the default ``INFO`` level
+  such a call costs one cached level check and formats nothing.
+- Emitting a record only puts it on a bounded queue. When the writer cannot
+  keep up, new records are dropped and counted instead of blocking the
+  server (see :func:`dropped`).
+- Forked worker processes get their own writer thread.
+- Levels come from :func:`configure`, or from the ``DAEMON_LOG`` environment
+  variable: a default level and ``module=level`` pairs separated by commas,
+  e.g. ``DAEMON_LOG=INFO,proxy=DEBUG,access=WARNING``. Explicit arguments
+  take precedence over the environment.
+
+Usage Example:
+--------------
+>>> import logging
+>>> logger = logging.getLogger(__name__)
+>>> configure(level="INFO", levels={"proxy": "DEBUG"})
+>>> logger.debug("[Proxy] %s at Host: %s", addr, hostname)
+
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+
+#: Name of the package logger every module logger descends from.
+ROOT = "daemon"
+
+#: Level used when neither :func:`configure` nor ``DAEMON_LOG`` sets one.
+DEFAULT_LEVEL = logging.INFO
+
+#: Format of the written lines.
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s: %(message)s"
+
+#: Environment variable holding the level specification.
+ENV_VAR = "DAEMON_LOG"
+
+#: Records waiting for the writer thread before new ones are dropped.
+QUEUE_SIZE = 10000
+
+_lock = threading.Lock()
+_handler = None
+_listener = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the writer thread as they are, without formatting them
+    in the logging thread, and drops them when the queue is full.
+    """
+
+    def __init__(self, records):
+        super().__init__(records)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() < QUEUE_SIZE:
+            self.queue.put(record)
+        else:
+            self.dropped += 1
+
+
+def get_logger(name):
+    """
+    The logger of a ``daemon`` module.
+
+    :param name (str): module name, with or without the ``daemon.`` prefix.
+    :rtype logging.Logger: the logger.
+    """
+    if name != ROOT and not name.startswith(ROOT + "."):
+        name = ROOT + "." + name
+    return logging.getLogger(name)
+
+
+def parse_levels(spec):
+    """
+    Parse a ``DAEMON_LOG`` level specification.
+
+    :param spec (str): e.g. ``"INFO,proxy=DEBUG"``.
+    :rtype tuple: (default level or None, ``{module: level}``).
+    """
+    level = None
+    levels = {}
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, sep, value = item.rpartition("=")
+        if sep:
+            levels[name.strip()] = value.strip().upper()
+        else:
+            level = value.upper()
+    return level, levels
+
+
+def configure(level=None, levels=None, stream=None, fmt=FORMAT, force=False):
+    """
+    Set up the package logging: levels, and the queue drained by the writer
+    thread. Calls after the first one do nothing unless ``force`` is set, so
+    the entry points can all call it.
+
+    :param level (str or int): level of the ``daemon`` logger.
+    :param levels (dict): per-module levels, e.g. ``{"proxy": "DEBUG"}``.
+    :param stream (file): where lines are written, ``sys.stdout`` by default.
+    :param fmt (str): :mod:`logging` format of the lines.
+    :param force (bool): replace an existing configuration.
+    """
+    global _handler, _listener
+
+    with _lock:
+        if _listener is not None:
+            if not force:
+                return
+            _stop()
+
+        env_level, env_levels = parse_levels(os.environ.get(ENV_VAR, ""))
+        root = logging.getLogger(ROOT)
+        root.setLevel(level or env_level or DEFAULT_LEVEL)
+        for name, value in {**env_levels, **(levels or {})}.items():
+            get_logger(name).setLevel(value)
+
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(logging.Formatter(fmt))
+        _handler = _QueueHandler(queue.SimpleQueue())
+        root.addHandler(_handler)
+        root.propagate = False
+        _listener = logging.handlers.QueueListener(_handler.queue, writer)
+        _listener.start()
+
+
+def dropped():
+    """:rtype int: records dropped because the writer queue was full."""
+    return _handler.dropped if _handler is not None else 0
+
+
+def _stop():
+    global _handler, _listener
+    _listener.stop()
+    logging.getLogger(ROOT).removeHandler(_handler)
+    _handler = None
+    _listener = None
+
+
+def shutdown():
+    """Write out the queued records and stop the writer thread."""
+    with _lock:
+        if _listener is not None:
+            _stop()
+
+
+def _after_fork_in_child():
+    """The writer thread does not survive fork(): start a new one on a new queue."""
+    global _lock, _listener
+    _lock = threading.Lock()
+    if _listener is not None:
+        _handler.queue = queue.SimpleQueue()
+        _listener = logging.handlers.QueueListener(_handler.queue, *_listener.handlers)
+        _listener.start()
+
+
+atexit.register(shutdown)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
@@ -0,0 +1,330 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.metrics
+~~~~~~~~~~~~~~~~~
+
+This module provides the instrumentation of the servers: labelled counters,
+gauges and fixed-bucket histograms kept in a :class:`Registry <Registry>`
+and rendered in the Prometheus text exposition format.
+
+Notes:
+------
+- Counters and histograms keep one cell per thread that records into them.
+  Only the owning thread writes a cell, so recording takes no lock and
+  concurrent requests never wait for each other; a scrape sums the cells and
+  may miss an update still in progress. Cells are keyed by thread identifier,
+  which the thread-per-connection engine reuses, so their number follows the
+  peak number of threads.
+- Histograms have fixed bucket bounds; an observation costs one binary search
+  and one increment. Quantiles (p50, p99) are computed by the scraper, e.g.
+  ``histogram_quantile(0.99, rate(http_request_duration_seconds_bucket[1m]))``.
+- Metrics may be backed by a callback evaluated at scrape time instead, for
+  values another component already counts (e.g. the asset cache).
+- Each process has its own registry: with pre-forked workers a scrape sees
+  the worker that accepted it.
+
+Usage Example:
+--------------
+>>> requests = REGISTRY.counter("http_requests_total", "Requests served.", ("route", "status"))
+>>> requests.labels("/login", "200").inc()
+>>> latency = REGISTRY.histogram("http_request_duration_seconds", "Latency.", ("route",))
+>>> latency.labels("/login").observe(0.0042)
+>>> text = REGISTRY.render()
+
+"""
+
+import bisect
+import itertools
+import math
+import threading
+from threading import get_ident
+
+#: Default histogram bucket bounds in seconds.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+#: Content-Type of :meth:`Registry.render` output.
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def _label_text(names, values, extra=None):
+    pairs = ['{}="{}"'.format(name, _escape(value)) for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append('{}="{}"'.format(*extra))
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _CounterChild:
+    """One labelled counter series."""
+
+    __slots__ = ("_cells", "_lock")
+
+    def __init__(self):
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        """Add ``amount`` (non-negative) to the counter."""
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [0])
+        cell[0] += amount
+
+    def value(self):
+        """:rtype: the current total."""
+        return sum(cell[0] for cell in list(self._cells.values()))
+
+
+class _GaugeChild:
+    """One labelled gauge series."""
+
+    __slots__ = ("_lock", "_value")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = 0
+
+    def set(self, value):
+        self._value = value
+
+    def inc(self, amount=1):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self._value -= amount
+
+    def value(self):
+        return self._value
+
+
+class _HistogramChild:
+    """One labelled histogram series."""
+
+    __slots__ = ("_bounds", "_cells", "_lock")
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # Per thread: [per-bucket counts (the last one is +Inf), sum]
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Record one observation."""
+        cell = self._cells.get(get_ident())
+        if cell is None:
+            with self._lock:
+                cell = self._cells.setdefault(get_ident(), [[0] * (len(self._bounds) + 1), 0.0])
+        cell[0][bisect.bisect_left(self._bounds, value)] += 1
+        cell[1] += value
+
+    def snapshot(self):
+        """
+        :rtype tuple: (cumulative bucket counts ending with +Inf, sum, count).
+        """
+        counts = [0] * (len(self._bounds) + 1)
+        total = 0.0
+        for cell in list(self._cells.values()):
+            for index, count in enumerate(cell[0]):
+                counts[index] += count
+            total += cell[1]
+        cumulative = list(itertools.accumulate(counts))
+        return cumulative, total, cumulative[-1]
+
+
+class Metric:
+    """
+    A metric family: a name, its label names and one series per label values.
+
+    Attributes:
+        name (str): metric name.
+        help (str): description written in the ``# HELP`` line.
+        labelnames (tuple): label names.
+        func (callable): scrape-time source of the values, or None.
+    """
+
+    __attrs__ = [
+        "name",
+        "help",
+        "labelnames",
+        "func",
+    ]
+
+    type = None
+    _child = None
+
+    def __init__(self, name, help, labelnames=(), func=None):
+        """
+        :param name (str): metric name.
+        :param help (str): description.
+        :param labelnames (iterable): label names.
+        :param func (callable): returns the value (no labels) or a dict of
+                     ``{label values tuple: value}``, read at every scrape.
+        """
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.func = func
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        """
+        The series of the given label values, created on first use.
+
+        :rtype: the child series (``inc``/``set``/``observe``).
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError("{} expects labels {}".format(self.name, self.labelnames))
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        return self._child()
+
+    def __getattr__(self, name):
+        # Unlabelled metrics are updated directly: counter.inc().
+        if name in ("inc", "dec", "set", "observe", "value") and not self.labelnames:
+            return getattr(self.labels(), name)
+        raise AttributeError(name)
+
+    def samples(self):
+        """:rtype iterator: ``(label values, value)`` of every series."""
+        if self.func is not None:
+            values = self.func()
+            if not isinstance(values, dict):
+                values = {(): values}
+            return iter(values.items())
+        return ((values, child.value()) for values, child in list(self._children.items()))
+
+    def render(self):
+        """:rtype str: the family in the text exposition format."""
+        lines = ["# HELP {} {}".format(self.name, self.help),
+                 "# TYPE {} {}".format(self.name, self.type)]
+        for values, value in self.samples():
+            lines.append("{}{} {}".format(self.name, _label_text(self.labelnames, values),
+                                          _format_value(value)))
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """A monotonically increasing count."""
+
+    type = "counter"
+    _child = _CounterChild
+
+
+class Gauge(Metric):
+    """A value that goes up and down."""
+
+    type = "gauge"
+    _child = _GaugeChild
+
+
+class Histogram(Metric):
+    """
+    Observations counted in fixed buckets, with their sum and count.
+
+    Attributes:
+        buckets (tuple): sorted upper bounds, without +Inf.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets (iterable): bucket upper bounds.
+        """
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def render(self):
+        lines = ["# HELP {} {}".format(self.name, self.help),
+                 "# TYPE {} histogram".format(self.name)]
+        bounds = [_format_value(bound) for bound in self.buckets] + ["+Inf"]
+        for values, child in list(self._children.items()):
+            cumulative, total, count = child.snapshot()
+            for bound, bucket in zip(bounds, cumulative):
+                lines.append("{}_bucket{} {}".format(
+                    self.name, _label_text(self.labelnames, values, ("le", bound)), bucket))
+            labels = _label_text(self.labelnames, values)
+            lines.append("{}_sum{} {}".format(self.name, labels, _format_value(total)))
+            lines.append("{}_count{} {}".format(self.name, labels, count))
+        return "\n".join(lines)
+
+
+class Registry:
+    """
+    The metric families of a process, in registration order.
+    """
+
+    __attrs__ = []
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **kwargs)
+            elif type(metric) is not cls or metric.labelnames != tuple(labelnames):
+                raise ValueError("metric {} is already registered differently".format(name))
+            return metric
+
+    def counter(self, name, help, labelnames=(), func=None):
+        """Get or create a :class:`Counter`."""
+        return self._get(Counter, name, help, labelnames, func=func)
+
+    def gauge(self, name, help, labelnames=(), func=None):
+        """Get or create a :class:`Gauge`."""
+        return self._get(Gauge, name, help, labelnames, func=func)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """Get or create a :class:`Histogram`."""
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def render(self):
+        """
+        :rtype str: every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+#: The process-wide registry served on ``/metrics``.
+REGISTRY = Registry()
@@ -0,0 +1,463 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.middleware
+~~~~~~~~~~~~~~~~~
+
+This module provides the request middleware of a :class:`WeApRous
+<daemon.weaprous.WeApRous>` app and the :class:`Pipeline <Pipeline>` they are
+compiled into, with the built-in :class:`CookieAuth <CookieAuth>`,
+:class:`RequestLog <RequestLog>`, :class:`Timing <Timing>`,
+:class:`CORS <CORS>` and :class:`RequestMetrics <RequestMetrics>` middleware.
+
+Notes:
+------
+- A middleware has a ``before(request)`` step, which may answer the request
+  itself by returning a response, and an ``after(request, response)`` step,
+  which returns the (possibly changed) response. ``request`` is the
+  :class:`RequestContext <daemon.request.RequestContext>` of the request.
+- ``before`` steps run in registration order and ``after`` steps in reverse
+  order. Every ``after`` step runs, also for a response produced by a
+  ``before`` step, so e.g. a 401 still gets its CORS headers, and for the
+  500 that replaces a hook that raised, so it is logged and counted.
+- The middleware registered with :meth:`WeApRous.use
+  <daemon.weaprous.WeApRous.use>` is compiled once, in
+  :meth:`WeApRous.run <daemon.weaprous.WeApRous.run>`, into one pipeline per
+  set of opt-outs (``route(..., skip=("auth",))``). A request only runs the
+  steps its pipeline holds; nothing is looked up or compared per request.
+- Requests no route matches (static files, 405 answers) go through the
+  pipeline of the whole middleware list.
+- For ``async def`` hooks on the asyncio engine the steps run on the event
+  loop thread, so they must not block.
+
+Usage Example:
+--------------
+>>> app = WeApRous()
+>>> app.use(RequestLog())
+>>> app.use(CookieAuth())
+>>> app.use(CORS(origins=["http://localhost:3000"]))
+>>> @app.route('/login', methods=['POST'], skip=("auth",))
+>>> def login(headers, body):
+>>>     ...
+
+"""
+
+import time
+import logging
+
+from .metrics import REGISTRY
+from .response import Response, FileResponse, error_response
+
+logger = logging.getLogger(__name__)
+
+#: Logger of :class:`RequestLog`; silence it with ``levels={"access": "WARNING"}``.
+access_logger = logging.getLogger("daemon.access")
+
+#: Methods :class:`RequestMetrics` labels by name; the others are counted as
+#: ``OTHER``, so clients cannot create new series.
+METRIC_METHODS = frozenset(("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"))
+
+
+def response_status(response):
+    """
+    Status code of a response in any of the forms hooks and the static file
+    server produce.
+
+    :param response (bytes, list, FileResponse or Response): the response;
+                     a list holds the header and then the body buffers.
+    :rtype int: the status code, 500 if there is none.
+    """
+    if isinstance(response, Response):
+        return response.status_code or 200
+    if isinstance(response, FileResponse):
+        response = response.header
+    elif isinstance(response, list):
+        response = response[0] if response else b""
+    try:
+        return int(response[9:12])
+    except (TypeError, ValueError):
+        return 500
+
+
+def add_headers(response, headers):
+    """
+    Add header fields to a response.
+
+    :param response (bytes, list, FileResponse or Response): the response.
+    :param headers (list): ``(name, value)`` pairs to add.
+    :rtype: the response with the headers; raw bytes are copied, the other
+            forms are changed in place.
+    """
+    if isinstance(response, Response):
+        for name, value in headers:
+            response.headers[name] = value
+        return response
+    if isinstance(response, FileResponse):
+        response.header = add_headers(response.header, headers)
+        return response
+    if isinstance(response, list):
+        if response:
+            response[0] = add_headers(response[0], headers)
+        return response
+    if not response:
+        return response
+
+    head_end = response.find(b"\r\n\r\n")
+    if head_end < 0:
+        return response
+    lines = "".join("\r\n{}: {}".format(name, value) for name, value in headers)
+    return response[:head_end] + lines.encode('latin-1') + response[head_end:]
+
+
+class Middleware:
+    """
+    Base class of middleware; subclasses override :meth:`before`,
+    :meth:`after` or both. Steps left to the base class are not compiled
+    into the pipeline.
+
+    Attributes:
+        name (str): key routes use to opt out, e.g. ``skip=("auth",)``.
+    """
+
+    __attrs__ = [
+        "name",
+    ]
+
+    name = None
+
+    def before(self, request):
+        """
+        Runs before the hook or the static file server.
+
+        :param request (RequestContext): the current request.
+        :rtype: a response to send instead of calling the hook, or None.
+        """
+        return None
+
+    def after(self, request, response):
+        """
+        Runs on the response about to be sent.
+
+        :param request (RequestContext): the current request.
+        :param response (bytes, list, FileResponse or Response): the response.
+        :rtype: the response to send.
+        """
+        return response
+
+
+def _no_response(request):
+    return None
+
+
+def _same_response(request, response):
+    return response
+
+
+def _overrides(middleware, step):
+    """Whether ``middleware`` implements ``step`` itself."""
+    impl = getattr(type(middleware), step, None)
+    return impl is not None and impl is not getattr(Middleware, step)
+
+
+class Pipeline:
+    """
+    The ``before`` and ``after`` steps of a middleware list, composed once.
+
+    Attributes:
+        middleware (tuple): the middleware, in registration order.
+        before (callable): ``before(request)``, returns a response or None.
+        after (callable): ``after(request, response)``, returns the response.
+    """
+
+    __slots__ = ("middleware", "before", "after")
+
+    def __init__(self, middleware=()):
+        """
+        :param middleware (iterable): middleware objects, in registration order.
+        """
+        self.middleware = tuple(middleware)
+        self.before = self._compose_before(
+            [m.before for m in self.middleware if _overrides(m, "before")])
+        self.after = self._compose_after(
+            [m.after for m in reversed(self.middleware) if _overrides(m, "after")])
+
+    def __repr__(self):
+        return "<Pipeline {}>".format([type(m).__name__ for m in self.middleware])
+
+    @staticmethod
+    def _compose_before(steps):
+        if not steps:
+            return _no_response
+        if len(steps) == 1:
+            return steps[0]
+        steps = tuple(steps)
+
+        def before(request):
+            for step in steps:
+                response = step(request)
+                if response is not None:
+                    return response
+            return None
+        return before
+
+    @staticmethod
+    def _compose_after(steps):
+        if not steps:
+            return _same_response
+        if len(steps) == 1:
+            return steps[0]
+        steps = tuple(steps)
+
+        def after(request, response):
+            for step in steps:
+                response = step(request, response)
+            return response
+        return after
+
+    def __call__(self, request, endpoint):
+        """
+        Serve ``request`` through the pipeline.
+
+        :param request (RequestContext): the current request.
+        :param endpoint (callable): ``endpoint(request)`` producing the
+                        response when no ``before`` step answered.
+        :rtype: the response to send.
+        """
+        response = self.before(request)
+        if response is None:
+            try:
+                response = endpoint(request)
+            except Exception:
+                response = endpoint_error(request)
+        return self.after(request, response)
+
+
+def endpoint_error(request):
+    """
+    Log the exception raised by the endpoint of a pipeline and answer 500,
+    so the ``after`` steps still see the request.
+
+    :param request (RequestContext): the current request.
+    :rtype bytes: the raw 500 response.
+    """
+    logger.exception("Error serving %s %s", request.method, request.path)
+    return error_response(500, "Internal Server Error")
+
+
+class CookieAuth(Middleware):
+    """
+    Answers 401 unless the request carries the login cookie. Every routed
+    hook is protected, except routes registered with ``skip=("auth",)``;
+    requests no route matches are only checked for the ``protected`` paths.
+
+    Attributes:
+        cookie (str): name of the login cookie.
+        value (str): value the cookie must have.
+        protected (frozenset): static paths that need the cookie.
+    """
+
+    __attrs__ = [
+        "cookie",
+        "value",
+        "protected",
+    ]
+
+    name = "auth"
+
+    def __init__(self, cookie="auth", value="true", protected=("/index.html",)):
+        """
+        :param cookie (str): name of the login cookie.
+        :param value (str): value the cookie must have.
+        :param protected (iterable): static paths that need the cookie.
+        """
+        self.cookie = cookie
+        self.value = value
+        self.protected = frozenset(protected)
+
+    def before(self, request):
+        if not request.routed and request.path not in self.protected:
+            return None
+        if request.cookies.get(self.cookie, '') == self.value:
+            return None
+        logger.info("Unauthorized %s %s", request.method, request.path)
+        return error_response(401, "Unauthorized")
+
+
+class RequestLog(Middleware):
+    """Logs one ``INFO`` line per request with its method, path and status
+    to the ``daemon.access`` logger."""
+
+    name = "log"
+
+    def after(self, request, response):
+        if access_logger.isEnabledFor(logging.INFO):
+            access_logger.info("%s %s %d", request.method, request.path,
+                               response_status(response))
+        return response
+
+
+class Timing(Middleware):
+    """
+    Adds the time spent serving the request as a ``Server-Timing`` header.
+    For a streamed body this is the time until the hook returned.
+
+    Attributes:
+        metric (str): name of the Server-Timing metric.
+    """
+
+    __attrs__ = [
+        "metric",
+    ]
+
+    name = "timing"
+
+    def __init__(self, metric="app"):
+        """
+        :param metric (str): name of the Server-Timing metric.
+        """
+        self.metric = metric
+
+    def before(self, request):
+        request.state["started"] = time.perf_counter()
+        return None
+
+    def after(self, request, response):
+        started = request.state.get("started")
+        if started is None:
+            # An earlier middleware answered before this one started timing.
+            return response
+        elapsed = (time.perf_counter() - started) * 1000
+        return add_headers(response, [
+            ("Server-Timing", "{};dur={:.3f}".format(self.metric, elapsed))])
+
+
+class CORS(Middleware):
+    """
+    Cross-origin resource sharing: answers preflight ``OPTIONS`` requests and
+    adds ``Access-Control-Allow-Origin`` to responses for allowed origins.
+
+    Attributes:
+        origins (frozenset): allowed origins, or None to allow any origin.
+        methods (str): value of ``Access-Control-Allow-Methods``.
+        headers (str): value of ``Access-Control-Allow-Headers``, or None to
+                       allow the headers a preflight asks for.
+        max_age (int): seconds a preflight answer may be cached.
+        credentials (bool): whether cookies may be sent cross-origin.
+    """
+
+    __attrs__ = [
+        "origins",
+        "methods",
+        "headers",
+        "max_age",
+        "credentials",
+    ]
+
+    name = "cors"
+
+    def __init__(self, origins="*", methods=("GET", "POST", "PUT", "DELETE"),
+                 headers=None, max_age=600, credentials=False):
+        """
+        :param origins (str or iterable): ``"*"`` or the allowed origins.
+        :param methods (iterable): methods allowed cross-origin.
+        :param headers (iterable): request headers allowed cross-origin, or
+                       None to allow the ones a preflight asks for.
+        :param max_age (int): seconds a preflight answer may be cached.
+        :param credentials (bool): whether cookies may be sent cross-origin.
+        """
+        self.origins = None if origins == "*" else frozenset(origins)
+        self.methods = ", ".join(methods)
+        self.headers = None if headers is None else ", ".join(headers)
+        self.max_age = max_age
+        self.credentials = credentials
+        # Credentialed requests need the origin echoed instead of "*".
+        self._echo_origin = self.origins is not None or credentials
+        self._preflight = (
+            "HTTP/1.1 204 No Content\r\n"
+            "Access-Control-Allow-Methods: {}\r\n"
+            "Access-Control-Max-Age: {}\r\n"
+        ).format(self.methods, max_age)
+
+    def before(self, request):
+        if request.method != "OPTIONS":
+            return None
+        requested = request.header("access-control-request-method")
+        if requested is None:
+            return None
+        allow_headers = self.headers or request.header("access-control-request-headers")
+        response = self._preflight
+        if allow_headers:
+            response += "Access-Control-Allow-Headers: {}\r\n".format(allow_headers)
+        return (response + "\r\n").encode('latin-1')
+
+    def after(self, request, response):
+        origin = request.header("origin")
+        if origin is None or (self.origins is not None and origin not in self.origins):
+            return response
+        if not self._echo_origin:
+            return add_headers(response, [("Access-Control-Allow-Origin", "*")])
+        headers = [("Access-Control-Allow-Origin", origin), ("Vary", "Origin")]
+        if self.credentials:
+            headers.append(("Access-Control-Allow-Credentials", "true"))
+        return add_headers(response, headers)
+
+
+class RequestMetrics(Middleware):
+    """
+    Counts requests and records their latency in :data:`daemon.metrics.REGISTRY`:
+    ``http_requests_total{route,method,status}`` and the histogram
+    ``http_request_duration_seconds{route,method}``. ``route`` is the route
+    pattern, so ``/peers/<int:port>`` is one series whatever the port, and
+    ``(unrouted)`` for static files and other requests no route matches.
+    Methods outside :data:`METRIC_METHODS` are labelled ``OTHER``, and a
+    hook that raised is counted with status 500.
+
+    :meth:`WeApRous.run <daemon.weaprous.WeApRous.run>` puts it first, so the
+    latency covers the other middleware too. For a streamed body it is the
+    time until the hook returned.
+
+    Attributes:
+        requests (Counter): requests by route, method and status.
+        duration (Histogram): latency by route and method.
+    """
+
+    __attrs__ = [
+        "requests",
+        "duration",
+    ]
+
+    name = "metrics"
+
+    def __init__(self, registry=REGISTRY):
+        """
+        :param registry (Registry): where the metrics are kept.
+        """
+        self.requests = registry.counter(
+            "http_requests_total", "HTTP requests served.",
+            ("route", "method", "status"))
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "Time spent serving HTTP requests.",
+            ("route", "method"))
+
+    def before(self, request):
+        request.state["metrics_started"] = time.perf_counter()
+        return None
+
+    def after(self, request, response):
+        route = request.route or "(unrouted)"
+        method = request.method if request.method in METRIC_METHODS else "OTHER"
+        started = request.state.get("metrics_started")
+        if started is not None:
+            self.duration.labels(route, method).observe(time.perf_counter() - started)
+        self.requests.labels(route, method, str(response_status(response))).inc()
+        return response
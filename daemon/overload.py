@@ -0,0 +1,297 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.overload
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`Limiter <Limiter>` a server uses to shed
+load: it caps the open connections and the requests being served, keeps a
+bounded queue of requests waiting for a slot, and answers everything beyond
+that with ``503 Service Unavailable`` and a ``Retry-After`` header instead of
+letting threads, buffers and latency pile up.
+
+Notes:
+------
+- A connection over ``max_connections`` is answered and closed right after
+  ``accept()``, before anything is read or a thread is started for it.
+- A request is in flight from the moment it is admitted until its response
+  has been built; streamed bodies and file transfers do not hold a slot. On
+  the ``selector`` and ``asyncio`` engines this includes requests waiting for
+  a worker thread of the pool.
+- A request that finds every slot taken waits in a FIFO queue of at most
+  ``max_queue`` entries, for up to ``queue_timeout`` seconds. A full queue or
+  an expired wait sheds the request.
+- Limits are per process: with pre-forked workers each worker applies them.
+- Open connections, requests in flight, queue depth, queue wait and shed
+  counts are recorded in :data:`daemon.metrics.REGISTRY`, labelled with the
+  limiter name.
+
+Usage Example:
+--------------
+>>> limiter = Limiter("backend", max_connections=512, max_requests=64, max_queue=128)
+>>> if limiter.acquire_blocking():
+>>>     try:
+>>>         response = adapter.handle_request(parser, routes)
+>>>     finally:
+>>>         limiter.release()
+>>> else:
+>>>     conn.sendall(limiter.response)
+
+"""
+
+import time
+import socket
+import threading
+from collections import deque
+
+from .metrics import REGISTRY
+from .response import error_response
+
+#: Default cap on open connections.
+MAX_CONNECTIONS = 1024
+
+#: Default cap on requests in flight.
+MAX_REQUESTS = 128
+
+#: Default cap on requests waiting for a slot.
+MAX_QUEUE = 256
+
+#: Default seconds a request waits for a slot before it is shed.
+QUEUE_TIMEOUT = 5.0
+
+#: Default seconds clients are asked to wait before retrying.
+RETRY_AFTER = 1
+
+CONNECTIONS = REGISTRY.gauge(
+    "server_connections", "Open client connections.", ("server",))
+IN_FLIGHT = REGISTRY.gauge(
+    "server_requests_in_flight", "Requests admitted and being served.", ("server",))
+QUEUE_DEPTH = REGISTRY.gauge(
+    "server_queue_depth", "Requests waiting for a slot.", ("server",))
+QUEUE_WAIT = REGISTRY.histogram(
+    "server_queue_wait_seconds", "Time admitted requests waited for a slot.", ("server",))
+SHED = REGISTRY.counter(
+    "server_shed_total", "Connections and requests answered with 503.", ("server", "reason"))
+
+
+class Limiter:
+    """
+    Admission control of one server: open connections, requests in flight and
+    the queue of requests waiting for a slot.
+
+    Requests that cannot be admitted at once are queued with a ``grant``
+    callback, called without arguments by the thread releasing the slot they
+    get; the slot then belongs to the queued request.
+
+    Attributes:
+        name (str): server label of the metrics, e.g. ``backend``.
+        max_connections (int): open connections allowed, 0 for no limit.
+        max_requests (int): requests in flight allowed, 0 for no limit.
+        max_queue (int): requests allowed to wait for a slot.
+        queue_timeout (float): seconds a request may wait for a slot.
+        retry_after (int): value of the ``Retry-After`` header of a 503.
+        response (bytes): the 503 response.
+    """
+
+    __attrs__ = [
+        "name",
+        "max_connections",
+        "max_requests",
+        "max_queue",
+        "queue_timeout",
+        "retry_after",
+        "response",
+    ]
+
+    def __init__(self, name="backend", max_connections=MAX_CONNECTIONS, max_requests=MAX_REQUESTS,
+                 max_queue=MAX_QUEUE, queue_timeout=QUEUE_TIMEOUT, retry_after=RETRY_AFTER):
+        """
+        :param name (str): server label of the metrics.
+        :param max_connections (int): open connections allowed, 0 for no limit.
+        :param max_requests (int): requests in flight allowed, 0 for no limit.
+        :param max_queue (int): requests allowed to wait for a slot.
+        :param queue_timeout (float): seconds a request may wait for a slot.
+        :param retry_after (int): seconds clients are asked to wait.
+        """
+        self.name = name
+        self.max_connections = max_connections or 0
+        self.max_requests = max_requests or 0
+        self.max_queue = max_queue or 0
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.response = error_response(503, "Service Unavailable", {
+            "Retry-After": retry_after,
+            "Connection": "close",
+        })
+
+        self.connections = 0
+        self.in_flight = 0
+        #: [grant, expire, deadline, enqueued] of the waiting requests.
+        self._waiting = deque()
+        self._lock = threading.Lock()
+
+        self._connections = CONNECTIONS.labels(name)
+        self._in_flight = IN_FLIGHT.labels(name)
+        self._depth = QUEUE_DEPTH.labels(name)
+        self._wait = QUEUE_WAIT.labels(name)
+        self._shed = {reason: SHED.labels(name, reason)
+                      for reason in ("connections", "queue_full", "queue_timeout")}
+
+    def __repr__(self):
+        return "<Limiter {} connections={} in_flight={} waiting={}>".format(
+            self.name, self.connections, self.in_flight, len(self._waiting))
+
+    def connect(self):
+        """
+        Count a new connection.
+
+        :rtype bool: False if it is over the limit and must be rejected.
+        """
+        with self._lock:
+            if self.max_connections and self.connections >= self.max_connections:
+                admitted = False
+            else:
+                self.connections += 1
+                self._connections.set(self.connections)
+                admitted = True
+        if not admitted:
+            self._shed["connections"].inc()
+        return admitted
+
+    def disconnect(self):
+        """Forget a connection counted by :meth:`connect`."""
+        with self._lock:
+            self.connections -= 1
+            self._connections.set(self.connections)
+
+    def acquire(self, grant=None, expire=None):
+        """
+        Take a request slot, or queue for one.
+
+        :param grant (callable): called when a slot is handed over to the
+                     queued request; without it the request is not queued.
+        :param expire (callable): called by :meth:`expire` if the request
+                      is still queued after ``queue_timeout``.
+        :rtype: True if the slot is taken, None if the request is queued,
+                False if it must be shed.
+        """
+        with self._lock:
+            if not self.max_requests or self.in_flight < self.max_requests:
+                self.in_flight += 1
+                self._in_flight.set(self.in_flight)
+                return True
+            if grant is not None and len(self._waiting) < self.max_queue:
+                now = time.monotonic()
+                self._waiting.append([grant, expire, now + self.queue_timeout, now])
+                self._depth.set(len(self._waiting))
+                return None
+        self._shed["queue_full"].inc()
+        return False
+
+    def acquire_blocking(self):
+        """
+        Take a request slot, waiting in the queue if needed.
+
+        :rtype bool: False if the request must be shed.
+        """
+        granted = threading.Event()
+        admitted = self.acquire(granted.set)
+        if admitted is not None:
+            return admitted
+        if granted.wait(self.queue_timeout):
+            return True
+        # Granted between the timeout and the cancellation: keep the slot.
+        return not self.cancel(granted.set)
+
+    def cancel(self, grant):
+        """
+        Withdraw a queued request whose wait timed out.
+
+        :param grant (callable): the callback it was queued with.
+        :rtype bool: True if it was withdrawn and must be shed, False if a
+                     slot was granted to it already.
+        """
+        with self._lock:
+            for entry in self._waiting:
+                if entry[0] == grant:
+                    self._waiting.remove(entry)
+                    self._depth.set(len(self._waiting))
+                    break
+            else:
+                return False
+        self._shed["queue_timeout"].inc()
+        return True
+
+    def expire(self, now=None):
+        """
+        Shed the queued requests waiting for longer than ``queue_timeout``,
+        calling their ``expire`` callbacks. Engines that queue requests
+        without blocking a thread call it periodically.
+        """
+        now = time.monotonic() if now is None else now
+        expired = []
+        with self._lock:
+            while self._waiting and self._waiting[0][2] <= now:
+                expired.append(self._waiting.popleft())
+            if expired:
+                self._depth.set(len(self._waiting))
+        for _, expire, _, _ in expired:
+            self._shed["queue_timeout"].inc()
+            if expire is not None:
+                expire()
+
+    def release(self):
+        """Give back a request slot, to the oldest queued request if any."""
+        with self._lock:
+            if self._waiting:
+                grant, _, _, enqueued = self._waiting.popleft()
+                self._depth.set(len(self._waiting))
+            else:
+                grant = None
+                self.in_flight -= 1
+                self._in_flight.set(self.in_flight)
+        if grant is not None:
+            self._wait.observe(time.monotonic() - enqueued)
+            grant()
+
+    def reject(self, conn):
+        """
+        Answer a connection refused by :meth:`connect` with the 503 response
+        and close it, without blocking.
+
+        :param conn (socket.socket): the accepted client socket.
+        """
+        try:
+            conn.setblocking(False)
+            # Read what the client sent already, closing with unread data
+            # would reset the connection before the 503 is read.
+            conn.recv(65536)
+        except OSError:
+            pass
+        try:
+            conn.send(self.response)
+            conn.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+        conn.close()
+
+    def stats(self):
+        """
+        :rtype dict: connections, in_flight and waiting.
+        """
+        with self._lock:
+            return {
+                "connections": self.connections,
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiting),
+            }
@@ -3,11 +3,18 @@ import time
 import argparse
 import threading
 from daemon.weaprous import WeApRous
+from daemon.response import Response
+from daemon.middleware import CookieAuth, RequestLog
+from daemon import log
 import urllib.request
 import urllib.error
 import socket
 import sys, os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+logger = log.get_logger("peer2peer")
+
+
 class peer2peer:
 
     def __init__(self, tracker_url, port, peer_name="anonymous"):
@@ -18,6 +25,8 @@ class peer2peer:
         self.peer_id = f"{self.ip}:{self.port}"
         
         self.app = WeApRous()
+        self.app.use(RequestLog())
+        self.app.use(CookieAuth())
         self.connected_peers = {"general": {}, "tech": {}, "random": {}}
         self.messages = []
         self.setup_own_routes()
@@ -34,21 +43,21 @@ class peer2peer:
                 s.connect(("8.8.8.8", 80))
                 return s.getsockname()[0]
         except Exception as e:
-            print(f"Falling back to localhost for IP: {e}")
+            logger.info("Falling back to localhost for IP: %s", e)
             return "127.0.0.1"
 
     def register_tracker(self):
         try:
-            print(f"Registering with tracker at {self.tracker_url}")
+            logger.info("Registering with tracker at %s", self.tracker_url)
             payload = {
                 "ip": self.ip,
                 "port": self.port,
                 "name": self.peer_name
             }
-            print(f"Payload: {payload}")
+            logger.debug("Payload: %s", payload)
             data = json.dumps(payload).encode('utf-8')
             if self.cookies and self.cookies.get("auth", "") == "true":
-                print("Adding auth cookie to request headers")
+                logger.debug("Adding auth cookie to request headers")
                 req_headers = {
                     "Content-Type": "application/json",
                     "Cookie": f"auth={self.cookies.get('auth', '')}"
@@ -59,16 +68,16 @@ class peer2peer:
                 data=data,
                 headers=req_headers if self.cookies and self.cookies.get("auth", "") == "true" else {"Content-Type": "application/json"}
             )
-            print(f"Request: {req.full_url}, Data: {data}")
+            logger.debug("Request: %s, Data: %s", req.full_url, data)
 
             with urllib.request.urlopen(req, timeout=5) as response:
                 if response.getcode() == 200:
                     resp_data = response.read().decode('utf-8')
                     resp_json = json.loads(resp_data)
-                    print(f"Registered with tracker: {resp_json}")
+                    logger.info("Registered with tracker: %s", resp_json)
                     return True
         except Exception as e:
-            print(f"Error registering with tracker: {e}") 
+            logger.warning("Error registering with tracker: %s", e) 
 
 
     def get_peers_list(self, channel="general"):
@@ -115,10 +124,10 @@ class peer2peer:
                     # Update only the specific channel
                     with self.peers_lock:
                         self.connected_peers[channel] = new_peers_dict
-                    print(f"Retrieved {len(new_peers_dict)} peers from channel '{channel}'")
+                    logger.debug("Retrieved %d peers from channel '%s'", len(new_peers_dict), channel)
                     
         except Exception as e:
-            print(f"Error getting peers list from tracker: {e}")
+            logger.warning("Error getting peers list from tracker: %s", e)
 
     def unregister_from_tracker(self):
         try:
@@ -127,7 +136,7 @@ class peer2peer:
             }
             data = json.dumps(payload).encode('utf-8')
             if self.cookies and self.cookies.get("auth", "") == "true":
-                print("Adding auth cookie to request headers for unregister")
+                logger.debug("Adding auth cookie to request headers for unregister")
                 req_headers = {
                     "Content-Type": "application/json",
                     "Cookie": f"auth={self.cookies.get('auth', '')}"
@@ -143,9 +152,9 @@ class peer2peer:
                 if response.getcode() == 200:
                     resp_data = response.read().decode('utf-8')
                     resp_json = json.loads(resp_data)
-                    print(f"Unregistered from tracker: {resp_json}")
+                    logger.info("Unregistered from tracker: %s", resp_json)
         except Exception as e:
-            print(f"Error unregistering from tracker: {e}")
+            logger.warning("Error unregistering from tracker: %s", e)
     
     def check_alive(self):
         while self.running:
@@ -191,39 +200,25 @@ class peer2peer:
                         "name": peer_name,
                         "channel": channel
                     }
-                    return(
-                        "HTTP/1.1 200 OK\r\n"
-                        "Content-Type: application/json\r\n"
-                        "Content-Length: {}\r\n"
-                        "\r\n"
-                        "{}".format(
-                            len(json.dumps(response)),
-                            json.dumps(response)
-                        )
-                    )
+                    return response
+                return Response.make({
+                    "status": "error",
+                    "message": "Missing peer information"
+                }, status_code=400)
             except Exception as e:
-                print(f"Error connecting to peer: {e}")
+                logger.warning("Error connecting to peer: %s", e)
                 response = {
                     "status": "error",
                     "message": "Failed to connect to peer"
                 }
-                return(
-                    "HTTP/1.1 500 Internal Server Error\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(
-                        len(json.dumps(response)),
-                        json.dumps(response)
-                    )
-                )
+                return Response.make(response, status_code=500)
             
         @self.app.route('/broadcast-peer', methods=['POST'])
         def broad_cast_received(headers="", body=""):
             try:
                 if body:
                     data=json.loads(body)
-                    print(data)
+                    logger.debug("Broadcast payload: %s", data)
                 else:
                     data={}
                 from_peer = data.get("from_peer", "")
@@ -247,32 +242,18 @@ class peer2peer:
                         "message": f"Message received from {from_peer}"
                     }
                     print(f"{channel} message received from {from_peer}: {message}")
-                    return(
-                        "HTTP/1.1 200 OK\r\n"
-                        "Content-Type: application/json\r\n"
-                        "Content-Length: {}\r\n"
-                        "\r\n"
-                        "{}".format(
-                            len(json.dumps(response)),
-                            json.dumps(response)
-                        )
-                    )
+                    return response
+                return Response.make({
+                    "status": "error",
+                    "message": "Missing sender or message"
+                }, status_code=400)
             except Exception as e:
-                print(f"Error receiving broadcast message: {e}")
+                logger.warning("Error receiving broadcast message: %s", e)
                 response = {
                     "status": "error",
                     "message": "Failed to receive message"
                 }
-                return(
-                    "HTTP/1.1 500 Internal Server Error\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(
-                        len(json.dumps(response)),
-                        json.dumps(response)
-                    )
-                )
+                return Response.make(response, status_code=500)
             
         @self.app.route('/send-peer', methods=['POST'])
         def received_direct_messages(headers="", body=""):
@@ -280,7 +261,7 @@ class peer2peer:
                 data = {}
                 if body:
                     data=json.loads(body)
-                    print("this is the " + str(data))
+                    logger.debug("Direct message payload: %s", data)
                 else:
                     data={}
 
@@ -305,32 +286,14 @@ class peer2peer:
                         "message": f"Direct message received from {from_peer}"
                 }
 
-                return(
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(
-                        len(json.dumps(response)),
-                        json.dumps(response)
-                    )
-                )
+                return response
             except Exception as e:
-                print(f"Error retrieving direct messages: {e}")
+                logger.warning("Error retrieving direct messages: %s", e)
                 response = {
                     "status": "error",
                     "message": "Failed to retrieve messages"
                 }
-                return(
-                    "HTTP/1.1 500 Internal Server Error\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(
-                        len(json.dumps(response)),
-                        json.dumps(response)
-                    )
-                )
+                return Response.make(response, status_code=500)
 
 
     
@@ -363,7 +326,7 @@ class peer2peer:
                 if response.getcode() == 200:
                     resp_data = response.read().decode('utf-8')
                     resp_json = json.loads(resp_data)
-                    print(f"Connected to peer {peer_id} in channel '{channel}': {resp_json}")
+                    logger.debug("Connected to peer %s in channel '%s': %s", peer_id, channel, resp_json)
         except Exception as e:
             pass  # Silently ignore connection errors - peer might not be ready
     
@@ -406,9 +369,9 @@ class peer2peer:
                     if response.getcode() == 200:
                         resp_data = response.read().decode('utf-8')
                         resp_json = json.loads(resp_data)
-                        print(f"[{channel}] Broadcast message sent to {peer_id}: {resp_json}")
+                        logger.debug("[%s] Broadcast message sent to %s: %s", channel, peer_id, resp_json)
             except Exception as e:
-                print(f"Error sending broadcast message to {peer_id} in channel '{channel}': {e}")
+                logger.warning("Error sending broadcast message to %s in channel '%s': %s", peer_id, channel, e)
 
     def send_direct_message(self, peer_id, message):
         timestamp = time.time()
@@ -447,9 +410,9 @@ class peer2peer:
                 if response.getcode() == 200:
                     resp_data = response.read().decode('utf-8')
                     resp_json = json.loads(resp_data)
-                    print(f"Direct message sent to {peer_id}: {resp_json}")
+                    logger.debug("Direct message sent to %s: %s", peer_id, resp_json)
         except Exception as e:
-            print(f"Error sending direct message to {peer_id}: {e}")
+            logger.warning("Error sending direct message to %s: %s", peer_id, e)
 
     def find_all_peers_and_connect(self, channel="general"):
         self.get_peers_list(channel)
@@ -616,7 +579,7 @@ class peer2peer:
                 if response.getcode() == 200:
                     pass
         except Exception as e:
-            print(f"Error pinging tracker: {e}")
+            logger.warning("Error pinging tracker: %s", e)
 
     def start(self):
         if not self.register_tracker():
@@ -654,6 +617,7 @@ if __name__ == "__main__":
     parser.add_argument('--peer-name', type=str, default='anonymous', help='Name of the peer')
 
     args = parser.parse_args()
+    log.configure()
 
     peer = peer2peer(tracker_url=args.tracker_url, port=args.port, peer_name=args.peer_name)
     peer.start()
\ No newline at end of file
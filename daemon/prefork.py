@@ -0,0 +1,193 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.prefork
+~~~~~~~~~~~~~~~~~
+
+This module provides a pre-forking supervisor so one backend can use several
+CPU cores despite the GIL, and a state owner process for data that every
+worker must see.
+
+Requirements:
+--------------
+- multiprocessing: fork based worker processes and the state manager.
+- signal: orderly shutdown of the worker pool.
+
+Notes:
+------
+- The listening socket is created once by the supervisor and inherited by
+  every worker over ``fork``; the kernel hands each new connection to one of
+  the workers blocked in ``accept`` (or woken by the selector).
+- Workers that exit are restarted. A worker that dies right after starting is
+  restarted after :data:`RESTART_DELAY` seconds to avoid a crash loop.
+- Module level state of an app is copied into each worker, so it diverges.
+  State that must stay consistent (e.g. the tracker channels) is owned by a
+  :class:`StateOwner <StateOwner>` process and reached from the workers
+  through proxies over a local socket.
+- ``fork`` is required; on platforms without it the server runs in a single
+  process.
+
+Usage Example:
+--------------
+>>> run_prefork(serve, (server, ip, port, routes, "threading"), workers=4)
+
+"""
+
+import time
+import signal
+import logging
+import multiprocessing
+from multiprocessing.connection import wait
+from multiprocessing.managers import BaseManager
+
+from . import log
+
+logger = logging.getLogger(__name__)
+
+#: Delay before restarting a worker that died shortly after being started.
+RESTART_DELAY = 1.0
+
+
+def can_fork():
+    """:rtype bool: whether worker processes can be forked on this platform."""
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def _worker_main(target, args):
+    """Entry point of a worker process."""
+    # Ctrl-C reaches the whole process group; only the supervisor reacts to it.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    try:
+        target(*args)
+    finally:
+        # Workers leave through os._exit(), which skips atexit handlers.
+        log.shutdown()
+
+
+def run_prefork(target, args, workers, name="Backend"):
+    """
+    Forks ``workers`` processes running ``target(*args)`` and supervises them
+    until SIGINT or SIGTERM is received.
+
+    :param target (callable): serving loop run in every worker.
+    :param args (tuple): arguments for ``target``; sockets in it are inherited.
+    :param workers (int): number of worker processes.
+    :param name (str): label used in log lines and process names.
+    """
+    ctx = multiprocessing.get_context("fork")
+    procs = {}
+    started = {}
+    stopping = []
+
+    def spawn(slot):
+        proc = ctx.Process(target=_worker_main, args=(target, args),
+                           name="{}-worker-{}".format(name, slot))
+        proc.start()
+        procs[slot] = proc
+        started[slot] = time.monotonic()
+        logger.info("[%s] worker %d started with pid %d", name, slot, proc.pid)
+
+    def stop(signum, frame):
+        stopping.append(signum)
+
+    previous = (signal.signal(signal.SIGINT, stop), signal.signal(signal.SIGTERM, stop))
+    try:
+        for slot in range(workers):
+            spawn(slot)
+
+        while not stopping:
+            sentinels = {proc.sentinel: slot for slot, proc in procs.items()}
+            for sentinel in wait(list(sentinels), timeout=1.0):
+                slot = sentinels[sentinel]
+                proc = procs[slot]
+                proc.join()
+                if stopping:
+                    break
+                logger.warning("[%s] worker %d (pid %d) exited with code %s, restarting",
+                               name, slot, proc.pid, proc.exitcode)
+                if time.monotonic() - started[slot] < RESTART_DELAY:
+                    time.sleep(RESTART_DELAY)
+                spawn(slot)
+    finally:
+        signal.signal(signal.SIGINT, previous[0])
+        signal.signal(signal.SIGTERM, previous[1])
+        for proc in procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        for proc in procs.values():
+            proc.join()
+        logger.info("[%s] all workers stopped", name)
+
+
+class StateOwner:
+    """
+    Owns one shared object in a dedicated manager process.
+
+    The object is built by ``factory`` and lives only in the owner process.
+    Workers call its public methods through a proxy; every call is one round
+    trip over a local socket, and arguments and return values are copied, so
+    the object should expose coarse operations (``register_peer``,
+    ``list_peers``...) rather than hand out its internal containers.
+
+    Usage::
+
+      >>> owner = StateOwner(ChannelRegistry)
+      >>> registry = owner.start()
+      >>> app.run(workers=4)
+    """
+
+    __attrs__ = [
+        "factory",
+        "manager",
+    ]
+
+    def __init__(self, factory):
+        """
+        Initialize a new StateOwner instance.
+
+        :param factory (callable): builds the shared object in the owner process.
+        """
+        self.factory = factory
+        self.manager = None
+
+    def start(self):
+        """
+        Start the owner process. Must be called before the workers are forked
+        so they inherit the returned proxy.
+
+        :rtype: proxy of the shared object.
+        """
+        factory = self.factory
+        shared = []
+
+        def get_shared():
+            if not shared:
+                shared.append(factory())
+            return shared[0]
+
+        # A private manager class keeps registrations of different owners apart.
+        manager_cls = type("StateManager", (BaseManager,), {})
+        manager_cls.register("get_shared", callable=get_shared)
+
+        self.manager = manager_cls(ctx=multiprocessing.get_context("fork"))
+        self.manager.start()
+        logger.info("[StateOwner] %s served at %s",
+                    getattr(factory, "__name__", factory), self.manager.address)
+        return self.manager.get_shared()
+
+    def shutdown(self):
+        """Stop the owner process."""
+        if self.manager is not None:
+            self.manager.shutdown()
+            self.manager = None
@@ -25,81 +25,626 @@ Requirement:
 - response: customized :class: `Response <Response>` utilities.
 - httpadapter: :class: `HttpAdapter <HttpAdapter >` adapter for HTTP request processing.
 - dictionary: :class: `CaseInsensitiveDict <CaseInsensitiveDict>` for managing headers and cookies.
+- metrics: :data:`REGISTRY <daemon.metrics.REGISTRY>` for request and upstream metrics.
+- overload: :class:`Limiter <daemon.overload.Limiter>` for load shedding.
+- timeouts: :class:`Deadline <daemon.timeouts.Deadline>` for client and upstream deadlines.
+- upstream: :data:`POOLS <daemon.upstream.POOLS>` of keep-alive backend connections.
+- relay: socket to socket body relays.
+- balancer: :class:`Balancer <daemon.balancer.Balancer>` policies choosing the upstream.
+- health: health checks and ejection of failing upstreams.
+- proxycache: :data:`RESPONSE_CACHE <daemon.proxycache.RESPONSE_CACHE>` of the host blocks with ``proxy_cache on;``.
+
+Notes:
+------
+- Requests are counted per host block and upstream responses per upstream,
+  with their latency. ``GET /metrics`` with a Host that matches no host block
+  (e.g. ``curl http://127.0.0.1:8080/metrics``) is answered by the proxy
+  itself in the Prometheus text format instead of being forwarded.
+- Client connections beyond the limits of the :class:`Limiter
+  <daemon.overload.Limiter>` (``proxy`` in the metrics) are answered with
+  503 instead of getting a thread; client threads are daemon threads.
+- Client reads and writes and upstream exchanges run under the deadlines of
+  :mod:`daemon.timeouts` (``proxy`` in the metrics), so a slow client or a
+  stalled backend releases its thread.
+- Requests reach the backends over pooled keep-alive connections (see
+  :mod:`daemon.upstream`); responses are read by their framing, not until
+  the backend closes the connection.
+- Messages are streamed: the request header goes upstream once parsed and
+  the response header to the client once received, and the bodies are
+  relayed as they arrive (see :mod:`daemon.relay`), so the proxy's memory
+  does not grow with their size. Only chunked request bodies are decoded
+  first and forwarded with a Content-Length.
+- The upstream of a request is chosen by the ``dist_policy`` of its host
+  block (see :mod:`daemon.balancer`); requests in flight and the latency to
+  the response header of each upstream feed the load-aware policies.
+- Upstreams that fail their health checks or fail requests repeatedly are
+  skipped (see :mod:`daemon.health`). A request whose upstream refuses the
+  connection is sent to another one; other upstream failures are answered
+  with 502 Bad Gateway, or 504 Gateway Timeout when the upstream stalled.
+- Host blocks with ``proxy_cache on;`` answer GET and HEAD from the shared
+  response cache (see :mod:`daemon.proxycache`) when they can. Cacheable
+  responses are read whole (they are bounded in size) and stored; a stale
+  entry that may still be served is refreshed by a background thread.
 
 """
 import socket
+import time
+import logging
 import threading
 from .response import *
-from .httpadapter import HttpAdapter
+from .httpadapter import HttpAdapter, send_buffers, CONTINUE_RESPONSE
+from .metrics import REGISTRY, CONTENT_TYPE
+from .middleware import response_status
+from .overload import Limiter
+from .timeouts import WHEEL, Deadline
+from .upstream import (
+    POOLS,
+    UpstreamClosed,
+    read_head,
+    read_body,
+    read_response,
+    parse_response_head,
+    bodyless,
+)
+from .relay import relay, relay_until_close, relay_chunked, ChunkedScanner, RelayError
+from .balancer import Balancer, DEFAULT_POLICY
+from .proxycache import RESPONSE_CACHE, CACHEABLE_METHODS
 from .dictionary import CaseInsensitiveDict
+from .httpparser import HttpParser, HttpParseError
+from . import log
+
+logger = logging.getLogger(__name__)
+
+#: Target of Hosts without a host block.
+DEFAULT_ROUTE = ('127.0.0.1:9000', DEFAULT_POLICY, {})
+
+#: Balancers by hostname, with the route they were built from.
+_balancers = {}
+_balancers_lock = threading.Lock()
+
+#: Connection-scoped headers that must not be forwarded upstream.
+HOP_BY_HOP_HEADERS = ("connection", "keep-alive", "proxy-connection")
+
+#: Path the proxy serves its metrics on for Hosts without a host block.
+METRICS_PATH = "/metrics"
+
+REQUESTS = REGISTRY.counter(
+    "proxy_requests_total", "Client requests by host block and status.", ("host", "status"))
+REQUEST_DURATION = REGISTRY.histogram(
+    "proxy_request_duration_seconds", "Time spent serving client requests.", ("host",))
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "proxy_upstream_requests_total", "Responses received from upstreams.", ("upstream", "status"))
+UPSTREAM_DURATION = REGISTRY.histogram(
+    "proxy_upstream_duration_seconds", "Time from connecting to an upstream to its full response.",
+    ("upstream",))
+UPSTREAM_ERRORS = REGISTRY.counter(
+    "proxy_upstream_errors_total", "Upstream connections that failed.", ("upstream",))
+
+#: Answer to requests without a Host or whose body was cut short.
+BAD_REQUEST_RESPONSE = b"HTTP/1.1 400 Bad Request\r\n\r\n"
+
+#: Answer to requests whose upstream failed.
+BAD_GATEWAY_RESPONSE = (
+    b"HTTP/1.1 502 Bad Gateway\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 15\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"502 Bad Gateway"
+)
+
+#: Answer to requests whose upstream did not respond in time.
+GATEWAY_TIMEOUT_RESPONSE = (
+    b"HTTP/1.1 504 Gateway Timeout\r\n"
+    b"Content-Type: text/plain\r\n"
+    b"Content-Length: 19\r\n"
+    b"Connection: close\r\n"
+    b"\r\n"
+    b"504 Gateway Timeout"
+)
+
+def build_upstream_head(parser):
+    """
+    Builds the header block forwarded to a backend from a parsed client request.
+
+    The request line and end-to-end headers are reused as received; hop-by-hop
+    headers are replaced by ``Connection: keep-alive`` so the pooled upstream
+    connection can carry further requests. A chunked body was decoded by the
+    parser, so it is announced with a Content-Length instead.
+
+    :params parser (HttpParser): parser holding at least the request header.
+
+    :rtype bytes: request line and headers, including the blank line.
+    """
+    # Expect is answered by the proxy, not upstream.
+    dropped = HOP_BY_HOP_HEADERS + ("expect", "transfer-encoding")
+    lines = [parser.request_line()]
+    for name, line in parser.header_lines():
+        if name not in dropped:
+            lines.append(line)
+    if parser.chunked:
+        lines.append(b"Content-Length: %d" % parser.content_length)
+    lines.append(b"Connection: keep-alive")
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+def build_upstream_request(parser):
+    """
+    Builds the request forwarded to a backend from a complete client request.
+    The body is passed as a view of the parser buffer.
 
-#: A dictionary mapping hostnames to backend IP and port tuples.
-#: Used to determine routing targets for incoming requests.
+    :params parser (HttpParser): parser holding a complete client request.
 
-_rr_idx = {}
-_rr_lock = threading.Lock()
+    :rtype list: buffers to send in order (header block, body).
+    """
+    return [build_upstream_head(parser), parser.body()]
+
+def client_response(response, head_end):
+    """
+    Adapt an upstream response for the client connection, which the proxy
+    closes after one response: the hop-by-hop headers of the upstream
+    connection are replaced by ``Connection: close``.
+
+    :params response (bytes): complete upstream response.
+    :params head_end (int): offset of the blank line ending its header.
+
+    :rtype bytes: the response to send to the client.
+    """
+    lines = [line for line in response[:head_end].split(b"\r\n")
+             if line.partition(b":")[0].strip().lower().decode('latin-1') not in HOP_BY_HOP_HEADERS]
+    lines.append(b"Connection: close")
+    return b"\r\n".join(lines) + response[head_end:]
 
-def forward_request(host, port, request):
+def exchange(connection, request, method, deadline):
+    """
+    Send ``request`` on a checked out upstream connection and read its response.
+
+    :params connection (UpstreamConnection): connection, opened if needed.
+    :params request (list): buffers of the request.
+    :params method (str): request method.
+    :params deadline (Deadline): upstream deadline, watching the socket.
+
+    :rtype tuple: (response, head_end, reusable) as :func:`read_response
+                  <daemon.upstream.read_response>`.
+    """
+    connection.connect()
+    deadline.sock = connection.sock
+    deadline.arm("upstream")
+    for part in request:
+        connection.sock.sendall(part)
+        deadline.touch()
+    result = read_response(connection.sock, method, deadline)
+    deadline.cancel()
+    return result
+
+def forward_request(host, port, request, method="GET"):
     """
     Forwards an HTTP request to a backend server and retrieves the response.
 
+    The request goes out on a pooled keep-alive connection. If a reused
+    connection turns out to have been closed by the backend before any
+    response byte arrived, the request is sent once more on a new one.
+
     :params host (str): IP address of the backend server.
     :params port (int): port number of the backend server.
-    :params request (str): incoming HTTP request.
+    :params request (str, bytes-like or list): incoming HTTP request, forwarded
+                     as is; a list of buffers is sent in order.
+    :params method (str): request method, needed to frame HEAD responses.
 
-    :rtype bytes: Raw HTTP response from the backend server. If the connection
-                  fails, returns a 404 Not Found response.
+    :rtype bytes: Raw HTTP response from the backend server, ready for the
+                  client. If the connection fails, returns a 502 Bad Gateway
+                  response, 504 Gateway Timeout if the backend stalled.
     """
 
-    backend = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    upstream = "{}:{}".format(host, port)
+    started = time.perf_counter()
+    pool = POOLS.get(host, port)
+    deadline = Deadline(WHEEL, "proxy")
+    if isinstance(request, str):
+        request = request.encode('iso-8859-1')
+    if not isinstance(request, list):
+        request = [request]
 
     try:
-        backend.connect((host, port))
-        backend.sendall(request.encode())
-        response = b""
         while True:
-            chunk = backend.recv(4096)
-            if not chunk:
-                break
-            response += chunk
-        return response
+            connection = pool.checkout()
+            try:
+                response, head_end, reusable = exchange(connection, request, method, deadline)
+            except OSError as e:
+                deadline.cancel()
+                reused = connection.reused
+                connection.release(False)
+                if reused and not deadline.expired and isinstance(e, (UpstreamClosed, ConnectionError)):
+                    logger.debug("Stale pooled connection to %s: %s", upstream, e)
+                    continue
+                raise
+            connection.release(reusable)
+            break
+        if deadline.expired:
+            raise socket.timeout("upstream timed out")
+        UPSTREAM_DURATION.labels(upstream).observe(time.perf_counter() - started)
+        UPSTREAM_REQUESTS.labels(upstream, str(response_status(response))).inc()
+        return client_response(response, head_end)
     except socket.error as e:
-      print("Socket error: {}".format(e))
-      return (
-            "HTTP/1.1 404 Not Found\r\n"
-            "Content-Type: text/plain\r\n"
-            "Content-Length: 13\r\n"
-            "Connection: close\r\n"
-            "\r\n"
-            "404 Not Found"
-        ).encode('utf-8')
+      UPSTREAM_ERRORS.labels(upstream).inc()
+      logger.warning("Upstream %s:%s error: %s", host, port, e)
+      if deadline.expired or isinstance(e, socket.timeout):
+          return GATEWAY_TIMEOUT_RESPONSE
+      return BAD_GATEWAY_RESPONSE
+
+def relay_response(conn, upstream_sock, buf, head_end, method, deadlines):
+    """
+    Relays the body of an upstream response whose header was sent to the
+    client already.
+
+    :params conn (socket.socket): client connection socket.
+    :params upstream_sock (socket.socket): upstream socket.
+    :params buf (bytearray): bytes received with the header, which may
+                include the start of the body.
+    :params head_end (int): offset of the blank line ending the header.
+    :params method (str): request method.
+    :params deadlines (tuple): deadlines extended on progress.
+
+    :rtype bool: whether the upstream connection can carry another request.
+    """
+    _, status, content_length, chunked, close = parse_response_head(bytes(buf[:head_end]))
+    body_start = head_end + 4
+    received = len(buf) - body_start
+    view = memoryview(buf)
+
+    if bodyless(method, status):
+        return not close and received == 0
+    if chunked:
+        scanner = ChunkedScanner()
+        used = scanner.feed(buf, body_start, len(buf))
+        conn.sendall(view[body_start:body_start + used])
+        if scanner.done:
+            return not close and used == received
+        return relay_chunked(upstream_sock, conn, scanner, deadlines) and not close
+    if content_length is not None:
+        prefix = min(received, content_length)
+        conn.sendall(view[body_start:body_start + prefix])
+        relay(upstream_sock, conn, content_length - prefix, deadlines)
+        return not close and received <= content_length
+    conn.sendall(view[body_start:])
+    relay_until_close(upstream_sock, conn, deadlines)
+    return False
+
+def buffer_response(upstream_sock, buf, head_end, method, deadline):
+    """
+    Reads the body of an upstream response admitted to the cache, which has
+    a Content-Length or no body.
 
+    :params upstream_sock (socket.socket): upstream socket.
+    :params buf (bytearray): bytes received with the header.
+    :params head_end (int): offset of the blank line ending the header.
+    :params method (str): request method.
+    :params deadline (Deadline): upstream deadline, extended on progress.
+
+    :rtype tuple: (body, whether the upstream connection can carry another
+                  request).
+    """
+    _, status, content_length, _, close = parse_response_head(bytes(buf[:head_end]))
+    body_start = head_end + 4
+    if bodyless(method, status) or not content_length:
+        return b"", not close and len(buf) == body_start
+    body, complete = read_body(upstream_sock, buf, body_start, content_length, deadline)
+    return body, not close and complete
+
+def stream_request(conn, parser, host, port, deadline, target=None, lookup=None):
+    """
+    Forwards a client request whose header is parsed to a backend and streams
+    the response back.
+
+    The request header is sent upstream at once, followed by the body bytes
+    already received and the rest of the body relayed from the client. The
+    response header goes to the client as soon as it is received, then the
+    body is relayed by its framing. The upstream connection comes from its
+    pool and goes back to it when the response was complete.
+
+    :params conn (socket.socket): client connection socket.
+    :params parser (HttpParser): parser holding the request header, and the
+                    whole body if it was chunked.
+    :params host (str): IP address of the backend server.
+    :params port (int): port number of the backend server.
+    :params deadline (Deadline): deadline of the client connection.
+    :params target (Upstream): balancer entry of the backend, told the
+                    latency from the end of the request to the response
+                    header and whether the request failed on the backend
+                    (an error or a 5xx status).
+    :params lookup (CacheLookup): the request's :meth:`ResponseCache.lookup
+                    <daemon.proxycache.ResponseCache.lookup>`, to store a
+                    cacheable response; None when the host does not cache.
+
+    :rtype bytes, int or None: the response to send to the client if the
+                         request could not be forwarded, None if the backend
+                         could not be connected to (nothing was sent, another
+                         one may be tried), else the status code relayed.
+    """
+    upstream = "{}:{}".format(host, port)
+    started = time.perf_counter()
+    pool = POOLS.get(host, port)
+    head = build_upstream_head(parser)
+    if parser.chunked:
+        body, remaining = parser.body(), 0
+    else:
+        body = parser.buffered_body()
+        remaining = parser.content_length - len(body)
+    # A request whose body was relayed already cannot be sent again.
+    replayable = remaining == 0
+    up_deadline = Deadline(WHEEL, "proxy")
+
+    while True:
+        connection = None
+        connected = False
+        try:
+            connection = pool.checkout()
+            connection.connect()
+            connected = True
+            up_deadline.sock = connection.sock
+            up_deadline.arm("upstream")
+            send_buffers(connection.sock, [head, body], up_deadline)
+            if remaining:
+                if parser.expect_continue:
+                    parser.expect_continue = False
+                    conn.sendall(CONTINUE_RESPONSE)
+                deadline.arm("body")
+                try:
+                    relay(conn, connection.sock, remaining, (deadline, up_deadline))
+                except RelayError as e:
+                    logger.info("Request body cut short by the client: %s", e)
+                    up_deadline.cancel()
+                    connection.release(False)
+                    return BAD_REQUEST_RESPONSE
+                deadline.cancel()
+            # The latency of the backend alone: from the end of the request
+            # to its response header.
+            sent = time.perf_counter()
+            buf, head_end = read_head(connection.sock, up_deadline)
+            if target is not None:
+                target.observe(time.perf_counter() - sent)
+        except OSError as e:
+            up_deadline.cancel()
+            reused = connection is not None and connection.reused
+            if connection is not None:
+                connection.release(False)
+            if (replayable and reused and not up_deadline.expired
+                    and isinstance(e, (UpstreamClosed, ConnectionError))):
+                logger.debug("Stale pooled connection to %s: %s", upstream, e)
+                continue
+            UPSTREAM_ERRORS.labels(upstream).inc()
+            logger.warning("Upstream %s:%s error: %s", host, port, e)
+            if connection is None:
+                # The pool is full: the proxy is saturated, not the backend.
+                return GATEWAY_TIMEOUT_RESPONSE
+            if target is not None:
+                target.health.failure(str(e) or type(e).__name__)
+            if not connected:
+                return None
+            if up_deadline.expired or isinstance(e, socket.timeout):
+                return GATEWAY_TIMEOUT_RESPONSE
+            return BAD_GATEWAY_RESPONSE
+        break
+
+    status = response_status(buf)
+    if target is not None:
+        if status >= 500:
+            target.health.failure("status {}".format(status))
+        else:
+            target.health.success()
+    reusable = False
+    head = client_response(bytes(buf[:head_end + 4]), head_end)
+    entry = None
+    if lookup is not None:
+        entry = RESPONSE_CACHE.admit(lookup, head[:-4])
+    deadline.arm("write")
+    try:
+        if entry is not None:
+            try:
+                body, reusable = buffer_response(connection.sock, buf, head_end, parser.method,
+                                                 up_deadline)
+            except OSError as e:
+                # Nothing was sent yet: the client still gets a response.
+                UPSTREAM_ERRORS.labels(upstream).inc()
+                logger.warning("Upstream %s:%s error: %s", host, port, e)
+                if target is not None:
+                    target.health.failure(str(e) or type(e).__name__)
+                if up_deadline.expired or isinstance(e, socket.timeout):
+                    return GATEWAY_TIMEOUT_RESPONSE
+                return BAD_GATEWAY_RESPONSE
+            RESPONSE_CACHE.store(lookup, entry, body)
+            send_buffers(conn, [head, body], deadline)
+        else:
+            conn.sendall(head)
+            reusable = relay_response(conn, connection.sock, buf, head_end, parser.method,
+                                      (deadline, up_deadline))
+    except OSError as e:
+        # The client or the upstream went away in the middle of the body.
+        logger.info("Relay of the response from %s aborted: %s", upstream, e)
+    finally:
+        up_deadline.cancel()
+        deadline.cancel()
+        connection.release(reusable)
+    UPSTREAM_DURATION.labels(upstream).observe(time.perf_counter() - started)
+    UPSTREAM_REQUESTS.labels(upstream, str(status)).inc()
+    return status
+
+
+def route_options(hostname, routes):
+    """
+    :params hostname (str): Host of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+
+    :rtype dict: the options of the host block, e.g. ``health_check`` or
+                 ``cache``; empty for routes without options.
+    """
+    route = routes.get(hostname, DEFAULT_ROUTE)
+    return route[2] if len(route) > 2 else {}
+
+def balancer_for(hostname, routes):
+    """
+    The :class:`Balancer <daemon.balancer.Balancer>` of a host block, built
+    on first use and again if its route changes.
+
+    :params hostname (str): Host of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+
+    :rtype Balancer
+    """
+    route = routes.get(hostname, DEFAULT_ROUTE)
+    entry = _balancers.get(hostname)
+    if entry is None or entry[0] is not route:
+        with _balancers_lock:
+            entry = _balancers.get(hostname)
+            if entry is None or entry[0] is not route:
+                proxy_map, policy = route[:2]
+                balancer = Balancer(proxy_map, policy,
+                                    route_options(hostname, routes).get("health_check"))
+                entry = _balancers[hostname] = (route, balancer)
+    return entry[1]
+
+def choose_upstream(hostname, routes):
+    """
+    Choose the backend of a request by the ``dist_policy`` of its host block.
+
+    :params hostname (str): Host of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+
+    :rtype Upstream: the :class:`Upstream <daemon.balancer.Upstream>` chosen.
+    """
+    return balancer_for(hostname, routes).pick()
 
 def resolve_routing_policy(hostname, routes):
     """
     Handles an routing policy to return the matching proxy_pass.
     It determines the target backend to forward the request to.
 
-    :params host (str): IP address of the request target server.
-    :params port (int): port number of the request target server.
+    :params hostname (str): Host of the request.
     :params routes (dict): dictionary mapping hostnames and location.
+
+    :rtype tuple: (host, port) of the backend, the port as a string.
+    """
+    upstream = choose_upstream(hostname, routes)
+    return upstream.host, str(upstream.port)
+
+def revalidation_head(parser, entry):
     """
+    Builds the request refreshing a stale cache entry: the client's request,
+    made conditional on the entry's validators.
 
-    proxy_map, policy = routes.get(hostname, ('127.0.0.1:9000', 'round-robin'))
-    target = proxy_map
+    :params parser (HttpParser): parser holding the request header.
+    :params entry (CacheEntry): the stale entry.
+
+    :rtype bytes: request line and headers, including the blank line.
+    """
+    dropped = (b"if-none-match:", b"if-modified-since:", b"range:", b"if-range:")
+    lines = [line for line in build_upstream_head(parser)[:-4].split(b"\r\n")
+             if not line.lower().startswith(dropped)]
+    if entry.etag:
+        lines.append(b"If-None-Match: " + entry.etag.encode('latin-1'))
+    if entry.last_modified:
+        lines.append(b"If-Modified-Since: " + entry.last_modified.encode('latin-1'))
+    return b"\r\n".join(lines) + b"\r\n\r\n"
+
+def refresh_entry(hostname, routes, request, lookup):
+    """
+    Refetches a stale cache entry served while stale-while-revalidate, from
+    a background thread.
 
-    if isinstance(proxy_map, list) and len(proxy_map) >= 2 and (policy or '').lower() == 'round-robin':
-        with _rr_lock:
-            next_idx = _rr_idx.get(hostname, 0) % len(proxy_map)
-            _rr_idx[hostname] = next_idx + 1
-        target = proxy_map[next_idx]
-    elif isinstance(proxy_map, list):
-        target = proxy_map[0]
+    A 304 Not Modified renews the entry, a cacheable response replaces it,
+    any other response but a server error drops it. On a failure the entry
+    is kept for the next request to refresh.
 
-    proxy_host, proxy_port = target.rsplit(':', 1)
-    return proxy_host, proxy_port
+    :params hostname (str): Host of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+    :params request (bytes): the conditional request, see
+                     :func:`revalidation_head`.
+    :params lookup (CacheLookup): lookup that found the entry.
+    """
+    entry = lookup.entry
+    try:
+        upstream = balancer_for(hostname, routes).pick()
+        response = forward_request(upstream.host, upstream.port, request, entry.key[0])
+        head_end = response.find(b"\r\n\r\n")
+        status = response_status(response)
+        if status == 304:
+            RESPONSE_CACHE.revalidated(entry, response[:head_end])
+            return
+        if status >= 500:
+            return
+        fresh = RESPONSE_CACHE.admit(lookup, response[:head_end])
+        if fresh is not None:
+            RESPONSE_CACHE.store(lookup, fresh, response[head_end + 4:])
+        else:
+            RESPONSE_CACHE.invalidate(hostname, entry.key[2])
+    except Exception:
+        logger.exception("Refresh of the cached %s failed", entry.key)
+    finally:
+        RESPONSE_CACHE.end_refresh(entry)
+
+def upstream_stats():
+    """
+    :rtype dict: the :meth:`Balancer.stats <daemon.balancer.Balancer.stats>`
+                 of each host block in use, with the health of its upstreams.
+    """
+    return {hostname: entry[1].stats() for hostname, entry in list(_balancers.items())}
+
+def metrics_response():
+    """
+    The proxy's own ``/metrics`` answer.
 
-def handle_client(ip, port, conn, addr, routes):
+    :rtype bytes: raw HTTP response with :data:`REGISTRY` in the Prometheus
+                  text format.
+    """
+    body = REGISTRY.render().encode('utf-8')
+    return (
+        "HTTP/1.1 200 OK\r\n"
+        "Content-Type: {}\r\n"
+        "Content-Length: {}\r\n"
+        "Connection: close\r\n"
+        "\r\n"
+    ).format(CONTENT_TYPE, len(body)).encode('latin-1') + body
+
+def forward_client(conn, addr, parser, hostname, routes, deadline, limiter, lookup=None):
+    """
+    Forwards a client request to a backend of its host block, chosen by the
+    block's balancer. Backends refusing the connection are skipped for
+    another one.
+
+    :params conn (socket.socket): client connection socket.
+    :params addr (tuple): client address (IP, port).
+    :params parser (HttpParser): parser holding the request header.
+    :params hostname (str): Host of the request.
+    :params routes (dict): dictionary mapping hostnames and location.
+    :params deadline (Deadline): deadline of the client connection.
+    :params limiter (Limiter): limits of the proxy, or None.
+    :params lookup (CacheLookup): cache lookup of the request, or None.
+
+    :rtype bytes or int: as :func:`stream_request`, never None.
+    """
+    balancer = balancer_for(hostname, routes)
+
+    if limiter is not None and not limiter.acquire_blocking():
+        logger.debug("Shed request from %s", addr)
+        return limiter.response
+    try:
+        tried = []
+        response = None
+        while response is None and len(tried) < len(balancer.upstreams):
+            upstream = balancer.pick(tried)
+            tried.append(upstream)
+            logger.debug("Host name %s is forwarded to %s", hostname, upstream.address)
+            lease = upstream.acquire()
+            try:
+                response = stream_request(conn, parser, upstream.host, upstream.port,
+                                          deadline, upstream, lookup)
+            finally:
+                upstream.release(lease)
+        return BAD_GATEWAY_RESPONSE if response is None else response
+    finally:
+        if limiter is not None:
+            limiter.release()
+
+def handle_client(ip, port, conn, addr, routes, limiter=None):
     """
     Handles an individual client connection by parsing the request,
     determining the target backend, and forwarding the request.
@@ -109,84 +654,89 @@ def handle_client(ip, port, conn, addr, routes):
     condition,it forwards the request to the appropriate backend.
 
     The handler sends the backend response back to the client or
-    returns 404 if the hostname is unreachable or is not recognized.
+    returns 502 if no backend of the hostname could serve it.
 
     :params ip (str): IP address of the proxy server.
     :params port (int): port number of the proxy server.
     :params conn (socket.socket): client connection socket.
     :params addr (tuple): client address (IP, port).
     :params routes (dict): dictionary mapping hostnames and location.
+    :params limiter (Limiter): limits of the proxy; the connection was counted
+                    by its ``connect()`` already.
     """
+    deadline = Deadline(WHEEL, "proxy", conn)
     try:
-        # Read full request including body
-        buffer = b""
-        while b"\r\n\r\n" not in buffer:
-            chunk = conn.recv(4096)
-            if not chunk:
-                break
-            buffer += chunk
-        
-        if not buffer:
+        # Read the request header; the body is relayed while it arrives
+        parser = HttpParser()
+        try:
+            while not parser.parse_head():
+                deadline.reading(parser)
+                if not parser.recv_from(conn):
+                    conn.close()
+                    return
+            # A chunked body is decoded and forwarded with a Content-Length
+            while parser.chunked and not parser.parse():
+                if parser.expect_continue:
+                    parser.expect_continue = False
+                    conn.sendall(CONTINUE_RESPONSE)
+                deadline.reading(parser)
+                if not parser.recv_from(conn):
+                    conn.close()
+                    return
+            deadline.cancel()
+        except HttpParseError as e:
+            logger.info("Bad request from %s: %s", addr, e)
+            conn.sendall("HTTP/1.1 {} {}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+                         .format(e.status, e.reason).encode('latin-1'))
             conn.close()
             return
-        
-        # Split headers and body
-        headers_part, body_part = buffer.split(b"\r\n\r\n", 1)
-        
-        # Parse Content-Length
-        content_length = 0
-        headers_str = headers_part.decode('iso-8859-1', errors='ignore')
-        hostname = None
-        
-        for line in headers_str.split('\r\n'):
-            if line.lower().startswith('host:'):
-                hostname = line.split(':', 1)[1].strip()
-            elif line.lower().startswith('content-length:'):
-                try:
-                    content_length = int(line.split(':', 1)[1].strip())
-                except ValueError:
-                    pass
-        
-        # Read remaining body if needed
-        while len(body_part) < content_length:
-            chunk = conn.recv(min(4096, content_length - len(body_part)))
-            if not chunk:
-                break
-            body_part += chunk
-        
-        # Reconstruct full request
-        request = (headers_part + b"\r\n\r\n" + body_part).decode('iso-8859-1', errors='ignore')
-        
+
+        hostname = parser.header('host')
+
         if not hostname:
-            conn.sendall(b"HTTP/1.1 400 Bad Request\r\n\r\n")
+            conn.sendall(BAD_REQUEST_RESPONSE)
             conn.close()
             return
 
-        print("[Proxy] {} at Host: {}".format(addr, hostname))
+        logger.debug("%s at Host: %s", addr, hostname)
+        started = time.perf_counter()
 
-        # Resolve the matching destination in routes
-        resolved_host, resolved_port = resolve_routing_policy(hostname, routes)
-        try:
-            resolved_port = int(resolved_port)
-        except ValueError:
-            print("Not a valid integer")
+        if (hostname not in routes and parser.method == "GET"
+                and parser.target.partition('?')[0] == METRICS_PATH):
+            conn.sendall(metrics_response())
+            conn.close()
+            return
 
-        if resolved_host:
-            print("[Proxy] Host name {} is forwarded to {}:{}".format(hostname, resolved_host, resolved_port))
-            response = forward_request(resolved_host, resolved_port, request)        
+        lookup = None
+        if route_options(hostname, routes).get("cache"):
+            lookup = RESPONSE_CACHE.lookup(hostname, parser)
+
+        if lookup is not None and lookup.entry is not None:
+            # Answered from the cache; a stale entry is refreshed meanwhile
+            if lookup.refresh:
+                threading.Thread(target=refresh_entry, daemon=True,
+                                 args=(hostname, routes, revalidation_head(parser, lookup.entry),
+                                       lookup)).start()
+            response = lookup.entry.response()
         else:
-            response = (
-                "HTTP/1.1 404 Not Found\r\n"
-                "Content-Type: text/plain\r\n"
-                "Content-Length: 13\r\n"
-                "Connection: close\r\n"
-                "\r\n"
-                "404 Not Found"
-            ).encode('utf-8')
-        conn.sendall(response)
+            response = forward_client(conn, addr, parser, hostname, routes, deadline,
+                                      limiter, lookup)
+        if isinstance(response, int):
+            status = response
+        else:
+            status = response_status(response)
+            deadline.arm("write")
+            conn.sendall(response)
+        # Unknown Hosts share one series so clients cannot add label values.
+        host_label = hostname if hostname in routes else "(default)"
+        REQUEST_DURATION.labels(host_label).observe(time.perf_counter() - started)
+        REQUESTS.labels(host_label, str(status)).inc()
+        if lookup is not None and parser.method not in CACHEABLE_METHODS and status < 400:
+            # The request may have changed what the target returns
+            RESPONSE_CACHE.invalidate(hostname, parser.target)
         conn.close()
-    except Exception as e:
-        print("[Proxy] Error handling client {}: {}".format(addr, e))
+    except Exception:
+        logger.exception("Error handling client %s", addr)
         try:
             error_response = (
                 "HTTP/1.1 500 Internal Server Error\r\n"
@@ -200,8 +750,12 @@ def handle_client(ip, port, conn, addr, routes):
             conn.close()
         except:
             pass
+    finally:
+        deadline.cancel()
+        if limiter is not None:
+            limiter.disconnect()
 
-def run_proxy(ip, port, routes):
+def run_proxy(ip, port, routes, limiter=None):
     """
     Starts the proxy server and listens for incoming connections. 
 
@@ -213,34 +767,47 @@ def run_proxy(ip, port, routes):
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
     :params routes (dict): dictionary mapping hostnames and location.
+    :params limiter (Limiter): connection and request limits, defaults if None.
 
     """
 
+    if limiter is None:
+        limiter = Limiter("proxy")
+    # Build the balancers now so health checks start before the first request
+    for hostname in routes:
+        balancer_for(hostname, routes)
     proxy = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
 
     try:
         proxy.bind((ip, port))
         proxy.listen(50)
-        print("[Proxy] Listening on IP {} port {}".format(ip,port))
+        logger.info("Listening on IP %s port %s", ip, port)
         while True:
             conn, addr = proxy.accept()
+            if not limiter.connect():
+                limiter.reject(conn)
+                continue
             #
             #  TODO: implement the step of the client incomping connection
             #        using multi-thread programming with the
             #        provided handle_client routine
             #
-            client_thread = threading.Thread(target=handle_client, args=(ip, port, conn, addr, routes))
+            client_thread = threading.Thread(target=handle_client,
+                                             args=(ip, port, conn, addr, routes, limiter))
+            client_thread.daemon = True
             client_thread.start()
     except socket.error as e:
-      print("Socket error: {}".format(e))
+      logger.error("Socket error: %s", e)
 
-def create_proxy(ip, port, routes):
+def create_proxy(ip, port, routes, limiter=None):
     """
     Entry point for launching the proxy server.
 
     :params ip (str): IP address to bind the proxy server.
     :params port (int): port number to listen on.
     :params routes (dict): dictionary mapping hostnames and location.
+    :params limiter (Limiter): connection and request limits.
     """
 
-    run_proxy(ip, port, routes)
+    log.configure()
+    run_proxy(ip, port, routes, limiter)
@@ -0,0 +1,528 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.proxycache
+~~~~~~~~~~~~~~~~~
+
+This module provides the shared response cache of the proxy, enabled per
+host block with ``proxy_cache on;``. Cached responses are answered by the
+proxy without reaching a backend.
+
+A :class:`CacheEntry <CacheEntry>` keeps the header block sent to the client
+and the body of one response, with its freshness lifetime from the
+``Cache-Control`` ``s-maxage`` or ``max-age`` directive, or ``Expires``
+minus ``Date``.
+
+Notes:
+------
+- Entries are keyed on the method, Host and request target, plus the values
+  of the request headers named by the response's ``Vary``; ``Vary: *`` is
+  never cached.
+- Only GET and HEAD are looked up. Requests with ``Cache-Control: no-store``
+  bypass the cache; ``no-cache``, ``max-age=0`` or ``Pragma: no-cache`` go
+  to the backend and store the new response.
+- A response is stored only if it has a cacheable status, an explicit
+  freshness lifetime, a Content-Length of at most :data:`MAX_ENTRY_SIZE`
+  (or no body), and neither ``no-store``, ``no-cache``, ``private`` nor
+  ``Set-Cookie``. Responses to requests with ``Authorization`` or
+  ``Cookie`` are stored only if marked ``public`` or ``s-maxage``.
+- A stale entry within its ``stale-while-revalidate`` window is served as
+  it is while one request at a time refreshes it in the background,
+  conditionally when it has an ``ETag`` or ``Last-Modified``. Later entries
+  are refetched; ``must-revalidate`` disables the window.
+- A successful request with another method (POST, PUT, DELETE, ...)
+  invalidates the entries of its target.
+- The cache is bounded by ``max_bytes`` and evicts the least recently used
+  entries. Lookups by result, the bytes of the bodies served from memory
+  (bytes saved upstream) and the occupancy are exported in
+  :data:`daemon.metrics.REGISTRY`.
+
+Usage Example:
+--------------
+>>> lookup = RESPONSE_CACHE.lookup("app1.local", parser)
+>>> if lookup.state == HIT:
+...     conn.sendall(lookup.entry.response())
+>>> RESPONSE_CACHE.stats()
+{'hits': 10, 'stale_hits': 1, 'misses': 2, 'hit_ratio': 0.84, ...}
+
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from email.utils import parsedate_tz, mktime_tz
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+#: Upper bound of the bytes held by the cache.
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+#: Larger responses are relayed without being cached.
+MAX_ENTRY_SIZE = 1024 * 1024
+
+#: Status codes stored when the response has an explicit lifetime.
+CACHEABLE_STATUS = (200, 203, 204, 300, 301, 308, 404, 405, 410, 414, 501)
+
+#: Methods looked up in the cache.
+CACHEABLE_METHODS = ("GET", "HEAD")
+
+#: Lookup results.
+HIT, STALE, MISS, BYPASS = "hit", "stale", "miss", "bypass"
+
+
+def parse_cache_control(value):
+    """
+    Parse a Cache-Control header value.
+
+    :param value (str): the header, e.g. ``public, max-age=60``.
+    :rtype dict: lowercase directive names to their value, or True for
+                 directives without one.
+    """
+    directives = {}
+    if not value:
+        return directives
+    for part in value.split(","):
+        name, sep, arg = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') if sep else True
+    return directives
+
+
+def _seconds(directives, name):
+    """:rtype int: the delta-seconds of directive ``name``, None if absent or invalid."""
+    try:
+        return max(0, int(directives[name]))
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def _http_date(value):
+    """:rtype float: seconds since the epoch of an HTTP date, None if invalid."""
+    parsed = parsedate_tz(value) if value else None
+    if parsed is None:
+        return None
+    try:
+        return mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+
+
+def parse_response_headers(head):
+    """
+    Parse the header fields of a response header block.
+
+    :param head (bytes): status line and headers, without the blank line.
+    :rtype dict: lowercase names to values; repeated fields are joined
+                 with ``, ``.
+    """
+    headers = {}
+    for line in head.split(b"\r\n")[1:]:
+        name, sep, value = line.partition(b":")
+        if not sep:
+            continue
+        name = name.strip().lower().decode('latin-1')
+        value = value.strip().decode('latin-1')
+        headers[name] = headers[name] + ", " + value if name in headers else value
+    return headers
+
+
+class CacheEntry:
+    """One cached response."""
+
+    __slots__ = ("key", "status", "head", "body", "created", "initial_age", "ttl", "swr",
+                 "etag", "last_modified", "vary", "revalidating")
+
+    def __init__(self, key, status, head, ttl, swr, initial_age, etag, last_modified, vary):
+        self.key = key
+        self.status = status
+        #: Status line and headers for the client, without Age or the blank line.
+        self.head = head
+        self.body = b""
+        self.created = time.monotonic()
+        self.initial_age = initial_age
+        #: Freshness lifetime and stale-while-revalidate window, in seconds.
+        self.ttl = ttl
+        self.swr = swr
+        self.etag = etag
+        self.last_modified = last_modified
+        #: Lowercase names of the request headers the response varies on.
+        self.vary = vary
+        self.revalidating = False
+
+    def __repr__(self):
+        return "<CacheEntry {} {} age={:.0f}/{}>".format(
+            " ".join(self.key), self.status, self.age(), self.ttl)
+
+    def age(self, now=None):
+        """:rtype float: seconds since the backend generated the response."""
+        return self.initial_age + (time.monotonic() if now is None else now) - self.created
+
+    def response(self, now=None):
+        """:rtype bytes: the response for the client, with its Age."""
+        return b"%s\r\nAge: %d\r\n\r\n%s" % (self.head, int(self.age(now)), self.body)
+
+    @property
+    def memory(self):
+        """:rtype int: bytes accounted against the cache bound."""
+        return len(self.head) + len(self.body) + 256
+
+
+class CacheLookup:
+    """
+    Result of :meth:`ResponseCache.lookup`, carried along the request so its
+    response can be stored.
+
+    Attributes:
+        state (str): :data:`HIT`, :data:`STALE`, :data:`MISS` or :data:`BYPASS`.
+        entry (CacheEntry): the entry to serve on a hit.
+        refresh (bool): on :data:`STALE`, whether this request should refresh
+                        the entry in the background.
+    """
+
+    __slots__ = ("key", "header", "credentials", "state", "entry", "refresh")
+
+    def __init__(self, key, header, credentials, state, entry=None, refresh=False):
+        #: (method, host, target) of the request.
+        self.key = key
+        #: The request's header lookup, e.g. :meth:`HttpParser.header`.
+        self.header = header
+        self.credentials = credentials
+        self.state = state
+        self.entry = entry
+        self.refresh = refresh
+
+    def __repr__(self):
+        return "<CacheLookup {} {}>".format(" ".join(self.key or ()), self.state)
+
+    def secondary(self, vary):
+        """:rtype tuple: the request's values of the headers in ``vary``."""
+        return tuple((self.header(name) or "").strip() for name in vary)
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache of :class:`CacheEntry <CacheEntry>` objects.
+
+    Attributes:
+        max_bytes (int): upper bound of the cached bytes.
+        max_entry_size (int): largest body stored.
+        hits (int): lookups answered with a fresh entry.
+        stale_hits (int): lookups answered with a stale entry being refreshed.
+        misses (int): lookups forwarded to a backend.
+        bypasses (int): requests the cache could not answer by their method
+                        or directives.
+        bytes_saved (int): body bytes answered from the cache.
+        evictions (int): entries dropped to stay under ``max_bytes``.
+    """
+
+    __attrs__ = [
+        "max_bytes",
+        "max_entry_size",
+        "hits",
+        "stale_hits",
+        "misses",
+        "bypasses",
+        "bytes_saved",
+        "evictions",
+    ]
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, max_entry_size=MAX_ENTRY_SIZE):
+        """
+        :param max_bytes (int): upper bound of the cached bytes.
+        :param max_entry_size (int): largest body stored.
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_size = max_entry_size
+
+        self._lock = threading.Lock()
+        #: (key, secondary) -> CacheEntry, least recently used first.
+        self._entries = OrderedDict()
+        #: key -> Vary names of its latest response.
+        self._vary = {}
+        #: key -> secondaries cached under it.
+        self._variants = {}
+        self._bytes = 0
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.bypasses = 0
+        self.bytes_saved = 0
+        self.evictions = 0
+
+    def __repr__(self):
+        return "<ResponseCache {} entries {} bytes>".format(len(self._entries), self._bytes)
+
+    def configure(self, max_bytes=None, max_entry_size=None):
+        """Change the bounds; None keeps the current value."""
+        with self._lock:
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if max_entry_size is not None:
+                self.max_entry_size = max_entry_size
+            self._evict()
+
+    def lookup(self, host, parser):
+        """
+        Look up the response to a request.
+
+        :param host (str): Host of the request.
+        :param parser (HttpParser): parser holding the request header.
+        :rtype CacheLookup: the result; :data:`HIT` and :data:`STALE` carry
+                            the entry to answer with.
+        """
+        header = parser.header
+        if (parser.method not in CACHEABLE_METHODS
+                or "no-store" in parse_cache_control(header("cache-control"))):
+            with self._lock:
+                self.bypasses += 1
+            return CacheLookup(None, header, False, BYPASS)
+
+        directives = parse_cache_control(header("cache-control"))
+        key = (parser.method, host, parser.target)
+        credentials = bool(header("authorization") or header("cookie"))
+        lookup = CacheLookup(key, header, credentials, MISS)
+        if ("no-cache" in directives or _seconds(directives, "max-age") == 0
+                or "no-cache" in (header("pragma") or "").lower()):
+            # Fetch anew, then store.
+            with self._lock:
+                self.misses += 1
+            return lookup
+
+        now = time.monotonic()
+        with self._lock:
+            vary = self._vary.get(key)
+            entry = None
+            if vary is not None:
+                entry_key = (key, lookup.secondary(vary))
+                entry = self._entries.get(entry_key)
+            if entry is None:
+                self.misses += 1
+                return lookup
+            age = entry.age(now)
+            if age < entry.ttl:
+                lookup.state = HIT
+                self.hits += 1
+            elif age < entry.ttl + entry.swr:
+                lookup.state = STALE
+                lookup.refresh = not entry.revalidating
+                entry.revalidating = True
+                self.stale_hits += 1
+            else:
+                self.misses += 1
+                return lookup
+            self._entries.move_to_end(entry_key)
+            self.bytes_saved += len(entry.body)
+            lookup.entry = entry
+        return lookup
+
+    def admit(self, lookup, head):
+        """
+        Decide whether the response to a looked up request is stored.
+
+        :param lookup (CacheLookup): the request's lookup.
+        :param head (bytes): the response's status line and headers for the
+                    client, without the blank line.
+        :rtype CacheEntry: the entry to fill with the body and :meth:`store`,
+                           or None if the response must not be cached.
+        """
+        if lookup.key is None:
+            return None
+        try:
+            status = int(head[9:12])
+        except ValueError:
+            return None
+        if status not in CACHEABLE_STATUS:
+            return None
+        headers = parse_response_headers(head)
+        directives = parse_cache_control(headers.get("cache-control"))
+        if ("no-store" in directives or "private" in directives or "no-cache" in directives
+                or "set-cookie" in headers):
+            return None
+        if lookup.credentials and not ("public" in directives or "s-maxage" in directives):
+            return None
+        if lookup.key[0] != "HEAD" and status != 204:
+            # Only bodies of a known, bounded size are held.
+            if "transfer-encoding" in headers or "content-length" not in headers:
+                return None
+            try:
+                length = int(headers["content-length"])
+            except ValueError:
+                return None
+            if length > self.max_entry_size:
+                return None
+        vary = tuple(sorted({name.strip().lower()
+                             for name in headers.get("vary", "").split(",") if name.strip()}))
+        if "*" in vary:
+            return None
+
+        ttl = _seconds(directives, "s-maxage")
+        if ttl is None:
+            ttl = _seconds(directives, "max-age")
+        if ttl is None and "expires" in headers:
+            expires = _http_date(headers["expires"])
+            date = _http_date(headers.get("date")) or time.time()
+            ttl = max(0, int(expires - date)) if expires is not None else 0
+        if not ttl:
+            return None
+        swr = 0
+        if "must-revalidate" not in directives and "proxy-revalidate" not in directives:
+            swr = _seconds(directives, "stale-while-revalidate") or 0
+        try:
+            initial_age = max(0, int(headers.get("age", "0")))
+        except ValueError:
+            initial_age = 0
+
+        # The Age of the backend is folded into initial_age and sent anew.
+        head = b"\r\n".join(line for line in head.split(b"\r\n")
+                            if not line.lower().startswith(b"age:"))
+        return CacheEntry(lookup.key, status, head, ttl, swr, initial_age,
+                          headers.get("etag"), headers.get("last-modified"), vary)
+
+    def store(self, lookup, entry, body):
+        """
+        Cache ``entry`` with its ``body`` for the request of ``lookup``.
+
+        :param lookup (CacheLookup): the request's lookup.
+        :param entry (CacheEntry): entry returned by :meth:`admit`.
+        :param body (bytes): the complete response body.
+        """
+        entry.body = body
+        key = entry.key
+        secondary = lookup.secondary(entry.vary)
+        with self._lock:
+            if self._vary.get(key) != entry.vary:
+                # Variants keyed on other headers cannot be matched anymore.
+                self._drop_key(key)
+            # Dropping the last variant forgets the Vary of the key: set it after.
+            self._drop((key, secondary))
+            if entry.memory <= self.max_bytes:
+                self._vary[key] = entry.vary
+                self._entries[(key, secondary)] = entry
+                self._variants.setdefault(key, set()).add(secondary)
+                self._bytes += entry.memory
+                self._evict()
+
+    def revalidated(self, entry, head):
+        """
+        Renew ``entry`` after the backend answered its conditional refresh
+        with 304 Not Modified.
+
+        :param head (bytes): the 304 status line and headers.
+        """
+        headers = parse_response_headers(head)
+        directives = parse_cache_control(headers.get("cache-control"))
+        ttl = _seconds(directives, "s-maxage")
+        if ttl is None:
+            ttl = _seconds(directives, "max-age")
+        with self._lock:
+            if ttl is not None:
+                entry.ttl = ttl
+            entry.created = time.monotonic()
+            entry.initial_age = 0
+            entry.revalidating = False
+
+    def end_refresh(self, entry):
+        """End the background refresh of ``entry``; a later stale hit may start another."""
+        entry.revalidating = False
+
+    def invalidate(self, host, target):
+        """
+        Forget the entries of a request target, e.g. after a successful POST.
+
+        :param host (str): Host of the request.
+        :param target (str): request target.
+        """
+        with self._lock:
+            for method in CACHEABLE_METHODS:
+                self._drop_key((method, host, target))
+
+    def clear(self):
+        """Forget every entry; the counters are kept."""
+        with self._lock:
+            self._entries.clear()
+            self._vary.clear()
+            self._variants.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Report the cache counters and occupancy.
+
+        :rtype dict: hits, stale_hits, misses, bypasses, hit_ratio,
+                     bytes_saved, evictions, entries, bytes and max_bytes.
+        """
+        with self._lock:
+            served = self.hits + self.stale_hits
+            lookups = served + self.misses
+            return {
+                "hits": self.hits,
+                "stale_hits": self.stale_hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_ratio": served / lookups if lookups else 0.0,
+                "bytes_saved": self.bytes_saved,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _drop(self, entry_key):
+        """Remove one entry; the lock must be held."""
+        entry = self._entries.pop(entry_key, None)
+        if entry is None:
+            return False
+        self._bytes -= entry.memory
+        key, secondary = entry_key
+        variants = self._variants.get(key)
+        if variants is not None:
+            variants.discard(secondary)
+            if not variants:
+                del self._variants[key]
+                self._vary.pop(key, None)
+        return True
+
+    def _drop_key(self, key):
+        """Remove every variant of ``key``; the lock must be held."""
+        for secondary in list(self._variants.get(key, ())):
+            self._drop((key, secondary))
+        self._vary.pop(key, None)
+
+    def _evict(self):
+        """Evict least recently used entries above the bound; the lock must be held."""
+        while self._bytes > self.max_bytes and self._entries:
+            entry_key = next(iter(self._entries))
+            self._drop(entry_key)
+            self.evictions += 1
+
+
+#: Cache shared by the host blocks with ``proxy_cache on;``.
+RESPONSE_CACHE = ResponseCache()
+
+REGISTRY.counter("proxy_cache_lookups_total", "Response cache lookups by result.", ("result",),
+                 func=lambda: {(result,): RESPONSE_CACHE.stats()[name] for result, name in (
+                     (HIT, "hits"), (STALE, "stale_hits"), (MISS, "misses"), (BYPASS, "bypasses"))})
+REGISTRY.counter("proxy_cache_bytes_saved_total", "Body bytes answered from the response cache.",
+                 func=lambda: RESPONSE_CACHE.stats()["bytes_saved"])
+REGISTRY.counter("proxy_cache_evictions_total", "Responses evicted to stay under the byte budget.",
+                 func=lambda: RESPONSE_CACHE.stats()["evictions"])
+for _name, _help in (("hit_ratio", "Share of cache lookups answered from memory."),
+                     ("entries", "Responses held by the cache."),
+                     ("bytes", "Memory held by the cached responses."),
+                     ("max_bytes", "Byte budget of the response cache.")):
+    REGISTRY.gauge("proxy_cache_{}".format(_name), _help,
+                   func=lambda key=_name: RESPONSE_CACHE.stats()[key])
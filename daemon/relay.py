@@ -0,0 +1,258 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.relay
+~~~~~~~~~~~~~~~~~
+
+This module provides the body relays of the proxy: message bodies are piped
+from one socket to the other as they arrive, instead of being collected in
+memory first.
+
+Notes:
+------
+- Bodies of a known size, and bodies delimited by the end of the connection,
+  are moved with ``os.splice`` through a pipe where available (Linux), so
+  their bytes never enter Python; elsewhere they go through one fixed-size
+  buffer per thread, reused by every relay of the thread.
+- Chunked bodies are relayed through the buffer, with their framing tracked
+  by a :class:`ChunkedScanner <ChunkedScanner>` so the relay stops exactly at
+  the end of the body.
+- Both sockets are blocking: the relay only reads again once the previous
+  bytes were accepted by the receiving side, so a slow receiver stalls the
+  sender through TCP flow control instead of filling the proxy's memory.
+- The deadlines passed to a relay are extended after every transfer.
+
+Usage Example:
+--------------
+>>> relay(client, upstream, content_length, (client_deadline,))
+>>> relay_until_close(upstream, client)
+
+"""
+
+import os
+import threading
+
+#: Size of the per-thread relay buffer and of one splice.
+RELAY_BUFFER = 65536
+
+#: Longest accepted chunk-size or trailer line.
+MAX_CHUNK_LINE = 4096
+
+HAS_SPLICE = hasattr(os, "splice")
+
+# Chunked framing states.
+_SIZE, _DATA, _DATA_END, _TRAILER = range(4)
+
+_local = threading.local()
+
+
+class RelayError(ConnectionError):
+    """Raised when the sending side ends or breaks the framing of a body."""
+
+
+def _buffer():
+    """:rtype tuple: the (bytearray, memoryview) relay buffer of this thread."""
+    buf = getattr(_local, "buffer", None)
+    if buf is None:
+        data = bytearray(RELAY_BUFFER)
+        buf = _local.buffer = (data, memoryview(data))
+    return buf
+
+
+def _pipe():
+    """:rtype tuple: the (read fd, write fd) splice pipe of this thread."""
+    pipe = getattr(_local, "pipe", None)
+    if pipe is None:
+        pipe = _local.pipe = os.pipe()
+    return pipe
+
+
+def _drop_pipe():
+    """Close the pipe of this thread, which may hold bytes of a failed relay."""
+    pipe = getattr(_local, "pipe", None)
+    if pipe is not None:
+        _local.pipe = None
+        os.close(pipe[0])
+        os.close(pipe[1])
+
+
+def _touch(deadlines):
+    for deadline in deadlines:
+        deadline.touch()
+
+
+def _splice(src, dst, count, deadlines):
+    """
+    Move up to ``count`` bytes (all of them until the end of ``src`` if
+    ``count`` is None) through the thread's pipe.
+
+    :rtype int: bytes moved.
+    """
+    pipe_r, pipe_w = _pipe()
+    src_fd, dst_fd = src.fileno(), dst.fileno()
+    moved = 0
+    try:
+        while count is None or moved < count:
+            want = RELAY_BUFFER if count is None else min(RELAY_BUFFER, count - moved)
+            n = os.splice(src_fd, pipe_w, want)
+            if n == 0:
+                break
+            left = n
+            while left:
+                left -= os.splice(pipe_r, dst_fd, left)
+            moved += n
+            _touch(deadlines)
+    except BaseException:
+        _drop_pipe()
+        raise
+    return moved
+
+
+def _copy(src, dst, count, deadlines):
+    """
+    Like :func:`_splice`, through the thread's buffer.
+
+    :rtype int: bytes copied.
+    """
+    _, view = _buffer()
+    moved = 0
+    while count is None or moved < count:
+        want = RELAY_BUFFER if count is None else min(RELAY_BUFFER, count - moved)
+        n = src.recv_into(view, want)
+        if n == 0:
+            break
+        dst.sendall(view[:n])
+        moved += n
+        _touch(deadlines)
+    return moved
+
+
+def relay(src, dst, count, deadlines=()):
+    """
+    Relay exactly ``count`` bytes from ``src`` to ``dst``.
+
+    :param src (socket.socket): blocking socket to read from.
+    :param dst (socket.socket): blocking socket to write to.
+    :param count (int): number of bytes.
+    :param deadlines (tuple): :class:`Deadline <daemon.timeouts.Deadline>`
+                      objects extended after each transfer.
+    :raise RelayError: if ``src`` ends before ``count`` bytes.
+    """
+    if count <= 0:
+        return
+    moved = (_splice if HAS_SPLICE else _copy)(src, dst, count, deadlines)
+    if moved < count:
+        raise RelayError("body cut short after {} of {} bytes".format(moved, count))
+
+
+def relay_until_close(src, dst, deadlines=()):
+    """
+    Relay everything ``src`` sends until it closes the connection.
+
+    :rtype int: bytes relayed.
+    """
+    return (_splice if HAS_SPLICE else _copy)(src, dst, None, deadlines)
+
+
+def relay_chunked(src, dst, scanner, deadlines=()):
+    """
+    Relay the rest of a chunked body, as it is framed, from ``src`` to ``dst``.
+
+    :param scanner (ChunkedScanner): framing state, already fed the body
+                    bytes relayed before.
+    :rtype bool: False if ``src`` sent bytes beyond the end of the body; they
+                 are dropped.
+    :raise RelayError: if ``src`` ends before the body does.
+    """
+    buf, view = _buffer()
+    while not scanner.done:
+        n = src.recv_into(view)
+        if n == 0:
+            raise RelayError("chunked body cut short")
+        used = scanner.feed(buf, 0, n)
+        dst.sendall(view[:used])
+        _touch(deadlines)
+        if used < n:
+            return False
+    return True
+
+
+class ChunkedScanner:
+    """
+    Incremental tracker of chunked transfer coding, telling where a chunked
+    body ends without decoding it.
+
+    Attributes:
+        done (bool): whether the end of the body (and its trailers) was seen.
+    """
+
+    __slots__ = ("state", "remaining", "line", "done")
+
+    def __init__(self):
+        self.state = _SIZE
+        self.remaining = 0
+        self.line = b""
+        self.done = False
+
+    def __repr__(self):
+        return "<ChunkedScanner state={} done={}>".format(self.state, self.done)
+
+    def feed(self, buf, start, end):
+        """
+        Advance over ``buf[start:end]``.
+
+        :param buf (bytearray): bytes of the body.
+        :rtype int: how many of the bytes belong to the body; fewer than
+                    ``end - start`` once the end of the body is reached.
+        :raise RelayError: on a malformed or oversized chunk-size line.
+        """
+        pos = start
+        while pos < end and not self.done:
+            if self.state == _DATA or self.state == _DATA_END:
+                n = min(self.remaining, end - pos)
+                pos += n
+                self.remaining -= n
+                if self.remaining == 0:
+                    if self.state == _DATA:
+                        # The CRLF closing the chunk data.
+                        self.state, self.remaining = _DATA_END, 2
+                    else:
+                        self.state = _SIZE
+                continue
+
+            newline = buf.find(b"\n", pos, end)
+            if newline < 0:
+                self.line += buf[pos:end]
+                if len(self.line) > MAX_CHUNK_LINE:
+                    raise RelayError("chunk line too long")
+                pos = end
+                break
+            line = (self.line + buf[pos:newline]).strip()
+            self.line = b""
+            pos = newline + 1
+
+            if self.state == _TRAILER:
+                # Trailer fields are relayed as they are; an empty line ends the body.
+                if not line:
+                    self.done = True
+                continue
+            size = line.split(b";", 1)[0].strip()
+            try:
+                size = int(size, 16)
+            except ValueError:
+                raise RelayError("invalid chunk size {!r}".format(bytes(size[:16])))
+            if size == 0:
+                self.state = _TRAILER
+            else:
+                self.state, self.remaining = _DATA, size
+        return pos - start
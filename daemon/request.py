@@ -16,8 +16,23 @@ daemon.request
 
 This module provides a Request object to manage and persist 
 request settings (cookies, auth, proxies).
+
+Headers, cookies, query parameters and the JSON body are decoded on first
+access and cached for the rest of the request, so a hook that never looks at
+them does not pay for them. Large and chunked bodies arrive already decoded
+and spooled (see :mod:`daemon.requestbody`); :meth:`Request.iter_body` walks
+them without loading them into a ``str``. Hooks opt into receiving a
+:class:`RequestContext <RequestContext>` instead of the raw ``headers`` and
+``body`` strings by naming their first parameter ``request``.
 """
+import json
+from urllib.parse import parse_qsl
 from .dictionary import CaseInsensitiveDict
+from .httpparser import decode_headers, find_header
+from .requestbody import CHUNK_SIZE
+from .router import Router
+
+_UNSET = object()
 
 class Request():
     """The fully mutable "class" `Request <Request>` object,
@@ -46,6 +61,7 @@ class Request():
         "body",
         "routes",
         "hook",
+        "path_params",
     ]
 
     def __init__(self):
@@ -65,6 +81,133 @@ class Request():
         self.routes = {}
         #: Hook point for routed mapped-path
         self.hook = None
+        #: Path parameters captured by the router, passed to the hook
+        self.path_params = {}
+        #: Methods routed for the path when the request method is not
+        self.allowed_methods = None
+        #: HTTP version of the request line
+        self.version = None
+        self._query = None
+        self._json = _UNSET
+
+    @property
+    def headers(self):
+        """Dictionary of lower-cased request headers. Headers handed over by
+        :meth:`prepare_from_parser` are only decoded on first access."""
+        if self._headers is None and self._header_source is not None:
+            self._headers = decode_headers(*self._header_source)
+            self._header_source = None
+        return self._headers
+
+    @headers.setter
+    def headers(self, value):
+        self._headers = value
+        self._header_source = None
+        self._cookies = None
+
+    @property
+    def cookies(self):
+        """Dictionary of the request cookies, parsed on first access."""
+        if self._cookies is None and (self._headers is not None or self._header_source is not None):
+            self._cookies = self.parse_cookies()
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value):
+        self._cookies = value
+
+    def header(self, name, default=None):
+        """Look up one request header without decoding the others.
+
+        :param name (str): header name, case-insensitive.
+        :rtype str: header value or ``default``.
+        """
+        if self._headers is None and self._header_source is not None:
+            return find_header(*self._header_source, name, default)
+        return (self._headers or {}).get(name.lower(), default)
+
+    @property
+    def query(self):
+        """Dictionary of the query string parameters, parsed on first access.
+        When a parameter is repeated the last value wins."""
+        if self._query is None:
+            _, _, query_string = (self.path or "").partition('?')
+            self._query = dict(parse_qsl(query_string, keep_blank_values=True))
+        return self._query
+
+    def json(self):
+        """Decode the request body as JSON, once.
+
+        :rtype: the decoded value, or None for an empty body.
+        :raise ValueError: if the body is not valid JSON.
+        """
+        if self._json is _UNSET:
+            body = self.body
+            self._json = json.loads(body) if body else None
+        return self._json
+
+    @property
+    def body(self):
+        """Request body as text. A body handed over by :meth:`prepare_from_parser`
+        is kept as a buffer view and only decoded on first access."""
+        if self._body_view is not None or self._body_stream is not None:
+            self._body = str(self.raw_body, 'utf-8')
+            self._body_view = self._body_stream = None
+        return self._body
+
+    @body.setter
+    def body(self, value):
+        self._body = value
+        self._body_view = None
+        self._body_stream = None
+
+    @property
+    def raw_body(self):
+        """Request body as a bytes-like object, without decoding it. A spooled
+        body is memory-mapped on first access."""
+        if self._body_view is None and self._body_stream is not None:
+            self._body_view = self._body_stream.view()
+        if self._body_view is not None:
+            return self._body_view
+        return (self._body or "").encode('utf-8')
+
+    def iter_body(self, chunk_size=CHUNK_SIZE):
+        """Iterate over the raw body in slices of at most ``chunk_size`` bytes,
+        without decoding or copying it.
+
+        :param chunk_size (int): largest slice size.
+        :rtype iterator: memoryview slices of :attr:`raw_body`.
+        """
+        body = memoryview(self.raw_body)
+        for offset in range(0, len(body), chunk_size):
+            yield body[offset:offset + chunk_size]
+
+    def reset(self):
+        """Clears the per-request state so the object can be reused for the
+        next request on a persistent connection."""
+        self.method = None
+        self.url = None
+        self.headers = None
+        self.path = None
+        self.cookies = None
+        self.body = None
+        self.hook = None
+        self.path_params = {}
+        self.allowed_methods = None
+        self.version = None
+        self._query = None
+        self._json = _UNSET
+
+    def wants_keep_alive(self):
+        """Whether the client asked to keep the connection open.
+
+        HTTP/1.1 connections are persistent unless ``Connection: close`` is
+        sent, HTTP/1.0 ones only with ``Connection: keep-alive``.
+        """
+        connection = self.header('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return 'close' not in connection
+        return 'keep-alive' in connection
 
     def extract_request_line(self, request):
         try:
@@ -94,7 +237,6 @@ class Request():
 
         # Prepare the request line from the request header
         self.method, self.path, self.version = self.extract_request_line(request)
-        print("[Request] {} path {} version {}".format(self.method, self.path, self.version))
 
         #
         # @bksysnet Preapring the webapp hook with WeApRous instance
@@ -104,18 +246,9 @@ class Request():
         #
         
         if not routes == {}:
-            self.routes = routes
-
-            path_without_query = self.path.split('?', 1)[0] if '?' in self.path else self.path
-
-            self.hook = routes.get((self.method, path_without_query))
-            #
-            # self.hook manipulation goes here
-            # ...
-            #
+            self.prepare_hook(routes)
 
         self.headers = self.prepare_headers(request)
-        self.cookies = self.parse_cookies()
 
         if self.method == 'POST':
             self.body = self.extract_body(request)
@@ -127,6 +260,51 @@ class Request():
 
         return
 
+    def prepare_from_parser(self, parser, routes=None):
+        """Prepares the request from an :class:`HttpParser <HttpParser>` holding a
+        complete message, reusing the header offsets it located instead of
+        re-splitting the message. Headers are decoded on first access. The
+        body is kept as a view of the parser buffer and must be used before
+        the parser consumes the message."""
+
+        self.method, self.path, self.version = parser.method, parser.target, parser.version
+        if self.path == '/':
+            self.path = '/index.html'
+
+        if routes:
+            self.prepare_hook(routes)
+
+        self.headers = None
+        self._header_source = parser.header_source()
+        self.body = ""
+        if parser.body_stream is not None:
+            # Decoded while received; mapped only if the hook reads it.
+            self._body_stream = parser.body_stream
+        elif parser.content_length:
+            self._body_view = parser.body()
+
+        return
+
+    def prepare_hook(self, routes):
+        """Looks up the webapp hook mapped to the request method and path.
+
+        ``routes`` is either a compiled :class:`Router <Router>`, which also
+        captures path parameters and the methods allowed on the path, or a
+        plain ``{(METHOD, path): hook}`` mapping looked up exactly."""
+        self.routes = routes
+
+        path_without_query = self.path.split('?', 1)[0] if '?' in self.path else self.path
+
+        if isinstance(routes, Router):
+            self.hook, params, self.allowed_methods = routes.match(self.method, path_without_query)
+            self.path_params = params or {}
+        else:
+            self.hook = routes.get((self.method, path_without_query))
+        #
+        # self.hook manipulation goes here
+        # ...
+        #
+
     def prepare_body(self, data, files, json=None):
         if data:
             self.body = data
@@ -156,7 +334,7 @@ class Request():
 
     def parse_cookies(self):
         cookies = {}
-        cookie_header = self.headers.get("cookie", "")
+        cookie_header = self.header("cookie", "")
         if cookie_header:
             for pair in cookie_header.split(";"):
                 if "=" in pair:
@@ -168,7 +346,6 @@ class Request():
         try:
             parts = request.split('\r\n\r\n', 1)
             if len(parts) > 1:
-                print("[Request] Extracted body from request{}".format(parts[1]))
                 return parts[1]
             else:
                 return ""
@@ -188,3 +365,108 @@ class Request():
                     # URL decode if needed
                     form_data[key] = value.replace('+', ' ')
         return form_data  
+
+
+class RequestContext:
+    """
+    Read-only view of the current request handed to route hooks that take a
+    ``request`` first parameter instead of ``headers`` and ``body``.
+
+    Everything is decoded lazily by the underlying :class:`Request <Request>`
+    and cached, so a hook only pays for what it reads. The context is only
+    valid while the hook runs: the request object is reused for the next
+    request of the connection. Middleware steps (see :mod:`daemon.middleware`)
+    get the same context as the hook.
+
+    Attributes:
+        method (str): request method.
+        path (str): request path, without the query string.
+        params (dict): path parameters captured by the router.
+
+    Usage::
+
+      >>> @app.route('/channels/<name>/peers', methods=['POST'])
+      >>> def add_peer(request, name):
+      >>>     peer = request.json()
+      >>>     token = request.cookies.get('auth')
+      >>>     return {'channel': name, 'limit': request.query.get('limit')}
+    """
+
+    __slots__ = ("_request", "method", "path", "params", "_state")
+
+    def __init__(self, request):
+        """
+        :param request (Request): the prepared request.
+        """
+        self._request = request
+        self.method = request.method
+        self.path = request.path.partition('?')[0]
+        self.params = request.path_params
+        self._state = None
+
+    def __repr__(self):
+        return "<RequestContext {} {}>".format(self.method, self.path)
+
+    @property
+    def routed(self):
+        """Whether a route hook serves the request."""
+        return self._request.hook is not None
+
+    @property
+    def route(self):
+        """Route pattern of the hook serving the request (``/peers/<int:port>``),
+        the path for hooks of a plain route dict, or None if no route matched."""
+        hook = self._request.hook
+        if hook is None:
+            return None
+        return getattr(hook, '_route_path', self.path)
+
+    @property
+    def state(self):
+        """Dictionary where middleware keeps per-request values."""
+        if self._state is None:
+            self._state = {}
+        return self._state
+
+    @property
+    def version(self):
+        """HTTP version of the request line."""
+        return self._request.version
+
+    @property
+    def headers(self):
+        """Dictionary of lower-cased request headers."""
+        return self._request.headers
+
+    def header(self, name, default=None):
+        """Look up one header without decoding the others."""
+        return self._request.header(name, default)
+
+    @property
+    def cookies(self):
+        """Dictionary of the request cookies."""
+        return self._request.cookies
+
+    @property
+    def query(self):
+        """Dictionary of the query string parameters."""
+        return self._request.query
+
+    @property
+    def body(self):
+        """Request body as text."""
+        return self._request.body
+
+    @property
+    def raw_body(self):
+        """Request body as a bytes-like object."""
+        return self._request.raw_body
+
+    def iter_body(self, chunk_size=CHUNK_SIZE):
+        """Iterate over the raw body in memoryview slices, see
+        :meth:`Request.iter_body`."""
+        return self._request.iter_body(chunk_size)
+
+    def json(self):
+        """Request body decoded as JSON, or None if it is empty."""
+        return self._request.json()
@@ -0,0 +1,143 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.requestbody
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`RequestBody <RequestBody>` sink the
+:class:`HttpParser <daemon.httpparser.HttpParser>` streams large and chunked
+request bodies into while they are received.
+
+Notes:
+------
+- A body is kept in memory until it grows past the spool threshold; from then
+  on it is written to an anonymous temporary file, so a large upload costs a
+  bounded amount of memory whatever its size.
+- A spooled body is memory-mapped when it is read: :meth:`RequestBody.view`
+  and :meth:`RequestBody.iter_chunks` hand out slices of the mapping and the
+  pages are only read from disk when they are touched.
+
+Usage Example:
+--------------
+>>> body = RequestBody(spool_threshold=1 << 20)
+>>> body.write(data)
+>>> for chunk in body.iter_chunks():
+...     digest.update(chunk)
+>>> body.close()
+
+"""
+
+import mmap
+import tempfile
+
+#: Directory of spooled bodies; None uses the platform temporary directory.
+SPOOL_DIR = None
+
+#: Size of the slices yielded by :meth:`RequestBody.iter_chunks`.
+CHUNK_SIZE = 65536
+
+
+class RequestBody:
+    """
+    A decoded request body, in memory or spooled to a temporary file.
+
+    Attributes:
+        size (int): number of body bytes written so far.
+        spool_threshold (int): size above which the body moves to disk.
+    """
+
+    __attrs__ = [
+        "size",
+        "spool_threshold",
+    ]
+
+    def __init__(self, spool_threshold):
+        """
+        Initialize an empty RequestBody.
+
+        :param spool_threshold (int): size above which the body is spooled.
+        """
+        self.size = 0
+        self.spool_threshold = spool_threshold
+        self._buf = bytearray()
+        self._file = None
+        self._map = None
+        self._view = None
+
+    @property
+    def spooled(self):
+        """Whether the body lives in a temporary file."""
+        return self._file is not None
+
+    def write(self, data):
+        """
+        Append decoded body bytes.
+
+        :param data (bytes-like): the bytes to append.
+        """
+        if self._file is None and self.size + len(data) > self.spool_threshold:
+            self._file = tempfile.TemporaryFile(dir=SPOOL_DIR)
+            self._file.write(self._buf)
+            self._buf = None
+        if self._file is not None:
+            self._file.write(data)
+        else:
+            self._buf += data
+        self.size += len(data)
+
+    def view(self):
+        """
+        The whole body, without copying it. A spooled body is flushed and
+        memory-mapped on the first call.
+
+        :rtype memoryview: read-only view of the body.
+        """
+        if self._view is None:
+            if self._file is None:
+                self._view = memoryview(self._buf).toreadonly()
+            elif self.size == 0:
+                self._view = memoryview(b"")
+            else:
+                self._file.flush()
+                self._map = mmap.mmap(self._file.fileno(), self.size, access=mmap.ACCESS_READ)
+                self._view = memoryview(self._map)
+        return self._view
+
+    def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """
+        Iterate over the body in slices of at most ``chunk_size`` bytes.
+
+        :param chunk_size (int): largest slice size.
+        :rtype iterator: memoryview slices of :meth:`view`.
+        """
+        view = self.view()
+        for offset in range(0, len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+
+    def close(self):
+        """Release the mapping and the temporary file."""
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                # A slice handed to a hook is still alive; the mapping is
+                # released together with it.
+                pass
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._buf = None
@@ -18,15 +18,311 @@ This module provides a :class: `Response <Response>` object to manage and persis
 response settings (cookies, auth, proxies), and to construct HTTP responses
 based on incoming requests. 
 
-The current version supports MIME type detection, content loading and header formatting
+The current version supports MIME type detection, content loading and header formatting.
+Static files are looked up in the process-wide asset cache (see
+:mod:`daemon.assetcache`). Large files are not loaded into memory:
+:meth:`Response.build_response` returns a :class:`FileResponse <FileResponse>`
+holding the encoded header and the open file, and the server engines send the
+body with ``sendfile``.
+
+Route hooks may also return a :class:`Response <Response>` (see
+:meth:`Response.make`); its body is serialized once and :meth:`Response.render`
+encodes it as a header and a body buffer for a single vectored write. A body
+produced by a (sync or async) generator is rendered as a
+:class:`StreamResponse <StreamResponse>` sent with chunked transfer coding.
 """
+import asyncio
 import datetime
+import json
+import logging
 import os
+import time
 import mimetypes
+import secrets
+from collections import deque
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
 from .dictionary import CaseInsensitiveDict
+from .assetcache import ASSET_CACHE, Asset
+from .byterange import parse_range
+
+logger = logging.getLogger(__name__)
 
 BASE_DIR = ""
 
+_date_cache = [0, b""]
+
+#: Encoded status lines, by status code.
+_status_lines = {}
+
+#: Encoded ``Content-Type`` lines, by media type.
+_content_type_lines = {}
+
+_KEEP_ALIVE_END = b"Connection: keep-alive\r\n\r\n"
+_CLOSE_END = b"Connection: close\r\n\r\n"
+_CHUNKED = b"Transfer-Encoding: chunked\r\n"
+_LAST_CHUNK = b"0\r\n\r\n"
+
+
+def http_date():
+    """
+    Returns the encoded ``Date`` header line, formatted once per second.
+
+    :rtype bytes: ``Date: <IMF-fixdate>`` followed by CRLF.
+    """
+    now = int(time.time())
+    if _date_cache[0] != now:
+        _date_cache[1] = "Date: {}\r\n".format(
+            time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(now))).encode('latin-1')
+        _date_cache[0] = now
+    return _date_cache[1]
+
+
+def status_line(status_code, reason=None):
+    """
+    Returns the encoded status line of ``status_code``. Lines with the
+    standard reason phrase are built once and reused.
+
+    :param status_code (int): HTTP status code.
+    :param reason (str): custom reason phrase, or None for the standard one.
+    :rtype bytes: ``HTTP/1.1 <code> <reason>`` followed by CRLF.
+    """
+    if reason is not None:
+        return "HTTP/1.1 {} {}\r\n".format(status_code, reason).encode('latin-1')
+    line = _status_lines.get(status_code)
+    if line is None:
+        try:
+            reason = HTTPStatus(status_code).phrase
+        except ValueError:
+            reason = ""
+        line = "HTTP/1.1 {} {}\r\n".format(status_code, reason).encode('latin-1')
+        _status_lines[status_code] = line
+    return line
+
+
+def _content_type_line(content_type):
+    line = _content_type_lines.get(content_type)
+    if line is None:
+        line = "Content-Type: {}\r\n".format(content_type).encode('latin-1')
+        if len(_content_type_lines) < 64:
+            _content_type_lines[content_type] = line
+    return line
+
+
+def error_response(status_code, message, headers=None):
+    """
+    Builds a complete HTML error response.
+
+    :param status_code (int): HTTP status code.
+    :param message (str): reason phrase, also shown in the page.
+    :param headers (dict): extra response headers, e.g. ``Allow``.
+    :rtype bytes: the raw HTTP response.
+    """
+    if status_code == 401:
+        response_body = """
+        <html><body>
+        <h1>401 Unauthorized</h1>
+        <p>{}</p>
+        <a href="/login.html">Login Here for Access /index.html</a>
+        <a href="/loginchat.html">Login here toGo to Chat Room</a>
+        </body></html>
+        """.format(message)
+    else:
+        response_body = """
+        <html><body>
+        <h1>{} {}</h1>
+        <p>An error occurred: {}</p>
+        </body></html>
+        """.format(status_code, message, message)
+
+    body = response_body.encode('utf-8')
+    extra = "".join("{}: {}\r\n".format(name, value) for name, value in (headers or {}).items())
+    header = (
+        "HTTP/1.1 {} {}\r\n"
+        "Content-Type: text/html\r\n"
+        "Content-Length: {}\r\n"
+        "{}"
+        "\r\n"
+    ).format(status_code, message, len(body), extra)
+
+    return header.encode('utf-8') + body
+
+
+class FileResponse:
+    """
+    A response whose body is sent straight from a file.
+
+    The body never passes through Python ``bytes``: engines send :attr:`header`
+    and then every entry of :attr:`parts` in order, a ``bytes`` entry as it is
+    and an ``(offset, count)`` entry as that slice of :attr:`file` with
+    ``socket.sendfile`` (or ``os.sendfile``/``loop.sendfile``). Engines pop
+    the parts as they are sent and update a partially sent slice in place.
+
+    Attributes:
+        header (bytes): encoded status line and headers, including the blank line.
+        file (file): file object opened in binary mode.
+        parts (collections.deque): ``bytes`` or ``(offset, count)`` body parts,
+                                   e.g. the multipart boundaries and file
+                                   slices of a multi-range response.
+    """
+
+    __attrs__ = [
+        "header",
+        "file",
+        "parts",
+    ]
+
+    def __init__(self, header, file, parts):
+        """
+        Initialize a new FileResponse instance.
+
+        :param header (bytes): encoded status line and headers.
+        :param file (file): file object opened in binary mode.
+        :param parts (iterable): ``bytes`` or ``(offset, count)`` body parts.
+        """
+        self.header = header
+        self.file = file
+        self.parts = deque(parts)
+
+    def close(self):
+        """Close the underlying file."""
+        self.file.close()
+
+
+class StreamResponse:
+    """
+    A response whose body is produced piece by piece by a route hook.
+
+    Engines send :attr:`header` and then pull the body one chunk at a time,
+    sending each before asking for the next, so a slow client holds back the
+    generator instead of letting the output pile up in memory. A generator
+    that fails half way cannot change the status any more: the engine closes
+    the connection without the terminating chunk, which tells the client the
+    body is incomplete.
+
+    Attributes:
+        header (bytes): encoded status line and headers, including the blank line.
+        body (iterator): sync or async iterator of ``bytes`` or ``str`` chunks.
+        chunked (bool): whether chunks are framed with chunked transfer coding;
+                        otherwise the body ends when the connection is closed
+                        (HTTP/1.0 clients).
+        request_body (RequestBody): streamed body of the request, which the
+                                    generator may still read; closed with
+                                    the response.
+    """
+
+    __attrs__ = [
+        "header",
+        "body",
+        "chunked",
+        "request_body",
+    ]
+
+    def __init__(self, header, body, chunked=True):
+        """
+        :param header (bytes): framed response header.
+        :param body (iterator): sync or async iterator of chunks.
+        :param chunked (bool): use chunked transfer coding.
+        """
+        self.header = header
+        self.body = body
+        self.chunked = chunked
+        self.request_body = None
+        self.is_async = hasattr(body, "__anext__")
+        #: Private loop stepping an async body outside of asyncio engines.
+        self._loop = None
+
+    @staticmethod
+    def _encode(chunk):
+        if isinstance(chunk, str):
+            return chunk.encode('utf-8')
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            return chunk
+        raise TypeError("Unsupported stream chunk {!r}".format(type(chunk).__name__))
+
+    def frame(self, chunk):
+        """
+        :param chunk (bytes-like): a non-empty body chunk, or None at the end.
+        :rtype list: buffers putting ``chunk`` on the wire.
+        """
+        if chunk is None:
+            return [_LAST_CHUNK] if self.chunked else []
+        if not self.chunked:
+            return [chunk]
+        return [b"%x\r\n" % len(chunk), chunk, b"\r\n"]
+
+    def next_chunk(self):
+        """
+        Produce the next non-empty chunk, blocking. Async bodies are stepped
+        on a private event loop.
+
+        :rtype bytes: the chunk, or None once the body is exhausted.
+        """
+        while True:
+            try:
+                if self.is_async:
+                    if self._loop is None:
+                        self._loop = asyncio.new_event_loop()
+                    chunk = self._loop.run_until_complete(self.body.__anext__())
+                else:
+                    chunk = next(self.body)
+            except (StopIteration, StopAsyncIteration):
+                return None
+            chunk = self._encode(chunk)
+            # An empty chunk would end a chunked body early.
+            if chunk:
+                return chunk
+
+    async def anext_chunk(self, executor=None):
+        """
+        Produce the next non-empty chunk from an asyncio loop. Sync bodies run
+        in ``executor`` so a blocking generator does not stall the loop.
+
+        :param executor (Executor): executor for sync bodies, None for the default.
+        :rtype bytes: the chunk, or None once the body is exhausted.
+        """
+        if not self.is_async:
+            return await asyncio.get_running_loop().run_in_executor(executor, self.next_chunk)
+        while True:
+            try:
+                chunk = self._encode(await self.body.__anext__())
+            except StopAsyncIteration:
+                return None
+            if chunk:
+                return chunk
+
+    def close(self):
+        """Finalize the body generator and the private loop, if any, then
+        release the request body."""
+        try:
+            if self.is_async:
+                if self._loop is not None:
+                    try:
+                        self._loop.run_until_complete(self.body.aclose())
+                    finally:
+                        self._loop.close()
+                        self._loop = None
+            elif hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            self._close_request_body()
+
+    async def aclose(self):
+        """Finalize the body from an asyncio loop."""
+        if self.is_async and self._loop is None:
+            try:
+                await self.body.aclose()
+            finally:
+                self._close_request_body()
+        else:
+            self.close()
+
+    def _close_request_body(self):
+        if self.request_body is not None:
+            self.request_body.close()
+            self.request_body = None
+
+
 class Response():   
     """The :class:`Response <Response>` object, which contains a
     server's response to an HTTP request.
@@ -118,6 +414,154 @@ class Response():
         #: is a response.
         self.request = None
 
+        #: Iterator of a streamed body, see :meth:`set_content`.
+        self._stream = None
+
+    def reset(self):
+        """
+        Clears the per-request state (status, headers, cookies, content) so the
+        object can build the next response on a persistent connection.
+        """
+        self._content = False
+        self._content_consumed = False
+        self._header = None
+        self.status_code = None
+        self.headers = {}
+        self.url = None
+        self.reason = None
+        self.cookies = CaseInsensitiveDict()
+        self.request = None
+        self._stream = None
+
+    @classmethod
+    def make(cls, content=b"", status_code=200, headers=None, content_type=None):
+        """
+        Builds a response to return from a route hook.
+
+        :params content (dict, list, str, bytes or iterator): body, see
+                :meth:`set_content`.
+        :params status_code (int): HTTP status code.
+        :params headers (dict): extra response headers.
+        :params content_type (str): overrides the Content-Type derived from ``content``.
+
+        :rtype Response: the new response.
+
+        Usage::
+
+          >>> resp = Response.make({"status": "success"}, status_code=201)
+          >>> resp.set_cookie("auth", "true")
+        """
+        response = cls()
+        response.status_code = status_code
+        if headers:
+            response.headers.update(headers)
+        response.set_content(content, content_type)
+        return response
+
+    def set_content(self, content, content_type=None):
+        """
+        Serializes ``content`` into the response body, once.
+
+        A dict or list is encoded as compact JSON (``application/json``), a
+        str as UTF-8 text (``text/plain``) and bytes are used as they are
+        (``application/octet-stream``). A generator, async generator or other
+        iterator of ``str``/``bytes`` chunks is streamed when the response is
+        sent (``application/octet-stream`` unless told otherwise). A
+        Content-Type header already set on the response is kept.
+
+        :params content (dict, list, str, bytes or iterator): the body.
+        :params content_type (str): overrides the Content-Type.
+        """
+        self._stream = None
+        if isinstance(content, (dict, list)):
+            body = json.dumps(content, separators=(",", ":")).encode('utf-8')
+            default_type = "application/json"
+        elif isinstance(content, str):
+            body = content.encode('utf-8')
+            default_type = "text/plain; charset=utf-8"
+        elif isinstance(content, (bytes, bytearray, memoryview)):
+            body = content
+            default_type = "application/octet-stream"
+        elif hasattr(content, "__next__") or hasattr(content, "__anext__"):
+            self._stream = content
+            body = b""
+            default_type = "application/octet-stream"
+        else:
+            raise TypeError("Unsupported response content {!r}".format(type(content).__name__))
+
+        self._content = body
+        if content_type is not None:
+            self.headers['Content-Type'] = content_type
+        else:
+            self.headers.setdefault('Content-Type', default_type)
+
+    def render(self, keep_alive=True):
+        """
+        Encodes the response set up with :meth:`set_content` for one vectored
+        write. The status and Content-Type lines come from pre-encoded
+        templates; Content-Length and Connection are always set by the server.
+
+        A streamed body is framed with ``Transfer-Encoding: chunked``, or
+        delimited by closing the connection when :attr:`request` is an
+        HTTP/1.0 request. Responses to HEAD requests carry no body.
+
+        :params keep_alive (bool): whether the connection should stay open; a
+                Connection: close header set on the response turns it off.
+
+        :rtype tuple: ([header, body] buffers or a StreamResponse, effective
+                      keep_alive).
+        """
+        status_code = self.status_code or 200
+        body = self._content or b""
+        stream = self._stream
+        request = self.request
+        header = [status_line(status_code, self.reason)]
+
+        for name, value in self.headers.items():
+            lowered = name.lower()
+            if lowered == 'content-type':
+                header.append(_content_type_line(value))
+            elif lowered == 'connection':
+                if 'close' in value.lower():
+                    keep_alive = False
+            elif lowered != 'content-length':
+                header.append("{}: {}\r\n".format(name, value).encode('latin-1'))
+
+        for cookie_value in self.cookies.values():
+            header.append("Set-Cookie: {}\r\n".format(cookie_value).encode('utf-8'))
+        header.append(http_date())
+
+        bodyless = status_code < 200 or status_code in (204, 304)
+        if stream is not None and not bodyless and not (request is not None and request.method == 'HEAD'):
+            chunked = request is None or request.version != 'HTTP/1.0'
+            if chunked:
+                header.append(_CHUNKED)
+            else:
+                keep_alive = False
+            header.append(_KEEP_ALIVE_END if keep_alive else _CLOSE_END)
+            return StreamResponse(b"".join(header), stream, chunked), keep_alive
+        if stream is not None:
+            if hasattr(stream, "close"):
+                stream.close()
+            if bodyless:
+                header.append(_KEEP_ALIVE_END if keep_alive else _CLOSE_END)
+                return [b"".join(header)], keep_alive
+            # A HEAD request to a streamed body: the length is unknown.
+            header.append(_CLOSE_END)
+            return [b"".join(header)], False
+
+        if bodyless:
+            body = b""
+        else:
+            header.append(b"Content-Length: %d\r\n" % len(body))
+            if request is not None and request.method == 'HEAD':
+                body = b""
+        header.append(_KEEP_ALIVE_END if keep_alive else _CLOSE_END)
+
+        if not body:
+            return [b"".join(header)], keep_alive
+        return [b"".join(header), body], keep_alive
+
     def set_cookie(self, name, value, path="/", domain=None, max_age=None):
         """
         Sets a cookie in the response.
@@ -172,7 +616,7 @@ class Response():
 
         base_dir = ""
         main_type, sub_type = mime_type.split('/', 1)
-        print("[Response] processing MIME main_type={} sub_type={}".format(main_type,sub_type))
+        logger.debug("processing MIME main_type=%s sub_type=%s", main_type, sub_type)
         if main_type == 'text':
             self.headers['Content-Type']='text/{}'.format(sub_type)
             if sub_type == 'plain' or sub_type == 'css':
@@ -206,12 +650,8 @@ class Response():
         :rtype tuple: (int, bytes) representing content length and content data.
         """
 
-        filepath = ""
-        if path.startswith('/static'):
-            filepath = path.lstrip('/')
-        else:
-            filepath = os.path.join(base_dir, path.lstrip('/'))
-        print("[Response] loading content from file: {}".format(filepath))
+        filepath = self.resolve_path(path, base_dir)
+        logger.debug("loading content from file: %s", filepath)
 
         try:
             with open(filepath, 'rb') as f:
@@ -219,69 +659,288 @@ class Response():
                 content_length = len(content)
                 return content, content_length
         except FileNotFoundError:
-            print("[Response] file not found: {}".format(filepath))
-            return 0, b'file not found'
+            logger.info("file not found: %s", filepath)
+            return b'file not found', 0
         except Exception as e:
-            print("[Response] error loading file {}: {}".format(filepath, e))
-            return 0, b'error loading file'
+            logger.warning("error loading file %s: %s", filepath, e)
+            return b'error loading file', 0
+
+    def resolve_path(self, path, base_dir):
+        """
+        Maps a request path to the file serving it.
+
+        :params path (str): relative path to the file.
+        :params base_dir (str): base directory where the file is located.
+
+        :rtype str: path of the file on disk.
+        """
+        if path.startswith('/static'):
+            return path.lstrip('/')
+        return os.path.join(base_dir, path.lstrip('/'))
+
+    def load_asset(self, request):
+        """
+        Resolves the file serving ``request`` and loads it into the asset cache.
+
+        :params request (class:`Request <Request>`): incoming request object.
+
+        :rtype Asset: the loaded asset, or None if the path is not servable.
+        """
+        path = request.path
+
+        mime_type = self.get_mime_type(path)
+        logger.debug("%s path %s mime_type %s", request.method, request.path, mime_type)
+
+        base_dir = ""
+
+        #If HTML, parse and serve embedded objects
+        if path.endswith('.html') or mime_type == 'text/html':
+            base_dir = self.prepare_content_type(mime_type = 'text/html')
+        elif mime_type == 'text/css':
+            base_dir = self.prepare_content_type(mime_type = 'text/css')
+        #
+        # TODO: add support objects
+        #
+        elif path.endswith('json') or mime_type == 'application/json':
+             # Phục vụ file JSON
+             base_dir = self.prepare_content_type(mime_type = 'application/json')
+        elif path.endswith('.js') or mime_type in ('application/javascript', 'text/javascript'):
+             # Phục vụ file JavaScript
+             base_dir = self.prepare_content_type(mime_type = 'application/javascript')
+        elif mime_type.startswith('image/'):
+             # Phục vụ các loại file hình ảnh (png, jpg,...)
+             base_dir = self.prepare_content_type(mime_type = mime_type)
+        else:
+            return None
 
+        filepath = self.resolve_path(path, base_dir)
+        logger.debug("loading content from file: %s", filepath)
+        return ASSET_CACHE.load(path, filepath, self.headers['Content-Type'])
 
-    def build_response_header(self, request):
+    def open_asset(self, request, asset, variant=None, ranges=None):
+        """
+        Opens a large asset, or its ``.gz`` sibling, for sending with ``sendfile``.
+
+        :params request (class:`Request <Request>`): incoming request object.
+        :params asset (Asset): metadata of the file.
+        :params variant (Variant): on-disk compressed variant to send instead.
+        :params ranges (list): byte ranges to send with 206, None for the whole file.
+
+        :rtype FileResponse or bytes: header and opened file, or an encoded
+                                      404 response if the file is gone.
+        """
+        filepath = variant.filepath if variant is not None else asset.filepath
+        try:
+            f = open(filepath, 'rb')
+        except OSError as e:
+            logger.info("cannot open file %s: %s", filepath, e)
+            ASSET_CACHE.invalidate(asset.filepath)
+            if variant is not None:
+                return self.open_asset(request, asset)
+            return self.build_notfound()
+
+        try:
+            st = os.fstat(f.fileno())
+            if variant is not None:
+                if st.st_size != variant.size:
+                    # Sibling rewritten since it was cached: send the original.
+                    f.close()
+                    ASSET_CACHE.invalidate(asset.filepath)
+                    return self.open_asset(request, asset)
+                entry = variant
+            elif not asset.matches(st):
+                # Changed since it was cached: describe the file actually opened
+                # and send all of it, the ranges were computed for the old one.
+                ASSET_CACHE.invalidate(asset.filepath)
+                entry = asset = Asset(asset.filepath, asset.mime_type, st.st_size, st.st_mtime_ns, None)
+                ranges = None
+            else:
+                entry = asset
+
+            if ranges is None:
+                self._header = self.build_response_header(request, entry)
+                parts = [(0, entry.size)]
+            else:
+                self._header, parts = self.build_partial(request, asset, entry, ranges)
+        except Exception:
+            f.close()
+            raise
+
+        return FileResponse(self._header, f, parts)
+
+    def build_response_header(self, request, entry):
         """
         Constructs the HTTP response headers based on the class:`Request <Request>
         and internal attributes.
 
+        The body describing lines come pre-encoded from the asset or variant;
+        only the ``Date`` and ``Set-Cookie`` lines are added per response.
+
         :params request (class:`Request <Request>`): incoming request object.
+        :params entry (Asset or Variant): the served body.
 
         :rtypes bytes: encoded HTTP response header.
         """
-        reqhdr = request.headers
-        rsphdr = self.headers
-
-        #Build dynamic headers
-        headers = {
-                "Accept": "{}".format(reqhdr.get("Accept", "application/json")),
-                "Accept-Language": "{}".format(reqhdr.get("Accept-Language", "en-US,en;q=0.9")),
-                "Authorization": "{}".format(reqhdr.get("Authorization", "Basic <credentials>")),
-                "Cache-Control": "no-cache",
-                "Content-Type": "{}".format(self.headers['Content-Type']),
-                "Content-Length": "{}".format(len(self._content)),
-#                "Cookie": "{}".format(reqhdr.get("Cookie", "sessionid=xyz789")), #dummy cooki
-                
-        #
-        # TODO prepare the request authentication
-        #
-	# self.auth = ...
-                "Date": "{}".format(datetime.datetime.utcnow().strftime("%a, %d %b %Y %H:%M:%S GMT")),
-                "Max-Forward": "10",
-                "Pragma": "no-cache",
-                "Proxy-Authorization": "Basic dXNlcjpwYXNz",  # example base64
-                "Warning": "199 Miscellaneous warning",
-                "User-Agent": "{}".format(reqhdr.get("User-Agent", "Chrome/123.0.0.0")),
-            }
-
-        # Header text alignment
-            #
-            #  TODO: implement the header building to create formated
-            #        header from the provied headers
-            #
-        #
-        # TODO prepare the request authentication
-        #
-	# self.auth = ...
-        header_lines = ["HTTP/1.1 200 OK"]
-        for key, value in headers.items():
-            header_lines.append("{}: {}".format(key, value))
-            
+        header = [b"HTTP/1.1 200 OK\r\n", entry.header, http_date()]
+
         # Add Set-Cookie headers
         for cookie_name, cookie_value in self.cookies.items():
-            header_lines.append("Set-Cookie: {}".format(cookie_value))
-            
-        header_lines.append("")  # Empty line to separate headers from body
-        fmt_header = "\r\n".join(header_lines) + "\r\n"
-        
-        return fmt_header.encode('utf-8')
+            header.append("Set-Cookie: {}\r\n".format(cookie_value).encode('utf-8'))
+
+        header.append(b"\r\n")  # Empty line to separate headers from body
+        return b"".join(header)
+
+
+    def is_not_modified(self, request, entry, asset):
+        """
+        Evaluates the conditional headers of a GET or HEAD request against
+        the representation about to be sent (RFC 9110, section 13.2.2):
+        ``If-None-Match`` wins over ``If-Modified-Since``.
+
+        :params request (class:`Request <Request>`): incoming request object.
+        :params entry (Asset or Variant): the selected representation.
+        :params asset (Asset): the asset it belongs to.
+
+        :rtype bool: True if a 304 Not Modified must be sent.
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return False
+        headers = request.headers
+
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            for tag in if_none_match.split(','):
+                tag = tag.strip()
+                # Weak comparison: W/"x" matches "x".
+                if tag.startswith('W/'):
+                    tag = tag[2:]
+                if tag == '*' or tag == entry.etag:
+                    return True
+            return False
+
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since is None or asset.last_modified is None:
+            return False
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        return asset.last_modified <= since
+
+    def build_not_modified(self, request, entry):
+        """
+        Constructs a bodyless 304 Not Modified response for a representation.
 
+        :params request (class:`Request <Request>`): incoming request object.
+        :params entry (Asset or Variant): the representation the client holds.
+
+        :rtype bytes: Encoded 304 response.
+        """
+        header = [b"HTTP/1.1 304 Not Modified\r\n", entry.validators, http_date()]
+        for cookie_name, cookie_value in self.cookies.items():
+            header.append("Set-Cookie: {}\r\n".format(cookie_value).encode('utf-8'))
+        header.append(b"\r\n")
+        return b"".join(header)
+
+    def requested_ranges(self, request, entry, asset):
+        """
+        Resolves the ``Range`` header of a GET request, honouring ``If-Range``.
+
+        :params request (class:`Request <Request>`): incoming request object.
+        :params entry (Asset or Variant): the selected representation.
+        :params asset (Asset): the asset it belongs to.
+
+        :rtype list: byte ranges to send, an empty list if none is satisfiable,
+                     or None to send the whole representation.
+        """
+        if request.method != 'GET':
+            return None
+        value = request.headers.get('range')
+        if value is None:
+            return None
+
+        if_range = request.headers.get('if-range')
+        if if_range is not None:
+            if_range = if_range.strip()
+            if if_range.startswith('"'):
+                # Strong comparison only.
+                if if_range != entry.etag:
+                    return None
+            elif if_range.startswith('W/'):
+                return None
+            else:
+                try:
+                    since = parsedate_to_datetime(if_range).timestamp()
+                except (TypeError, ValueError):
+                    return None
+                if asset.last_modified is None or since != asset.last_modified:
+                    return None
+
+        return parse_range(value, entry.size)
+
+    def build_partial(self, request, asset, entry, ranges):
+        """
+        Constructs the header and body parts of a 206 Partial Content response.
+        One range is sent as it is, several as ``multipart/byteranges``.
+
+        :params request (class:`Request <Request>`): incoming request object.
+        :params asset (Asset): the asset being served.
+        :params entry (Asset or Variant): the selected representation.
+        :params ranges (list): satisfiable ``(first, last)`` byte positions.
+
+        :rtype tuple: (encoded header, list of ``bytes`` and ``(offset, count)``
+                      body parts).
+        """
+        size = entry.size
+        header = [b"HTTP/1.1 206 Partial Content\r\n"]
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            parts = [(start, end - start + 1)]
+            header.append((
+                "Content-Type: {}\r\n"
+                "Content-Range: bytes {}-{}/{}\r\n"
+                "Content-Length: {}\r\n"
+            ).format(asset.mime_type, start, end, size, end - start + 1).encode('latin-1'))
+        else:
+            boundary = secrets.token_hex(16)
+            parts = []
+            for start, end in ranges:
+                parts.append((
+                    "{}--{}\r\n"
+                    "Content-Type: {}\r\n"
+                    "Content-Range: bytes {}-{}/{}\r\n"
+                    "\r\n"
+                ).format("\r\n" if parts else "", boundary, asset.mime_type,
+                         start, end, size).encode('latin-1'))
+                parts.append((start, end - start + 1))
+            parts.append("\r\n--{}--\r\n".format(boundary).encode('latin-1'))
+            length = sum(part[1] if isinstance(part, tuple) else len(part) for part in parts)
+            header.append((
+                "Content-Type: multipart/byteranges; boundary={}\r\n"
+                "Content-Length: {}\r\n"
+            ).format(boundary, length).encode('latin-1'))
+
+        header.append(entry.validators)
+        header.append(http_date())
+        for cookie_name, cookie_value in self.cookies.items():
+            header.append("Set-Cookie: {}\r\n".format(cookie_value).encode('utf-8'))
+        header.append(b"\r\n")
+        return b"".join(header), parts
+
+    def build_range_not_satisfiable(self, entry):
+        """
+        Constructs a 416 Range Not Satisfiable response.
+
+        :params entry (Asset or Variant): the selected representation.
+
+        :rtype bytes: Encoded 416 response.
+        """
+        return (
+                "HTTP/1.1 416 Range Not Satisfiable\r\n"
+                "Content-Range: bytes */{}\r\n"
+                "Content-Length: 0\r\n"
+            ).format(entry.size).encode('latin-1') + http_date() + b"\r\n"
 
     def build_notfound(self):
         """
@@ -296,7 +955,6 @@ class Response():
                 "Content-Type: text/html\r\n"
                 "Content-Length: 13\r\n"
                 "Cache-Control: max-age=86000\r\n"
-                "Connection: close\r\n"
                 "\r\n"
                 "404 Not Found"
             ).encode('utf-8')
@@ -309,43 +967,48 @@ class Response():
 
         :params request (class:`Request <Request>`): incoming request object.
 
-        :rtype bytes: complete HTTP response using prepared headers and content.
+        :rtype list, bytes or FileResponse: the header and body buffers of a
+                                            cached asset, the header and opened
+                                            file of a large one, the header
+                                            alone for HEAD, or an encoded 304,
+                                            416 or 404 response.
         """
-
-        path = request.path
-
-        mime_type = self.get_mime_type(path)
-        print("[Response] {} path {} mime_type {}".format(request.method, request.path, mime_type))
-
-        base_dir = ""
-
-        #If HTML, parse and serve embedded objects
-        if path.endswith('.html') or mime_type == 'text/html':
-            base_dir = self.prepare_content_type(mime_type = 'text/html')
-        elif mime_type == 'text/css':
-            base_dir = self.prepare_content_type(mime_type = 'text/css')
-        #
-        # TODO: add support objects
-        #
-        elif path.endswith('json') or mime_type == 'application/json':
-             # Phục vụ file JSON
-             base_dir = self.prepare_content_type(mime_type = 'application/json')
-        elif path.endswith('.js') or mime_type in ('application/javascript', 'text/javascript'):
-             # Phục vụ file JavaScript
-             base_dir = self.prepare_content_type(mime_type = 'application/javascript')
-        elif mime_type.startswith('image/'):
-             # Phục vụ các loại file hình ảnh (png, jpg,...)
-             base_dir = self.prepare_content_type(mime_type = mime_type)
+        asset = ASSET_CACHE.get(request.path)
+        if asset is None:
+            asset = self.load_asset(request)
+            if asset is None:
+                return self.build_notfound()
+
+        self.headers['Content-Type'] = asset.mime_type
+        if 'range' in request.headers:
+            # Ranges are served from the identity representation only.
+            variant = None
         else:
-            return self.build_notfound()
-
-        # --- FIX START ---
-        # build_content returns (content, length). We must unpack into (self._content, c_len)
-        self._content, c_len = self.build_content(path, base_dir)
-        # --- FIX END ---
-        
-        if c_len == 0 and self._content == b"File not found":
-            return self.build_notfound()
-        self._header = self.build_response_header(request)
-
-        return self._header + self._content
\ No newline at end of file
+            variant = ASSET_CACHE.variant(asset, request.headers.get('accept-encoding', ''))
+        entry = variant if variant is not None else asset
+
+        if self.is_not_modified(request, entry, asset):
+            return self.build_not_modified(request, entry)
+
+        ranges = self.requested_ranges(request, entry, asset)
+        if ranges is not None and not ranges:
+            return self.build_range_not_satisfiable(entry)
+
+        if request.method == 'HEAD':
+            # Same header as GET, without the body and without opening the file.
+            self._header = self.build_response_header(request, entry)
+            return self._header
+
+        if entry.content is None:
+            return self.open_asset(request, asset, variant, ranges)
+
+        # Header and cached body go out as separate buffers, without a copy.
+        self._content = entry.content
+        if ranges is None:
+            self._header = self.build_response_header(request, entry)
+            return [self._header, self._content]
+
+        self._header, parts = self.build_partial(request, asset, entry, ranges)
+        content = memoryview(self._content)
+        return [self._header] + [content[part[0]:part[0] + part[1]] if isinstance(part, tuple)
+                                 else part for part in parts]
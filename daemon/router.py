@@ -0,0 +1,345 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.router
+~~~~~~~~~~~~~~~~~
+
+This module provides the compiled route table of a
+:class:`WeApRous <WeApRous>` app: a trie over path segments with typed path
+parameters, catch-all segments and method-not-allowed detection.
+
+Route patterns:
+---------------
+- ``/channels/list`` static segments.
+- ``/channels/<name>/peers`` a parameter matching one segment (``str``).
+- ``/peers/<int:port>`` a typed parameter; ``int``, ``float`` and ``str``
+  are available. The converted value is passed to the handler.
+- ``/files/<path:rest>`` or ``/files/*`` a catch-all matching the rest of
+  the path (possibly empty), only allowed as the last segment.
+
+Notes:
+------
+- A lookup walks one node per path segment, so its cost depends on the
+  path depth, not on the number of routes.
+- Static segments take precedence over typed parameters, which take
+  precedence over ``str`` parameters and then catch-alls; a failed branch
+  falls back to the next candidate.
+- :meth:`Router.compile` freezes the trie; it is called once by
+  :meth:`WeApRous.run <WeApRous.run>`.
+- A path routed for ``GET`` also answers ``HEAD`` with the same handler
+  unless ``HEAD`` is routed itself; the engines drop the body of any
+  response to HEAD, whatever the handler returned (see
+  :func:`frame_response <daemon.httpadapter.frame_response>`).
+
+Usage Example:
+--------------
+>>> router = Router()
+>>> router.add("GET", "/channels/<name>/peers", list_peers)
+>>> router.compile()
+>>> router.match("GET", "/channels/general/peers")
+(<function list_peers>, {'name': 'general'}, None)
+>>> router.match("DELETE", "/channels/general/peers")
+(None, None, ['GET', 'HEAD'])
+
+"""
+
+import math
+
+
+def _to_int(segment):
+    if not (segment.isascii() and segment.isdigit()):
+        raise ValueError(segment)
+    return int(segment)
+
+
+def _to_float(segment):
+    value = float(segment)
+    # float() also accepts "nan", "inf" and "infinity".
+    if not math.isfinite(value):
+        raise ValueError(segment)
+    return value
+
+
+#: Parameter converters: name -> (callable, priority; lower is tried first).
+#: A converter raises ValueError for segments it does not accept.
+CONVERTERS = {
+    "int": (_to_int, 0),
+    "float": (_to_float, 1),
+    "str": (str, 2),
+}
+
+
+class RouteError(ValueError):
+    """Raised for an invalid route pattern or a conflicting registration."""
+
+
+class _Node:
+    """One trie node; ``handlers`` maps methods to handlers of the path ending here."""
+
+    __slots__ = ("static", "params", "catchall", "handlers")
+
+    def __init__(self):
+        #: Segment text -> child node.
+        self.static = {}
+        #: ``(priority, converter name, converter, parameter name, child)`` tuples.
+        self.params = []
+        #: ``(parameter name or None, handlers)`` of a catch-all, or None.
+        self.catchall = None
+        self.handlers = {}
+
+
+def _split(path):
+    """Split a path into its segments, ignoring the leading slash."""
+    return path[1:].split("/") if path.startswith("/") else path.split("/")
+
+
+class Router:
+    """
+    Method and path dispatch table for route hooks.
+
+    Attributes:
+        routes (list): registered ``(method, pattern, handler)`` triples.
+        compiled (bool): whether :meth:`compile` was called.
+        pipeline (Pipeline): middleware of requests no route matches, set by
+                  :meth:`WeApRous.run <WeApRous.run>`; None if not set.
+    """
+
+    __attrs__ = [
+        "routes",
+        "compiled",
+        "pipeline",
+    ]
+
+    def __init__(self, routes=None):
+        """
+        Initialize a new Router instance.
+
+        :param routes (dict): optional ``{(METHOD, pattern): handler}`` mapping,
+                       as collected by :meth:`WeApRous.route <WeApRous.route>`.
+        """
+        self.routes = []
+        self.compiled = False
+        self.pipeline = None
+        self._root = _Node()
+        #: Static routes without parameters, looked up directly.
+        self._exact = {}
+        if routes:
+            for (method, pattern), handler in routes.items():
+                self.add(method, pattern, handler)
+
+    def __len__(self):
+        return len(self.routes)
+
+    def __repr__(self):
+        return "<Router {} routes>".format(len(self.routes))
+
+    def add(self, method, pattern, handler):
+        """
+        Register ``handler`` for ``method`` requests matching ``pattern``.
+
+        :param method (str): HTTP method.
+        :param pattern (str): route pattern, see the module documentation.
+        :param handler (callable): the route hook.
+        :raise RouteError: malformed pattern, or the route is already taken.
+        """
+        if self.compiled:
+            raise RouteError("routes cannot be added after compile()")
+        method = method.upper()
+
+        node = self._root
+        segments = _split(pattern)
+        for index, segment in enumerate(segments):
+            if segment == "*" or segment.startswith("<path:"):
+                if index != len(segments) - 1:
+                    raise RouteError("catch-all must be the last segment of {!r}".format(pattern))
+                name = None if segment == "*" else self._param(segment, pattern)[1]
+                if node.catchall is None:
+                    node.catchall = (name, {})
+                elif node.catchall[0] != name:
+                    raise RouteError("conflicting catch-all names in {!r}".format(pattern))
+                self._register(node.catchall[1], method, pattern, handler)
+                self.routes.append((method, pattern, handler))
+                return
+
+            if segment.startswith("<"):
+                converter, name = self._param(segment, pattern)
+                func, priority = CONVERTERS[converter]
+                for entry in node.params:
+                    if entry[1] == converter:
+                        if entry[3] != name:
+                            raise RouteError("conflicting parameter names in {!r}".format(pattern))
+                        node = entry[4]
+                        break
+                else:
+                    child = _Node()
+                    node.params.append((priority, converter, func, name, child))
+                    node.params.sort(key=lambda entry: entry[0])
+                    node = child
+            else:
+                node = node.static.setdefault(segment, _Node())
+
+        self._register(node.handlers, method, pattern, handler)
+        self.routes.append((method, pattern, handler))
+
+    @staticmethod
+    def _param(segment, pattern):
+        """:rtype tuple: (converter name, parameter name) of ``<conv:name>``."""
+        if not segment.endswith(">"):
+            raise RouteError("unterminated parameter in {!r}".format(pattern))
+        converter, _, name = segment[1:-1].rpartition(":")
+        converter = converter or "str"
+        if not name.isidentifier():
+            raise RouteError("invalid parameter name {!r} in {!r}".format(name, pattern))
+        if converter != "path" and converter not in CONVERTERS:
+            raise RouteError("unknown converter {!r} in {!r}".format(converter, pattern))
+        return converter, name
+
+    @staticmethod
+    def _register(handlers, method, pattern, handler):
+        if handlers.get(method, handler) is not handler:
+            raise RouteError("{} {} is already routed".format(method, pattern))
+        handlers[method] = handler
+
+    def compile(self):
+        """
+        Freeze the trie. Static-only paths are also indexed in one flat table
+        so the common case costs a single dictionary lookup, and ``GET``
+        handlers are registered for ``HEAD`` where it is not routed.
+
+        :rtype Router: self.
+        """
+        exact = {}
+
+        def add_head(handlers):
+            if "GET" in handlers:
+                handlers.setdefault("HEAD", handlers["GET"])
+
+        def walk(node, prefix):
+            add_head(node.handlers)
+            if node.catchall is not None:
+                add_head(node.catchall[1])
+            if node.handlers and prefix is not None:
+                exact["/" + "/".join(prefix)] = node.handlers
+            for segment, child in node.static.items():
+                walk(child, None if prefix is None else prefix + [segment])
+            for entry in node.params:
+                walk(entry[4], None)
+
+        walk(self._root, [])
+        self._exact = exact
+        self.compiled = True
+        return self
+
+    def match(self, method, path):
+        """
+        Resolve a request.
+
+        :param method (str): HTTP method.
+        :param path (str): request path, without the query string.
+        :rtype tuple: ``(handler, params, allowed)``. On a match ``handler`` is
+                      set and ``params`` holds the converted path parameters.
+                      If the path is routed for other methods only, ``handler``
+                      is None and ``allowed`` lists them. Otherwise all three
+                      are None.
+        """
+        handlers = self._exact.get(path)
+        if handlers is not None:
+            handler = handlers.get(method)
+            if handler is not None:
+                return handler, {}, None
+
+        segments = _split(path)
+        handler, params = self._descend(segments, method)
+        if handler is not None:
+            return handler, params, None
+
+        params = {}
+        allowed = set()
+        handler = self._walk(self._root, segments, 0, method, params, allowed)
+        if handler is not None:
+            return handler, params, None
+        if allowed:
+            return None, None, sorted(allowed)
+        return None, None, None
+
+    def _descend(self, segments, method):
+        """
+        Greedy single pass down the trie taking the preferred branch at every
+        segment. It resolves most requests without recursion; when it fails,
+        :meth:`_walk` backtracks through the alternatives.
+
+        :rtype tuple: (handler, params), handler is None if the pass failed.
+        """
+        node = self._root
+        params = {}
+        for segment in segments:
+            child = node.static.get(segment)
+            if child is None:
+                if not segment:
+                    return None, None
+                for _, converter, func, name, param_child in node.params:
+                    try:
+                        params[name] = func(segment)
+                    except ValueError:
+                        continue
+                    child = param_child
+                    break
+                else:
+                    return None, None
+            node = child
+        return node.handlers.get(method), params
+
+    def _walk(self, node, segments, index, method, params, allowed):
+        """
+        Depth-first match of ``segments[index:]`` below ``node``. Paths that
+        match for other methods only are collected into ``allowed``.
+        """
+        if index == len(segments):
+            handler = self._handler(node.handlers, method, allowed)
+            if handler is None and node.catchall is not None:
+                handler = self._handler(node.catchall[1], method, allowed)
+                if handler is not None and node.catchall[0] is not None:
+                    params[node.catchall[0]] = ""
+            return handler
+
+        segment = segments[index]
+        child = node.static.get(segment)
+        if child is not None:
+            handler = self._walk(child, segments, index + 1, method, params, allowed)
+            if handler is not None:
+                return handler
+
+        if segment:
+            for _, converter, func, name, child in node.params:
+                try:
+                    value = func(segment)
+                except ValueError:
+                    continue
+                handler = self._walk(child, segments, index + 1, method, params, allowed)
+                if handler is not None:
+                    params[name] = value
+                    return handler
+
+        if node.catchall is not None:
+            handler = self._handler(node.catchall[1], method, allowed)
+            if handler is not None and node.catchall[0] is not None:
+                params[node.catchall[0]] = "/".join(segments[index:])
+            return handler
+        return None
+
+    @staticmethod
+    def _handler(handlers, method, allowed):
+        handler = handlers.get(method)
+        if handler is None and handlers:
+            allowed.update(handlers)
+        return handler
@@ -0,0 +1,351 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.timeouts
+~~~~~~~~~~~~~~~~~
+
+This module provides the :class:`TimerWheel <TimerWheel>` enforcing the
+read, idle and write deadlines of connections, and the :class:`Deadline
+<Deadline>` of one connection. Sockets stay in blocking (or non-blocking)
+mode without ``settimeout``: a thread blocked on a connection whose deadline
+passes is released by shutting the socket down.
+
+Phases:
+-------
+- ``idle``: waiting for the first byte of a request, :data:`IDLE_TIMEOUT`.
+- ``header``: receiving the request line and headers; the deadline is not
+  extended by progress, so a client trickling a header (slowloris) is cut
+  off after :data:`HEADER_TIMEOUT`.
+- ``body``: receiving the body; each read extends the deadline by
+  :data:`BODY_TIMEOUT`.
+- ``write``: sending the response; progress extends it by :data:`WRITE_TIMEOUT`.
+- ``upstream``: the proxy waiting on a backend, :data:`UPSTREAM_TIMEOUT`.
+
+Notes:
+------
+- Timers are filed in slots of ``resolution`` seconds. Extending a deadline
+  only moves a number; a timer found in its slot before its deadline is
+  filed again, so frequently touched timers cost nothing in between.
+- :data:`WHEEL` is advanced by a daemon thread; engines with their own loop
+  (:mod:`daemon.eventloop`, :mod:`daemon.asyncserver`) advance a private
+  wheel from it so callbacks run on the loop.
+- Expired deadlines are counted in :data:`daemon.metrics.REGISTRY` as
+  ``server_timeouts_total`` by server and phase.
+
+Usage Example:
+--------------
+>>> deadline = Deadline(WHEEL, "backend", conn)
+>>> deadline.reading(parser)
+>>> parser.recv_from(conn)   # returns 0 once the deadline has shut conn down
+>>> deadline.cancel()
+
+"""
+
+import time
+import socket
+import threading
+
+from .metrics import REGISTRY
+
+#: Seconds a connection may wait for the first byte of a request.
+IDLE_TIMEOUT = 15
+
+#: Seconds a client has to send a complete request header section.
+HEADER_TIMEOUT = 10
+
+#: Seconds without progress allowed while a request body is received.
+BODY_TIMEOUT = 30
+
+#: Seconds without progress allowed while a response is sent.
+WRITE_TIMEOUT = 30
+
+#: Seconds without progress allowed while waiting on an upstream.
+UPSTREAM_TIMEOUT = 30
+
+#: Slot width of the timer wheels, in seconds.
+RESOLUTION = 0.5
+
+TIMED_OUT = REGISTRY.counter(
+    "server_timeouts_total", "Connections closed by an expired deadline.", ("server", "phase"))
+
+
+def set_timeouts(idle=None, header=None, body=None, write=None, upstream=None):
+    """
+    Change the deadlines of the phases armed afterwards.
+
+    :param idle (float): seconds before the first byte of a request.
+    :param header (float): seconds for the whole header section.
+    :param body (float): seconds without progress while reading a body.
+    :param write (float): seconds without progress while sending.
+    :param upstream (float): seconds without progress from an upstream.
+    None keeps the current value.
+    """
+    global IDLE_TIMEOUT, HEADER_TIMEOUT, BODY_TIMEOUT, WRITE_TIMEOUT, UPSTREAM_TIMEOUT
+    if idle is not None:
+        IDLE_TIMEOUT = idle
+    if header is not None:
+        HEADER_TIMEOUT = header
+    if body is not None:
+        BODY_TIMEOUT = body
+    if write is not None:
+        WRITE_TIMEOUT = write
+    if upstream is not None:
+        UPSTREAM_TIMEOUT = upstream
+
+
+def phase_timeout(phase):
+    """
+    :param phase (str): ``idle``, ``header``, ``body``, ``write`` or ``upstream``.
+    :rtype float: the current deadline of ``phase`` in seconds.
+    """
+    return {
+        "idle": IDLE_TIMEOUT,
+        "header": HEADER_TIMEOUT,
+        "body": BODY_TIMEOUT,
+        "write": WRITE_TIMEOUT,
+        "upstream": UPSTREAM_TIMEOUT,
+    }[phase]
+
+
+class Timer:
+    """
+    One scheduled callback of a :class:`TimerWheel <TimerWheel>`.
+
+    Attributes:
+        deadline (float): monotonic time the callback is due.
+        callback (callable): called without arguments once due.
+    """
+
+    __slots__ = ("deadline", "callback", "wheel", "tick", "active")
+
+    def __init__(self, wheel, deadline, callback):
+        self.wheel = wheel
+        self.deadline = deadline
+        self.callback = callback
+        #: Tick of the slot the timer is filed in.
+        self.tick = None
+        self.active = True
+
+    def __repr__(self):
+        return "<Timer due in {:.1f}s>".format(self.deadline - time.monotonic())
+
+    def reset(self, delay):
+        """
+        Make the timer due ``delay`` seconds from now. A later deadline is
+        only recorded; an earlier one files the timer again.
+        """
+        deadline = time.monotonic() + delay
+        self.deadline = deadline
+        self.active = True
+        if self.tick is None or self.wheel.tick_of(deadline) < self.tick:
+            self.wheel.file(self)
+
+    def cancel(self):
+        """Stop the timer; it may be :meth:`reset` later."""
+        self.active = False
+        self.wheel.unfile(self)
+
+
+class TimerWheel:
+    """
+    Hashed timer wheel: ``slots`` buckets of ``resolution`` seconds, used
+    round-robin as time advances.
+
+    Attributes:
+        resolution (float): slot width in seconds.
+        slots (int): number of slots.
+    """
+
+    __attrs__ = [
+        "resolution",
+        "slots",
+    ]
+
+    def __init__(self, resolution=RESOLUTION, slots=512):
+        """
+        :param resolution (float): slot width in seconds.
+        :param slots (int): number of slots; longer deadlines wrap around.
+        """
+        self.resolution = resolution
+        self.slots = slots
+        self._wheel = [set() for _ in range(slots)]
+        self._tick = self.tick_of(time.monotonic())
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def __repr__(self):
+        return "<TimerWheel {} timers>".format(sum(len(slot) for slot in self._wheel))
+
+    def tick_of(self, when):
+        """:rtype int: the tick a deadline at ``when`` falls in."""
+        return int(when / self.resolution)
+
+    def schedule(self, delay, callback):
+        """
+        Call ``callback`` in ``delay`` seconds.
+
+        :rtype Timer: handle to reset or cancel it.
+        """
+        timer = Timer(self, time.monotonic() + delay, callback)
+        self.file(timer)
+        return timer
+
+    def file(self, timer):
+        """Put ``timer`` in the slot of its deadline."""
+        with self._lock:
+            if timer.tick is not None:
+                self._wheel[timer.tick % self.slots].discard(timer)
+            # Never file into a slot already swept.
+            timer.tick = max(self.tick_of(timer.deadline), self._tick + 1)
+            self._wheel[timer.tick % self.slots].add(timer)
+
+    def unfile(self, timer):
+        """Take ``timer`` out of its slot."""
+        with self._lock:
+            if timer.tick is not None:
+                self._wheel[timer.tick % self.slots].discard(timer)
+                timer.tick = None
+
+    def advance(self, now=None):
+        """
+        Sweep the slots up to ``now`` and call the callbacks of the timers
+        due; timers whose deadline was extended are filed again.
+        """
+        now = time.monotonic() if now is None else now
+        target = self.tick_of(now)
+        due = []
+        with self._lock:
+            # After a long stall one revolution visits every slot once.
+            first = max(self._tick + 1, target - self.slots + 1)
+            for tick in range(first, target + 1):
+                slot = self._wheel[tick % self.slots]
+                if not slot:
+                    continue
+                for timer in list(slot):
+                    if timer.deadline <= now:
+                        slot.discard(timer)
+                        timer.tick = None
+                        if timer.active:
+                            due.append(timer)
+                    else:
+                        # Extended, a later revolution, or due later in this tick.
+                        slot.discard(timer)
+                        timer.tick = max(self.tick_of(timer.deadline), target + 1)
+                        self._wheel[timer.tick % self.slots].add(timer)
+            self._tick = max(self._tick, target)
+        for timer in due:
+            timer.active = False
+            timer.callback()
+
+    def start(self):
+        """Advance the wheel from a daemon thread; idempotent."""
+        with self._lock:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._run, name="timer-wheel", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.resolution)
+            self.advance()
+
+
+#: Wheel shared by the thread-per-connection backend and the proxy.
+WHEEL = TimerWheel()
+
+
+class Deadline:
+    """
+    Deadline of one connection, moved from phase to phase.
+
+    Attributes:
+        server (str): server label of the metrics, e.g. ``backend``.
+        phase (str): the phase armed, None when disarmed.
+        expired (bool): whether the deadline has passed.
+    """
+
+    __slots__ = ("wheel", "server", "sock", "on_expire", "phase", "timer", "expired")
+
+    def __init__(self, wheel, server, sock=None, on_expire=None):
+        """
+        :param wheel (TimerWheel): the wheel; :data:`WHEEL` is started on
+                     first use.
+        :param server (str): server label of the metrics.
+        :param sock (socket.socket): socket shut down on expiry.
+        :param on_expire (callable): called instead of shutting ``sock`` down.
+        """
+        if wheel is WHEEL:
+            WHEEL.start()
+        self.wheel = wheel
+        self.server = server
+        self.sock = sock
+        self.on_expire = on_expire
+        self.phase = None
+        self.timer = None
+        self.expired = False
+
+    def __repr__(self):
+        return "<Deadline {} phase={}>".format(self.server, self.phase)
+
+    def arm(self, phase):
+        """Start the deadline of ``phase``, unless it is the current phase."""
+        if phase == self.phase:
+            return
+        self.phase = phase
+        if self.timer is None:
+            self.timer = self.wheel.schedule(phase_timeout(phase), self._expire)
+        else:
+            self.timer.reset(phase_timeout(phase))
+
+    def touch(self):
+        """Extend the current phase after progress; not for ``header``."""
+        if self.timer is not None and self.phase not in (None, "header"):
+            self.timer.reset(phase_timeout(self.phase))
+
+    def reading(self, parser):
+        """
+        Arm the phase matching a request read into ``parser``: ``idle`` before
+        its first byte, ``header`` until the header section is complete, then
+        ``body`` extended on every call.
+        """
+        if parser.head_end >= 0:
+            if self.phase == "body":
+                self.touch()
+            else:
+                self.arm("body")
+        elif parser.buffered:
+            self.arm("header")
+        else:
+            self.arm("idle")
+
+    def cancel(self):
+        """Disarm the deadline, e.g. while a request is being handled."""
+        self.phase = None
+        if self.timer is not None:
+            self.timer.cancel()
+
+    def _expire(self):
+        if self.phase is None:
+            return
+        self.expired = True
+        TIMED_OUT.labels(self.server, self.phase).inc()
+        if self.on_expire is not None:
+            self.on_expire()
+            return
+        try:
+            # Wakes the thread blocked on the socket: recv returns 0, send fails.
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
@@ -0,0 +1,588 @@
+#
+# Copyright (C) 2025 pdnguyen of HCMC University of Technology VNU-HCM.
+# All rights reserved.
+# This file is part of the CO3093/CO3094 course.
+#
+# WeApRous release
+#
+# The authors hereby grant to Licensee personal permission to use
+# and modify the Licensed Source Code for the sole purpose of studying
+# while attending the course
+#
+
+"""
+daemon.upstream
+~~~~~~~~~~~~~~~~~
+
+This module provides the persistent connections of the proxy to its
+backends: one :class:`UpstreamPool <UpstreamPool>` per upstream address,
+kept in :data:`POOLS`, and :func:`read_response` that reads one response
+framed by its Content-Length or chunked coding, so the connection can carry
+the next request.
+
+Notes:
+------
+- A pool holds at most ``max_total`` connections, in use or idle, and keeps
+  at most ``max_idle`` of them idle. A checkout finding every connection in
+  use waits in a FIFO queue for one to be checked in.
+- Idle connections are validated on checkout: one idle for longer than
+  ``idle_timeout`` (kept below the backends' keep-alive timeout) or that the
+  backend has closed or written to is discarded.
+- A response without framing is read until the backend closes the
+  connection, which is then not reused.
+- Opening a connection fails after ``connect_timeout`` instead of waiting
+  on an unreachable backend for the system's TCP timeout.
+- The pool serves the threads of the proxy: a checkout finding the pool
+  full blocks its thread in :meth:`UpstreamPool.checkout`.
+- Connections opened and reused and the pool sizes are recorded in
+  :data:`daemon.metrics.REGISTRY` by upstream.
+
+Usage Example:
+--------------
+>>> pool = POOLS.get("127.0.0.1", 9000)
+>>> upstream = pool.checkout()
+>>> upstream.connect()
+>>> upstream.sock.sendall(request)
+>>> response, head_end, reusable = read_response(upstream.sock, "GET")
+>>> upstream.release(reusable)
+
+"""
+
+import time
+import socket
+import threading
+from collections import deque
+
+from .metrics import REGISTRY
+
+#: Connections per upstream, in use or idle.
+MAX_TOTAL = 64
+
+#: Idle connections kept per upstream.
+MAX_IDLE = 16
+
+#: Seconds an idle connection may be reused; below the backend keep-alive.
+IDLE_TIMEOUT = 10.0
+
+#: Seconds a checkout waits for a connection of a full pool.
+CHECKOUT_TIMEOUT = 5.0
+
+#: Seconds a new connection may take to be established.
+CONNECT_TIMEOUT = 3.0
+
+#: Largest accepted status line plus header section of a response.
+MAX_HEADER_SIZE = 65536
+
+#: Bytes requested from the socket per read.
+READ_SIZE = 65536
+
+#: Status codes whose responses never carry a body.
+_BODYLESS_STATUS = (b"1", b"204", b"304")
+
+OPENED = REGISTRY.counter(
+    "proxy_upstream_connections_opened_total", "Connections opened to upstreams.", ("upstream",))
+REUSED = REGISTRY.counter(
+    "proxy_upstream_connections_reused_total", "Requests sent on a pooled connection.", ("upstream",))
+DISCARDED = REGISTRY.counter(
+    "proxy_upstream_connections_discarded_total",
+    "Pooled connections closed on checkout, by reason.", ("upstream", "reason"))
+POOL_IDLE = REGISTRY.gauge(
+    "proxy_upstream_pool_idle", "Idle pooled connections.", ("upstream",))
+POOL_ACTIVE = REGISTRY.gauge(
+    "proxy_upstream_pool_active", "Connections checked out.", ("upstream",))
+
+
+class PoolTimeout(OSError):
+    """Raised when a full pool has no connection for a checkout in time."""
+
+
+class UpstreamError(OSError):
+    """Raised when an upstream response is malformed or cut short."""
+
+
+class UpstreamClosed(UpstreamError):
+    """Raised when the upstream closed the connection without responding,
+    as a backend does with a keep-alive connection it timed out."""
+
+
+class UpstreamConnection:
+    """
+    One connection of an :class:`UpstreamPool <UpstreamPool>`.
+
+    Attributes:
+        pool (UpstreamPool): the pool it belongs to.
+        sock (socket.socket): the socket, None until :meth:`connect`.
+        reused (bool): whether it already carried a request.
+        last_used (float): monotonic time it was last checked in.
+    """
+
+    __slots__ = ("pool", "sock", "reused", "last_used")
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.sock = None
+        self.reused = False
+        self.last_used = time.monotonic()
+
+    def __repr__(self):
+        return "<UpstreamConnection {} {}>".format(
+            self.pool.upstream, "reused" if self.reused else "new")
+
+    def connect(self):
+        """Open the socket unless the connection is a pooled one."""
+        if self.sock is None:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            try:
+                sock.settimeout(self.pool.connect_timeout)
+                sock.connect(self.pool.address)
+                sock.settimeout(None)
+            except OSError:
+                sock.close()
+                raise
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.sock = sock
+            self.pool.opened.inc()
+
+    def release(self, reusable):
+        """
+        Give the connection back to its pool.
+
+        :param reusable (bool): whether the last exchange left it usable; it
+                         is closed otherwise.
+        """
+        self.pool.checkin(self, reusable)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def _is_healthy(sock):
+    """
+    Whether an idle pooled socket can carry a request: the backend has neither
+    closed it nor sent anything unsolicited.
+    """
+    try:
+        sock.recv(1, socket.MSG_PEEK | socket.MSG_DONTWAIT)
+    except (BlockingIOError, InterruptedError):
+        return True
+    except OSError:
+        return False
+    # b"" is end of stream; data is an unsolicited response.
+    return False
+
+
+class UpstreamPool:
+    """
+    Persistent connections to one upstream.
+
+    Checkouts that find the pool full wait with a ``grant`` callback, called
+    with the :class:`UpstreamConnection <UpstreamConnection>` handed over to
+    them by the thread checking one in.
+
+    Attributes:
+        address (tuple): (host, port) of the upstream.
+        max_total (int): connections allowed, in use or idle.
+        max_idle (int): idle connections kept.
+        idle_timeout (float): seconds an idle connection stays reusable.
+        checkout_timeout (float): seconds a checkout waits on a full pool.
+        connect_timeout (float): seconds a new connection may take.
+    """
+
+    __attrs__ = [
+        "address",
+        "max_total",
+        "max_idle",
+        "idle_timeout",
+        "checkout_timeout",
+        "connect_timeout",
+    ]
+
+    def __init__(self, host, port, max_total=MAX_TOTAL, max_idle=MAX_IDLE,
+                 idle_timeout=IDLE_TIMEOUT, checkout_timeout=CHECKOUT_TIMEOUT,
+                 connect_timeout=CONNECT_TIMEOUT):
+        """
+        :param host (str): IP address of the upstream.
+        :param port (int): port of the upstream.
+        :param max_total (int): connections allowed, in use or idle.
+        :param max_idle (int): idle connections kept.
+        :param idle_timeout (float): seconds an idle connection stays reusable.
+        :param checkout_timeout (float): seconds a checkout waits on a full pool.
+        :param connect_timeout (float): seconds a new connection may take.
+        """
+        self.address = (host, port)
+        self.upstream = "{}:{}".format(host, port)
+        self.max_total = max_total
+        self.max_idle = max_idle
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.connect_timeout = connect_timeout
+
+        #: Idle connections, most recently used last.
+        self._idle = deque()
+        #: grant callbacks of the waiting checkouts.
+        self._waiting = deque()
+        self._total = 0
+        self._lock = threading.Lock()
+
+        self.opened = OPENED.labels(self.upstream)
+        self._reused = REUSED.labels(self.upstream)
+        self._idle_gauge = POOL_IDLE.labels(self.upstream)
+        self._active_gauge = POOL_ACTIVE.labels(self.upstream)
+
+    def __repr__(self):
+        return "<UpstreamPool {} total={} idle={}>".format(
+            self.upstream, self._total, len(self._idle))
+
+    def _update_gauges(self):
+        self._idle_gauge.set(len(self._idle))
+        self._active_gauge.set(self._total - len(self._idle))
+
+    def acquire(self, grant=None):
+        """
+        Take a connection, or queue for one.
+
+        :param grant (callable): called with the connection handed over to the
+                     queued checkout; without it the checkout is not queued.
+        :rtype: UpstreamConnection, None if the checkout is queued.
+        :raise PoolTimeout: if the pool is full and ``grant`` is None.
+        """
+        while True:
+            with self._lock:
+                if self._idle:
+                    # Most recently used first: the least likely to be stale.
+                    connection = self._idle.pop()
+                    self._update_gauges()
+                elif self._total < self.max_total:
+                    self._total += 1
+                    self._update_gauges()
+                    return UpstreamConnection(self)
+                elif grant is not None:
+                    self._waiting.append(grant)
+                    return None
+                else:
+                    raise PoolTimeout("upstream pool {} is full".format(self.upstream))
+
+            reason = self._validate(connection)
+            if reason is None:
+                connection.reused = True
+                self._reused.inc()
+                return connection
+            DISCARDED.labels(self.upstream, reason).inc()
+            self._discard(connection)
+
+    def _validate(self, connection):
+        """:rtype str: why an idle connection cannot be reused, None if it can."""
+        if time.monotonic() - connection.last_used > self.idle_timeout:
+            return "expired"
+        if not _is_healthy(connection.sock):
+            return "closed"
+        return None
+
+    def checkout(self, timeout=None):
+        """
+        Take a connection, waiting on the calling thread if the pool is full.
+
+        :param timeout (float): seconds to wait, ``checkout_timeout`` if None.
+        :rtype UpstreamConnection: a pooled connection, or a new one to
+                                   :meth:`connect <UpstreamConnection.connect>`.
+        :raise PoolTimeout: if no connection was freed in time.
+        """
+        granted = []
+        event = threading.Event()
+
+        def grant(connection):
+            granted.append(connection)
+            event.set()
+
+        connection = self.acquire(grant)
+        if connection is not None:
+            return connection
+        timeout = self.checkout_timeout if timeout is None else timeout
+        if not event.wait(timeout) and self.cancel(grant):
+            raise PoolTimeout("no connection to {} within {}s".format(self.upstream, timeout))
+        return granted[0]
+
+    def cancel(self, grant):
+        """
+        Withdraw a queued checkout.
+
+        :rtype bool: True if it was withdrawn, False if a connection was
+                     granted to it already.
+        """
+        with self._lock:
+            try:
+                self._waiting.remove(grant)
+            except ValueError:
+                return False
+        return True
+
+    def checkin(self, connection, reusable):
+        """
+        Take back a checked out connection, handing it (or its slot) over to
+        the oldest waiting checkout if any.
+
+        :param connection (UpstreamConnection): the connection.
+        :param reusable (bool): whether it can carry another request.
+        """
+        if not reusable:
+            connection.close()
+        with self._lock:
+            if self._waiting:
+                grant = self._waiting.popleft()
+                if connection.sock is None:
+                    # The slot is handed over as a fresh connection.
+                    connection = UpstreamConnection(self)
+            else:
+                grant = None
+                if connection.sock is not None and len(self._idle) < self.max_idle:
+                    connection.last_used = time.monotonic()
+                    self._idle.append(connection)
+                    connection = None
+                else:
+                    self._total -= 1
+                self._update_gauges()
+        if grant is not None:
+            grant(connection)
+        elif connection is not None:
+            connection.close()
+
+    def _discard(self, connection):
+        """Close a connection taken from the idle list and free its slot."""
+        self.checkin(connection, False)
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, deque()
+            self._total -= len(idle)
+            self._update_gauges()
+        for connection in idle:
+            connection.close()
+
+    def stats(self):
+        """
+        :rtype dict: total, idle and waiting.
+        """
+        with self._lock:
+            return {
+                "total": self._total,
+                "idle": len(self._idle),
+                "waiting": len(self._waiting),
+            }
+
+
+class PoolManager:
+    """
+    The :class:`UpstreamPool <UpstreamPool>` of every upstream, created on
+    first use with the limits given here.
+    """
+
+    def __init__(self, **limits):
+        """
+        :param limits: keyword arguments of :class:`UpstreamPool <UpstreamPool>`.
+        """
+        self.limits = limits
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<PoolManager {} upstreams>".format(len(self._pools))
+
+    def configure(self, **limits):
+        """Change the limits of the pools created afterwards."""
+        self.limits.update(limits)
+
+    def get(self, host, port):
+        """
+        :rtype UpstreamPool: the pool of ``host``:``port``.
+        """
+        key = (host, port)
+        pool = self._pools.get(key)
+        if pool is None:
+            with self._lock:
+                pool = self._pools.get(key)
+                if pool is None:
+                    pool = self._pools[key] = UpstreamPool(host, port, **self.limits)
+        return pool
+
+    def close(self):
+        """Close the idle connections of every pool."""
+        for pool in list(self._pools.values()):
+            pool.close()
+
+
+#: Pools of the proxy.
+POOLS = PoolManager()
+
+
+def _chunked_end(buf, pos):
+    """
+    Walk the chunks of a chunked body starting at ``pos``.
+
+    :rtype tuple: (offset just past the body and its trailers or -1 if more
+                  bytes are needed, offset to resume the walk from).
+    :raise UpstreamError: on a malformed chunk-size line.
+    """
+    while True:
+        line_end = buf.find(b"\r\n", pos)
+        if line_end < 0:
+            return -1, pos
+        size_field = bytes(buf[pos:line_end]).split(b";", 1)[0].strip()
+        try:
+            size = int(size_field, 16)
+        except ValueError:
+            raise UpstreamError("malformed chunk size {!r}".format(size_field))
+        if size == 0:
+            # Trailer section: header lines ended by an empty line.
+            if buf[line_end + 2:line_end + 4] == b"\r\n":
+                return line_end + 4, pos
+            end = buf.find(b"\r\n\r\n", line_end)
+            return (-1 if end < 0 else end + 4), pos
+        if line_end + 2 + size + 2 > len(buf):
+            return -1, pos
+        pos = line_end + 2 + size + 2
+
+
+def parse_response_head(head):
+    """
+    Parse the status line and the framing headers of a response.
+
+    :param head (bytes): status line and headers, without the blank line.
+    :rtype tuple: (version, status, content_length or None, chunked, close).
+    :raise UpstreamError: on a malformed status line.
+    """
+    lines = head.split(b"\r\n")
+    parts = lines[0].split(b" ", 2)
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/") or not parts[1].isdigit():
+        raise UpstreamError("malformed status line {!r}".format(lines[0][:64]))
+    version, status = parts[0], parts[1]
+    content_length = None
+    chunked = False
+    close = version == b"HTTP/1.0"
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == b"content-length":
+            try:
+                content_length = int(value)
+            except ValueError:
+                raise UpstreamError("malformed Content-Length {!r}".format(value))
+        elif name == b"transfer-encoding":
+            chunked = value.endswith(b"chunked")
+        elif name == b"connection":
+            if b"close" in value:
+                close = True
+            elif b"keep-alive" in value:
+                close = False
+    return version, status, content_length, chunked, close
+
+
+def read_head(sock, deadline=None):
+    """
+    Read from an upstream socket up to the end of a response header section.
+
+    :param sock (socket.socket): blocking upstream socket.
+    :param deadline (Deadline): extended after each read.
+    :rtype tuple: (bytearray of the received bytes, which may include the
+                  start of the body, offset of the header's blank line).
+    :raise UpstreamClosed: if the upstream closed the connection first.
+    :raise UpstreamError: if the header is cut short or too large.
+    """
+    buf = bytearray()
+    head_end = -1
+    while head_end < 0:
+        chunk = sock.recv(READ_SIZE)
+        if not chunk:
+            if not buf:
+                raise UpstreamClosed("upstream closed the connection before a response")
+            raise UpstreamError("response header cut short")
+        if deadline is not None:
+            deadline.touch()
+        buf += chunk
+        head_end = buf.find(b"\r\n\r\n")
+        if head_end < 0 and len(buf) > MAX_HEADER_SIZE:
+            raise UpstreamError("response header section too large")
+    return buf, head_end
+
+
+def read_body(sock, buf, body_start, length, deadline=None):
+    """
+    Read the rest of a response body of a known size.
+
+    :param sock (socket.socket): blocking upstream socket.
+    :param buf (bytearray): bytes received so far; the body starts at
+                ``body_start``. Grows with the bytes read.
+    :param length (int): Content-Length of the body.
+    :param deadline (Deadline): extended after each read.
+    :rtype tuple: (body bytes, whether nothing was received beyond it).
+    :raise UpstreamError: if the body is cut short.
+    """
+    end = body_start + length
+    while len(buf) < end:
+        chunk = sock.recv(READ_SIZE)
+        if not chunk:
+            raise UpstreamError("response body cut short")
+        if deadline is not None:
+            deadline.touch()
+        buf += chunk
+    return bytes(buf[body_start:end]), len(buf) == end
+
+
+def bodyless(method, status):
+    """Whether the response to ``method`` with ``status`` (bytes) has no body."""
+    return method == "HEAD" or status.startswith(_BODYLESS_STATUS)
+
+
+def read_response(sock, method, deadline=None):
+    """
+    Read one response from an upstream socket.
+
+    :param sock (socket.socket): blocking upstream socket.
+    :param method (str): method of the request, HEAD responses have no body.
+    :param deadline (Deadline): extended after each read.
+    :rtype tuple: (response bytes, offset of the header's blank line, whether
+                  the connection can carry another request).
+    :raise UpstreamError: if the response is malformed or the upstream closed
+                          the connection before a complete response.
+    """
+    buf, head_end = read_head(sock, deadline)
+    version, status, content_length, chunked, close = parse_response_head(bytes(buf[:head_end]))
+    body_start = head_end + 4
+    if bodyless(method, status):
+        end = body_start
+    elif chunked:
+        end, pos = _chunked_end(buf, body_start)
+        while end < 0:
+            chunk = sock.recv(READ_SIZE)
+            if not chunk:
+                raise UpstreamError("chunked response cut short")
+            if deadline is not None:
+                deadline.touch()
+            buf += chunk
+            end, pos = _chunked_end(buf, pos)
+    elif content_length is not None:
+        end = body_start + content_length
+        while len(buf) < end:
+            chunk = sock.recv(max(READ_SIZE, end - len(buf)))
+            if not chunk:
+                raise UpstreamError("response body cut short")
+            if deadline is not None:
+                deadline.touch()
+            buf += chunk
+    else:
+        # Delimited by the end of the connection.
+        while True:
+            chunk = sock.recv(READ_SIZE)
+            if not chunk:
+                break
+            if deadline is not None:
+                deadline.touch()
+            buf += chunk
+        return bytes(buf), head_end, False
+
+    # Bytes beyond the response are unexpected: the connection is not reused.
+    reusable = not close and len(buf) == end
+    return bytes(buf[:end]), head_end, reusable
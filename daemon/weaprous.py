@@ -17,7 +17,31 @@ deamon.weaproute
 This module provides a WeApRous object to deploy RESTful url web app with routing
 """
 
+import inspect
+import logging
+
 from .backend import create_backend
+from .httpparser import set_body_limits
+from .metrics import REGISTRY, CONTENT_TYPE
+from .middleware import Pipeline, RequestMetrics
+from .overload import Limiter
+from .response import Response
+from .router import Router
+from .timeouts import set_timeouts
+
+logger = logging.getLogger(__name__)
+
+
+def _takes_context(func):
+    """Whether ``func`` opts into a :class:`RequestContext <daemon.request.RequestContext>`
+    by naming its first positional parameter ``request``."""
+    try:
+        params = list(inspect.signature(func).parameters.values())
+    except (TypeError, ValueError):
+        return False
+    return bool(params) and params[0].name == "request" and params[0].kind in (
+        inspect.Parameter.POSITIONAL_ONLY, inspect.Parameter.POSITIONAL_OR_KEYWORD)
+
 
 class WeApRous:
     """The fully mutable :class:`WeApRous <WeApRous>` object, which is a lightweight,
@@ -32,7 +56,8 @@ class WeApRous:
     Usage::
       >>> import daemon.weaprous
       >>> app = WeApRous()
-      >>> @app.route('/login', methods=['POST'])
+      >>> app.use(CookieAuth())
+      >>> @app.route('/login', methods=['POST'], skip=("auth",))
       >>> def login(headers="guest", body="anonymous"):
       >>>     return {'message': 'Logged in'}
 
@@ -50,6 +75,10 @@ class WeApRous:
         Sets up an empty route registry and prepares placeholders for IP and port.
         """
         self.routes = {}
+        self.router = None
+        self.middleware = []
+        #: Path of the built-in Prometheus metrics route, None to disable it.
+        self.metrics_path = "/metrics"
         self.ip = None
         self.port = None
         return
@@ -64,12 +93,42 @@ class WeApRous:
         self.ip = ip
         self.port = port
 
-    def route(self, path, methods=['GET']):
+    def use(self, middleware):
+        """
+        Add a middleware to every request of the app, after the ones already
+        added. See :mod:`daemon.middleware` for the built-in ``CookieAuth``,
+        ``RequestLog``, ``Timing`` and ``CORS``.
+
+        :param middleware (Middleware): the middleware object.
+        :rtype: Middleware - ``middleware``.
+        """
+        self.middleware.append(middleware)
+        return middleware
+
+    def route(self, path, methods=['GET'], skip=()):
         """
         Decorator to register a route handler for a specific path and HTTP methods.
 
+        The path may contain parameters (``/channels/<name>/peers``,
+        ``/peers/<int:port>``) and end with a catch-all (``<path:rest>`` or
+        ``*``); captured values are passed to the handler as keyword arguments
+        next to ``headers`` and ``body``. See :mod:`daemon.router`.
+
+        The handler may return a dict or list (sent as JSON), bytes, a
+        generator or async generator of chunks (streamed with chunked
+        transfer coding), a :class:`Response <daemon.response.Response>`
+        built with ``Response.make`` for a custom status, headers or cookies,
+        or a str holding a complete raw HTTP response.
+
+        A handler whose first parameter is named ``request`` receives a
+        :class:`RequestContext <daemon.request.RequestContext>` instead of
+        ``headers`` and ``body``; its headers, cookies, query parameters and
+        ``json()`` body are decoded on first access only.
+
         :param path (str): The URL path to route.
         :param methods (list): A list of HTTP methods (e.g., ['GET', 'POST']) to bind.
+        :param skip (iterable): names of middleware the route opts out of,
+                     e.g. ``("auth",)`` for a login route.
 
         :rtype: function - A decorator that registers the handler function.
         """
@@ -80,22 +139,91 @@ class WeApRous:
             # Optional attach route metadata to the function
             func._route_path = path
             func._route_methods = methods
+            func._route_context = _takes_context(func)
+            func._route_skip = frozenset(skip)
 
             return func
         return decorator
 
-    def run(self):
+    def run(self, mode="threading", workers=1, max_body_size=None,
+            max_connections=None, max_requests=None, max_queue=None, timeouts=None):
         """
         Start the backend server and begin handling requests.
 
         This method launches the TCP server using the configured IP and port,
         and dispatches incoming requests to the registered route handlers.
+        The routes are compiled once into a :class:`Router <Router>` here,
+        and the middleware into one pipeline per set of route opt-outs;
+        routes and middleware added afterwards are not served.
+
+        Unless ``metrics_path`` is None, request counts and latencies are
+        recorded by a :class:`RequestMetrics <daemon.middleware.RequestMetrics>`
+        middleware ahead of the others, and ``GET /metrics`` serves them with
+        the rest of :data:`daemon.metrics.REGISTRY` in the Prometheus text
+        format. The route skips the ``auth`` and ``log`` middleware; with
+        ``workers > 1`` each scrape reports the worker that served it.
+
+        :param mode (str): Backend engine, ``threading``, ``selector`` or ``asyncio``.
+                     Route handlers may be ``async def`` functions; the asyncio
+                     engine awaits them on its loop and runs plain handlers in
+                     a thread executor.
+        :param workers (int): Number of pre-forked worker processes. Module level
+                       state of the app is not shared between workers; use a
+                       :class:`StateOwner <daemon.prefork.StateOwner>` for that.
+        :param max_body_size (int): Largest accepted request body in bytes;
+                             larger ones are answered with 413. Defaults to
+                             :data:`daemon.httpparser.MAX_BODY_SIZE`.
+        :param max_connections (int): Open connections per worker process,
+                               0 for no limit; further connections get 503.
+        :param max_requests (int): Requests served at once per worker
+                            process, 0 for no limit.
+        :param max_queue (int): Requests waiting for a slot before further
+                         ones get 503. See :mod:`daemon.overload` for the
+                         defaults of the three limits.
+        :param timeouts (dict): Deadlines in seconds by phase, e.g.
+                        ``{"header": 5, "idle": 30}``; see
+                        :func:`daemon.timeouts.set_timeouts` for the phases.
 
         :raise: Error if IP or port has not been configured.
         """
         if not self.ip or not self.port:
-            print("Rous app need to preapre address"
-                  "by calling app.prepare_address(ip,port)")
-
-        create_backend(self.ip, self.port, self.routes)
+            logger.warning("Rous app need to preapre address "
+                           "by calling app.prepare_address(ip,port)")
+
+        if max_body_size is not None:
+            set_body_limits(max_body_size=max_body_size)
+        if timeouts:
+            set_timeouts(**timeouts)
+        if self.metrics_path and ("GET", self.metrics_path) not in self.routes:
+            @self.route(self.metrics_path, methods=['GET'], skip=("auth", "log"))
+            def metrics(headers, body):
+                return Response.make(REGISTRY.render(), content_type=CONTENT_TYPE)
+        self.router = Router(self.routes).compile()
+        self.compile_middleware()
+        limits = {name: value for name, value in (("max_connections", max_connections),
+                                                  ("max_requests", max_requests),
+                                                  ("max_queue", max_queue))
+                  if value is not None}
+        create_backend(self.ip, self.port, self.router, mode, workers, Limiter("backend", **limits))
         
+
+    def compile_middleware(self):
+        """
+        Compose the middleware into :class:`Pipeline <Pipeline>` objects: one
+        for the requests no route matches, attached to the router, and one
+        per distinct set of opt-outs, attached to the route handlers.
+        """
+        pipelines = {}
+        middleware = list(self.middleware)
+        if self.metrics_path and not any(isinstance(m, RequestMetrics) for m in middleware):
+            middleware.insert(0, RequestMetrics())
+
+        def pipeline(skip):
+            if skip not in pipelines:
+                pipelines[skip] = Pipeline(m for m in middleware
+                                           if getattr(m, "name", None) not in skip)
+            return pipelines[skip]
+
+        self.router.pipeline = pipeline(frozenset())
+        for _, _, handler in self.router.routes:
+            handler._route_pipeline = pipeline(getattr(handler, "_route_skip", frozenset()))
@@ -26,6 +26,7 @@ import socket
 import argparse
 
 from daemon import create_backend
+from daemon.overload import Limiter, MAX_CONNECTIONS, MAX_REQUESTS, MAX_QUEUE
 
 # Default port number used if none is specified via command-line arguments.
 PORT = 9000 
@@ -40,6 +41,11 @@ if __name__ == "__main__":
 
     :arg --server-ip (str): IP address to bind the server (default: 127.0.0.1).
     :arg --server-port (int): Port number to bind the server (default: 9000).
+    :arg --mode (str): Backend engine, threading, selector or asyncio (default: threading).
+    :arg --workers (int): Number of pre-forked worker processes (default: 1).
+    :arg --max-connections (int): Open connections per worker, 0 for no limit.
+    :arg --max-requests (int): Requests served at once per worker, 0 for no limit.
+    :arg --max-queue (int): Requests waiting for a slot before 503 is returned.
     """
 
     parser = argparse.ArgumentParser(
@@ -58,9 +64,40 @@ if __name__ == "__main__":
         default=PORT,
         help='Port number to bind the server. Default is {}.'.format(PORT)
     )
+    parser.add_argument(
+        '--mode',
+        choices=['threading', 'selector', 'asyncio'],
+        default='threading',
+        help='Backend engine: one thread per connection, a selector event loop or asyncio. Default is threading.'
+    )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Number of worker processes sharing the listening port. Default is 1.'
+    )
+    parser.add_argument(
+        '--max-connections',
+        type=int,
+        default=MAX_CONNECTIONS,
+        help='Open connections per worker, 0 for no limit. Default is {}.'.format(MAX_CONNECTIONS)
+    )
+    parser.add_argument(
+        '--max-requests',
+        type=int,
+        default=MAX_REQUESTS,
+        help='Requests served at once per worker, 0 for no limit. Default is {}.'.format(MAX_REQUESTS)
+    )
+    parser.add_argument(
+        '--max-queue',
+        type=int,
+        default=MAX_QUEUE,
+        help='Requests waiting for a slot before 503 is returned. Default is {}.'.format(MAX_QUEUE)
+    )
  
     args = parser.parse_args()
     ip = args.server_ip
     port = args.server_port
+    limiter = Limiter("backend", args.max_connections, args.max_requests, args.max_queue)
 
-    create_backend(ip, port)
+    create_backend(ip, port, mode=args.mode, workers=args.workers, limiter=limiter)
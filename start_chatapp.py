@@ -4,26 +4,108 @@ import time
 import argparse
 import threading
 from daemon.weaprous import WeApRous
+from daemon.response import Response
+from daemon.prefork import StateOwner
+from daemon import log
+from daemon.middleware import CookieAuth, RequestLog
 
 app = WeApRous()
+app.use(RequestLog())
+app.use(CookieAuth())
 
 
 
 
-channels = {
-    "general": {
-        "name": "broadcast",
-        "peers": {}  # {peer_id: {ip, port, name, joined_at}}
-    },
-    "tech": {
-        "name": "tech",
-        "peers": {}
-    },
-    "random": {
-        "name": "random",
-        "peers": {}
-    }
-}
+class ChannelRegistry:
+    """
+    Tracker state: the chat channels and the peers registered in each of them.
+
+    Handlers only go through these methods, so with ``--workers`` the registry
+    can live in a :class:`StateOwner <daemon.prefork.StateOwner>` process and
+    stay consistent across all worker processes.
+    """
+
+    def __init__(self):
+        self.channels = {
+            "general": {
+                "name": "broadcast",
+                "peers": {}  # {peer_id: {ip, port, name, joined_at}}
+            },
+            "tech": {
+                "name": "tech",
+                "peers": {}
+            },
+            "random": {
+                "name": "random",
+                "peers": {}
+            }
+        }
+        self.lock = threading.Lock()
+
+    def register_peer(self, channel, peer_id, info):
+        """Registers (or refreshes) ``peer_id`` in ``channel``; KeyError if unknown."""
+        with self.lock:
+            self.channels[channel]["peers"][peer_id] = info
+
+    def list_peers(self, channel):
+        """Returns the peers of ``channel``; KeyError if unknown."""
+        with self.lock:
+            return [{
+                "peer_id": peer_id,
+                "ip": info["ip"],
+                "port": info["port"],
+                "name": info["name"]
+            } for peer_id, info in self.channels[channel]["peers"].items()]
+
+    def remove_peer(self, peer_id):
+        """Removes a peer registered in general from every channel."""
+        with self.lock:
+            if peer_id not in self.channels["general"]["peers"]:
+                return False
+            for channel in self.channels.values():
+                channel["peers"].pop(peer_id, None)
+            return True
+
+    def add_peer_to_channel(self, peer_id, channel_name):
+        """
+        Copies a known peer into ``channel_name``.
+
+        :rtype tuple: (outcome, peer count) with outcome one of
+                      ``no-channel``, ``no-peer``, ``exists`` or ``added``.
+        """
+        with self.lock:
+            if channel_name not in self.channels:
+                return "no-channel", 0
+
+            # Find peer in any channel
+            peer_info = None
+            for ch_data in self.channels.values():
+                if peer_id in ch_data["peers"]:
+                    peer_info = ch_data["peers"][peer_id].copy()
+                    break
+            if not peer_info:
+                return "no-peer", 0
+
+            peers = self.channels[channel_name]["peers"]
+            if peer_id in peers:
+                return "exists", len(peers)
+
+            peer_info["last_seen"] = time.time()
+            peers[peer_id] = peer_info
+            return "added", len(peers)
+
+    def touch_peer(self, peer_id, timestamp):
+        """Records a keep-alive of a peer registered in general."""
+        with self.lock:
+            peers = self.channels["general"]["peers"]
+            if peer_id not in peers:
+                return False
+            peers[peer_id]['last_seen'] = timestamp
+            return True
+
+
+#: Replaced by a proxy of the shared registry when running several workers.
+registry = ChannelRegistry()
 
 
 accounts = {
@@ -34,9 +116,7 @@ accounts = {
     "tom": "tom"
 }
 
-peers_lock = threading.Lock()
-
-@app.route('/login', methods=['POST'])
+@app.route('/login', methods=['POST'], skip=("auth",))
 def login(headers="", body=""):
     try:
         data=json.loads(body) if body else {}
@@ -45,39 +125,26 @@ def login(headers="", body=""):
         print("[SampleApp] Logging in {} to {}".format(headers, body))
 
         if username in accounts and accounts[username] == password:
-            response = json.dumps({
+            response = Response.make({
                 "status": "success",
                 "message": "User {} logged in successfully.".format(username),
                 "userid": username,
                 "timestamp": time.time(),
                 "auth": True
             })
-        else:
-            response = json.dumps({
-                "status": "error",
-                "message": "Invalid username or password.",
-                "auth": False
-            })
-        return(
-            "HTTP/1.1 200 OK\r\n"
-            "Content-Type: application/json\r\n"
-            "Set-Cookie: auth=true; Path=/\r\n"                # ← ADD AUTH COOKIE
-            "Content-Length: {}\r\n"
-            "\r\n"  
-            "{}".format(len(response), response)
-        )
+            response.set_cookie("auth", "true")
+            return response
+        return {
+            "status": "error",
+            "message": "Invalid username or password.",
+            "auth": False
+        }
     except Exception as e:
         print(f"[SampleApp] Error in login: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred during login."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }, status_code=500)
 
 
 @app.route('/submit-info', methods=['POST'])
@@ -91,58 +158,30 @@ def submit_peer_info(headers="", body=""):
         timestamp = time.time()
         peer_id = f"{peer_ip}:{peer_port}"
         if not peer_id or not peer_ip or not peer_port:
-            return_body = json.dumps({
-                "status": "error",
-                "message": "Missing peer information."
-            })
-            print(f"[SampleApp] Missing peer information: {return_body}")
-            return (
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(return_body), return_body)
-            )
-        if peer_id and peer_ip and peer_port:
-            #add lock here for thread safety if needed
-            with peers_lock:
-                channels[peer_channel]["peers"][peer_id] = {
-                    "ip": peer_ip,
-                    "port": peer_port,
-                    "name": peer_name,
-                    "last_seen": timestamp,
-                }
-                print(f"[SampleApp] Registered peer {peer_id} at {peer_ip}:{peer_port}")
-
-            response = json.dumps({
-                "status": "success",
-                "message": f"Peer {peer_id} registered successfully to channel {peer_channel}.",
-                "peer_id": peer_id
-            })
-            print(f"[SampleApp] Registered peer successfully: {response}")
-            return(
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
-        else:
-            response = json.dumps({
+            print(f"[SampleApp] Missing peer information: {data}")
+            return Response.make({
                 "status": "error",
                 "message": "Missing peer information."
-            })
-            print(f"[SampleApp] Missing peer information: {response}")
-            return(
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
+            }, status_code=400)
+
+        registry.register_peer(peer_channel, peer_id, {
+            "ip": peer_ip,
+            "port": peer_port,
+            "name": peer_name,
+            "last_seen": timestamp,
+        })
+        print(f"[SampleApp] Registered peer {peer_id} at {peer_ip}:{peer_port}")
+        return {
+            "status": "success",
+            "message": f"Peer {peer_id} registered successfully to channel {peer_channel}.",
+            "peer_id": peer_id
+        }
     except Exception as e:
         print(f"[SampleApp] Error in submit-info: {e}")
-        return json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while submitting peer information."
-        })
+        }, status_code=500)
 
 
 @app.route('/get-list', methods=['POST'])
@@ -155,84 +194,38 @@ def get_peer_list(headers="", body=""):
         #     print(f"[SampleApp] Removed expired peer {peer}")
         data = json.loads(body) if body else {}
         channel_name = data.get("channel", "general")
-        peer_list = []
-        with peers_lock:
-            for peer_id, info in channels[channel_name]["peers"].items():
-                peer_list.append({
-                    "peer_id": peer_id,
-                    "ip": info["ip"],
-                    "port": info["port"],
-                    "name": info["name"]
-                })
-        
-        response = json.dumps({
+        peer_list = registry.list_peers(channel_name)
+
+        print(f"[SampleApp] Returning peer list with {len(peer_list)} peers")
+        return {
             "status": "success",
             "peers": peer_list,
             "count": len(peer_list)
-        })
-        print(f"[SampleApp] Returning peer list with {len(peer_list)} peers")
-        return(
-            "HTTP/1.1 200 OK\r\n"
-            "Content-Type: application/json\r\n"
-            "Content-Length: {}\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }
     except Exception as e:
         print(f"[SampleApp] Error in get-list: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while retrieving the peer list."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }, status_code=500)
 
 @app.route('/get-list', methods=['GET'])
 def get_peer_list(headers="", body=""):
     try:
-        # current_time = time.time()
-        # expired_peers = [peer for peer, info in  if current_time - info["last_seen"] > 30000]
-        # for peer in expired_peers:
-        #     del 
-        #     print(f"[SampleApp] Removed expired peer {peer}")
-        peer_list = []
-        for peer_id, info in channels["general"]["peers"].items():
-            peer_list.append({
-                "peer_id": peer_id,
-                "ip": info["ip"],
-                "port": info["port"],
-                "name": info["name"]
-            })
-        
-        response = json.dumps({
+        peer_list = registry.list_peers("general")
+
+        print(f"[SampleApp] Returning peer list with {len(peer_list)} peers")
+        return {
             "status": "success",
             "peers": peer_list,
             "count": len(peer_list)
-        })
-        print(f"[SampleApp] Returning peer list with {len(peer_list)} peers")
-        return(
-            "HTTP/1.1 200 OK\r\n"
-            "Content-Type: application/json\r\n"
-            "Content-Length: {}\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }
     except Exception as e:
         print(f"[SampleApp] Error in get-list: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while retrieving the peer list."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }, status_code=500)
     
 @app.route('/remove-peer', methods=['POST'])
 def remove_peer(headers="", body=""):
@@ -240,60 +233,27 @@ def remove_peer(headers="", body=""):
         data = json.loads(body) if body else {}
         peer_id = data.get("peer_id")
         if peer_id is None:
-            response = json.dumps({
+            return Response.make({
                 "status": "error",
                 "message": "peer_id is required."
-            })
-            return(
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
-        
-        if peer_id in channels["general"]["peers"]:
-            with peers_lock:
-                del channels["general"]["peers"][peer_id]
-                if peer_id in channels["tech"]["peers"]:
-                    del channels["tech"]["peers"][peer_id]
-                if peer_id in channels["random"]["peers"]:
-                    del channels["random"]["peers"][peer_id]
-                print(f"[SampleApp] Removed peer {peer_id}")
-
-            response = json.dumps({
+            }, status_code=400)
+
+        if registry.remove_peer(peer_id):
+            print(f"[SampleApp] Removed peer {peer_id}")
+            return {
                 "status": "success",
                 "message": f"Peer {peer_id} removed successfully."
-            })
-            return(
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
-        else:
-            response = json.dumps({
-                "status": "error",
-                "message": f"Peer {peer_id} not found."
-            })
-            
-            return(
-                "HTTP/1.1 404 Not Found\r\n"
-                "Content-Type: application/json\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
+            }
+        return Response.make({
+            "status": "error",
+            "message": f"Peer {peer_id} not found."
+        }, status_code=404)
     except Exception as e:
         print(f"[SampleApp] Error in remove-peer: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while removing the peer."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }, status_code=500)
 
 
 @app.route('/add-peer-to-channel', methods=['POST'])
@@ -312,149 +272,93 @@ def add_peer_to_channel(headers="", body=""):
         channel_name = data.get("channel_name")
         
         if not peer_id or not channel_name:
-            response = json.dumps({
+            return Response.make({
                 "status": "error",
                 "message": "peer_id and channel_name are required."
-            })
-            return(
-                "HTTP/1.1 400 Bad Request\r\n"
-                "Content-Type: application/json\r\n"
-                "Content-Length: {}\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
+            }, status_code=400)
         
-        with peers_lock:
-            # Check if channel exists
-            if channel_name not in channels:
-                response = json.dumps({
-                    "status": "error",
-                    "message": f"Channel '{channel_name}' does not exist."
-                })
-                return(
-                    "HTTP/1.1 404 Not Found\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(len(response), response)
-                )
-            
-            # Find peer in any channel
-            peer_info = None
-            for ch_name, ch_data in channels.items():
-                if peer_id in ch_data["peers"]:
-                    peer_info = ch_data["peers"][peer_id].copy()
-                    break
-            
-            if not peer_info:
-                response = json.dumps({
-                    "status": "error",
-                    "message": f"Peer {peer_id} not found. Register with /submit-info first."
-                })
-                return(
-                    "HTTP/1.1 404 Not Found\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(len(response), response)
-                )
-            
-            # Check if peer is already in the channel
-            if peer_id in channels[channel_name]["peers"]:
-                response = json.dumps({
-                    "status": "success",
-                    "message": f"Peer {peer_id} is already in channel '{channel_name}'."
-                })
-                return(
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: application/json\r\n"
-                    "Content-Length: {}\r\n"
-                    "\r\n"
-                    "{}".format(len(response), response)
-                )
-            
-            # Add peer to the channel
-            peer_info["last_seen"] = time.time()
-            channels[channel_name]["peers"][peer_id] = peer_info
-            
-            print(f"[SampleApp] Added peer {peer_id} to channel '{channel_name}'")
-            
-            response = json.dumps({
+        outcome, peer_count = registry.add_peer_to_channel(peer_id, channel_name)
+
+        # Check if channel exists
+        if outcome == "no-channel":
+            return Response.make({
+                "status": "error",
+                "message": f"Channel '{channel_name}' does not exist."
+            }, status_code=404)
+
+        if outcome == "no-peer":
+            return Response.make({
+                "status": "error",
+                "message": f"Peer {peer_id} not found. Register with /submit-info first."
+            }, status_code=404)
+
+        # Check if peer is already in the channel
+        if outcome == "exists":
+            return {
                 "status": "success",
-                "message": f"Peer {peer_id} added to channel '{channel_name}' successfully.",
-                "channel": channel_name,
-                "peer_count": len(channels[channel_name]["peers"])
-            })
-            return(
-                "HTTP/1.1 200 OK\r\n"
-                "Content-Type: application/json\r\n"
-                "Content-Length: {}\r\n"
-                "\r\n"
-                "{}".format(len(response), response)
-            )
+                "message": f"Peer {peer_id} is already in channel '{channel_name}'."
+            }
+
+        print(f"[SampleApp] Added peer {peer_id} to channel '{channel_name}'")
+        return {
+            "status": "success",
+            "message": f"Peer {peer_id} added to channel '{channel_name}' successfully.",
+            "channel": channel_name,
+            "peer_count": peer_count
+        }
     except Exception as e:
         print(f"[SampleApp] Error in add-peer-to-channel: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while adding peer to channel."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "Content-Length: {}\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
-
-@app.route('/ping', methods=['POST'])
-def ping(headers="", body=""):
+        }, status_code=500)
+
+@app.route('/ping', methods=['POST'], skip=("log",))
+def ping(request):
     try:
-        data = json.loads(body) if body else {}
-        peer_id = data.get("peer_id")
+        peer_id = (request.json() or {}).get("peer_id")
         print(f"[SampleApp] Received ping from {peer_id}")
         timestamp = time.time()
-        with peers_lock:
-            if peer_id in channels["general"]["peers"]:
-                channels["general"]["peers"][peer_id]['last_seen'] = timestamp
-                response = json.dumps({
-                    "status": "success",
-                    "message": f"Keep alive for {peer_id}."
-                })
-                return(
-                    "HTTP/1.1 200 OK\r\n"
-                    "Content-Type: application/json\r\n"
-                    "\r\n"
-                    "{}".format(len(response), response)
-                )
-            else:
-                response = json.dumps({
-                    "status": "error",
-                    "message": f"Peer {peer_id} not found."
-                })
-                return(
-                    "HTTP/1.1 404 Not Found\r\n"
-                    "Content-Type: application/json\r\n"
-                    "\r\n"
-                    "{}".format(len(response), response)
-                )
+        if registry.touch_peer(peer_id, timestamp):
+            return {
+                "status": "success",
+                "message": f"Keep alive for {peer_id}."
+            }
+        return Response.make({
+            "status": "error",
+            "message": f"Peer {peer_id} not found."
+        }, status_code=404)
     except Exception as e:
         print(f"[SampleApp] Error in ping: {e}")
-        response = json.dumps({
+        return Response.make({
             "status": "error",
             "message": "An error occurred while processing the ping."
-        })
-        return(
-            "HTTP/1.1 500 Internal Server Error\r\n"
-            "Content-Type: application/json\r\n"
-            "\r\n"
-            "{}".format(len(response), response)
-        )
+        }, status_code=500)
+
+
 if __name__ == "__main__":
 
     parser = argparse.ArgumentParser(prog='Tracker server', description='', epilog='Beckend daemon')
     parser.add_argument('--server-ip', default='0.0.0.0')
     parser.add_argument('--server-port', type=int, default=8000)
+    parser.add_argument('--mode', choices=['threading', 'selector', 'asyncio'], default='threading')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--max-connections', type=int, default=None)
+    parser.add_argument('--max-requests', type=int, default=None)
+    parser.add_argument('--max-queue', type=int, default=None)
     args = parser.parse_args()
+    log.configure()
+
+    owner = None
+    if args.workers > 1:
+        # One process owns the channels; every worker talks to it
+        owner = StateOwner(ChannelRegistry)
+        registry = owner.start()
 
     app.prepare_address(args.server_ip, args.server_port)
-    app.run()
\ No newline at end of file
+    try:
+        app.run(mode=args.mode, workers=args.workers, max_connections=args.max_connections,
+                max_requests=args.max_requests, max_queue=args.max_queue)
+    finally:
+        if owner is not None:
+            owner.shutdown()
\ No newline at end of file
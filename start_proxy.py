@@ -4,20 +4,34 @@ import re
 from typing import Dict, Tuple, List, Union
 
 from daemon import create_proxy
+from daemon.overload import Limiter, MAX_CONNECTIONS, MAX_REQUESTS, MAX_QUEUE
+from daemon.balancer import POLICIES, DEFAULT_POLICY, parse_target, parse_options
+from daemon.health import check_settings
+from daemon.proxycache import RESPONSE_CACHE, MAX_CACHE_BYTES
 
 PROXY_PORT = 8080
-DEFAULT_POLICY = "round-robin"
 HOST_BLOCK_PATTERN = r'host\s+"([^"]+)"\s*\{(.*?)\}'
-PROXY_PASS_PATTERN = r'proxy_pass\s+http://([^\s;]+);'
+PROXY_PASS_PATTERN = r'proxy_pass\s+http://([^\s;]+)((?:\s+\w+=[^\s;]+)*)\s*;'
 DIST_POLICY_PATTERN = r'dist_policy\s+([-\w]+)'
+HEALTH_CHECK_PATTERN = r'health_check((?:\s+\w+=[^\s;]+)*)\s*;'
+PROXY_CACHE_PATTERN = r'proxy_cache\s+(on|off)\s*;'
 
 
-def parse_virtual_hosts(config_file: str) -> Dict[str, Tuple[Union[str, List[str]], str]]:
+def parse_virtual_hosts(config_file: str) -> Dict[str, Tuple[Union[str, List[str]], str, dict]]:
     """
     Parse virtual-host mapping from `config_file`.
 
+    A proxy_pass may carry options after its URL, e.g.
+    ``proxy_pass http://127.0.0.1:9000 weight=3;``; they are kept in the
+    target string as ``"127.0.0.1:9000 weight=3"``.
+
+    ``health_check path=/health interval=5 timeout=2 rise=2 fall=3;`` enables
+    active health checks of the block's upstreams; every option is optional.
+    ``proxy_cache on;`` answers the block's GET and HEAD requests from the
+    shared response cache when the backend allows it.
+
     Returns:
-        dict: routes[host] = (proxy_pass | [proxy_pass...], policy)
+        dict: routes[host] = (proxy_pass | [proxy_pass...], policy, options)
     """
     config_path = os.path.abspath(config_file)
     if not os.path.exists(config_path):
@@ -26,20 +40,41 @@ def parse_virtual_hosts(config_file: str) -> Dict[str, Tuple[Union[str, List[str
     with open(config_path, "r", encoding="utf-8") as cfg:
         config_text = cfg.read()
 
-    routes: Dict[str, Tuple[Union[str, List[str]], str]] = {}
+    routes: Dict[str, Tuple[Union[str, List[str]], str, dict]] = {}
 
     for host, block in re.findall(HOST_BLOCK_PATTERN, config_text, re.DOTALL):
-        proxy_passes = re.findall(PROXY_PASS_PATTERN, block)
+        proxy_passes = [" ".join([address] + options.split())
+                        for address, options in re.findall(PROXY_PASS_PATTERN, block)]
         policy_match = re.search(DIST_POLICY_PATTERN, block)
         policy = (policy_match.group(1).lower() if policy_match else DEFAULT_POLICY).strip()
 
         if not proxy_passes:
             raise ValueError(f"[start_proxy] Host '{host}' lacks proxy_pass entries")
+        if policy not in POLICIES:
+            raise ValueError(f"[start_proxy] Host '{host}' has unknown dist_policy '{policy}', "
+                             f"expected one of {', '.join(POLICIES)}")
+        for target in proxy_passes:
+            try:
+                parse_target(target)
+            except ValueError as e:
+                raise ValueError(f"[start_proxy] Host '{host}': {e}") from None
+
+        options = {}
+        health_match = re.search(HEALTH_CHECK_PATTERN, block)
+        if health_match:
+            try:
+                options["health_check"] = check_settings(parse_options(health_match.group(1).split()))
+            except ValueError as e:
+                raise ValueError(f"[start_proxy] Host '{host}': {e}") from None
+
+        cache_match = re.search(PROXY_CACHE_PATTERN, block)
+        if cache_match and cache_match.group(1) == "on":
+            options["cache"] = True
 
         if len(proxy_passes) == 1:
-            routes[host] = (proxy_passes[0], policy)
+            routes[host] = (proxy_passes[0], policy, options)
         else:
-            routes[host] = (proxy_passes, policy)
+            routes[host] = (proxy_passes, policy, options)
 
     if not routes:
         raise ValueError("[start_proxy] No host blocks were parsed from config")
@@ -59,10 +94,20 @@ def main() -> None:
         default=os.path.join(os.path.dirname(__file__), "config", "proxy.conf"),
         help="Path to proxy configuration file",
     )
+    parser.add_argument("--max-connections", type=int, default=MAX_CONNECTIONS,
+                        help="Open client connections, 0 for no limit")
+    parser.add_argument("--max-requests", type=int, default=MAX_REQUESTS,
+                        help="Requests forwarded at once, 0 for no limit")
+    parser.add_argument("--max-queue", type=int, default=MAX_QUEUE,
+                        help="Requests waiting for a slot before 503 is returned")
+    parser.add_argument("--cache-max-bytes", type=int, default=MAX_CACHE_BYTES,
+                        help="Memory of the response cache of the proxy_cache host blocks")
 
     args = parser.parse_args()
     routes = parse_virtual_hosts(args.config)
-    create_proxy(args.server_ip, args.server_port, routes)
+    RESPONSE_CACHE.configure(max_bytes=args.cache_max_bytes)
+    limiter = Limiter("proxy", args.max_connections, args.max_requests, args.max_queue)
+    create_proxy(args.server_ip, args.server_port, routes, limiter)
 
 
 if __name__ == "__main__":
@@ -29,12 +29,15 @@ import socket
 import argparse
 
 from daemon.weaprous import WeApRous
+from daemon.middleware import CookieAuth, RequestLog
 
 PORT = 8000  # Default port
 
 app = WeApRous()
+app.use(RequestLog())
+app.use(CookieAuth())
 
-@app.route('/login', methods=['POST'])
+@app.route('/login', methods=['POST'], skip=("auth",))
 def login(headers="guest", body="anonymous"):
     """
     Handle user login via POST request.
@@ -0,0 +1,18 @@
+import threading
+
+import pytest
+
+from daemon.backend import SERVER_MODES, create_server_socket, serve
+
+
+@pytest.fixture(params=SERVER_MODES)
+def start_backend(request):
+    """Start a backend on a free port with the engine of the parameter;
+    call it with the routes, it returns the port."""
+    def start(routes):
+        server = create_server_socket("127.0.0.1", 0)
+        port = server.getsockname()[1]
+        threading.Thread(target=serve, args=(server, "127.0.0.1", port, routes, request.param),
+                         daemon=True).start()
+        return port
+    return start
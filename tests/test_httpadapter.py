@@ -0,0 +1,52 @@
+import socket
+
+import pytest
+
+from daemon.middleware import CookieAuth
+from daemon.router import Router
+from daemon.weaprous import WeApRous
+
+
+def make_app():
+    app = WeApRous()
+    app.metrics_path = None
+    app.use(CookieAuth(protected=("/index.html",)))
+
+    @app.route('/submit', methods=['POST'], skip=("auth",))
+    def submit(headers, body):
+        return {"ok": True}
+
+    app.router = Router(app.routes).compile()
+    app.compile_middleware()
+    return app
+
+
+def exchange(port, data):
+    """Send ``data`` on one connection and read until the server closes it."""
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(data)
+        received = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                return received
+            received += chunk
+
+
+@pytest.mark.parametrize("path, status", [
+    ("/nope.html", b"404"),
+    ("/index.html", b"401"),
+    ("/submit", b"405"),
+])
+def test_head_response_has_no_body_on_keep_alive_connection(start_backend, path, status):
+    port = start_backend(make_app().router)
+    data = exchange(port, "HEAD {} HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                          "GET /nope2.html HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n"
+                          .format(path).encode())
+
+    head, _, rest = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 " + status)
+    assert b"\r\nConnection: keep-alive" in head
+    assert b"\r\nContent-Length: " in head
+    # The next response starts right after the header of the HEAD one.
+    assert rest.startswith(b"HTTP/1.1 404 ")
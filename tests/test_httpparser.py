@@ -0,0 +1,18 @@
+from daemon.httpparser import HttpParser
+
+
+def test_compaction_keeps_overlapping_pipelined_bytes():
+    first = b"GET /a HTTP/1.1\r\nHost: x\r\n\r\n"
+    second = b"POST /upload HTTP/1.1\r\nHost: x\r\nContent-Length: 40\r\n\r\n" + bytes(range(48, 88))
+    parser = HttpParser(size=128)
+    # The pipelined bytes left after the first request overlap the buffer
+    # start they are moved to when more room is needed.
+    parser.feed(first + second[:70])
+    assert parser.parse()
+    assert parser.target == "/a"
+    parser.consume()
+
+    parser.feed(second[70:])
+    assert parser.parse()
+    assert parser.target == "/upload"
+    assert bytes(parser.body()) == bytes(range(48, 88))
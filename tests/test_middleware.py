@@ -0,0 +1,74 @@
+from daemon.httpadapter import HttpAdapter
+from daemon.metrics import Registry
+from daemon.middleware import CookieAuth, Middleware, RequestMetrics, Timing, response_status
+from daemon.router import Router
+from daemon.weaprous import WeApRous
+
+
+class Recorder(Middleware):
+    name = "recorder"
+
+    def __init__(self):
+        self.statuses = []
+
+    def after(self, request, response):
+        self.statuses.append(response_status(response))
+        return response
+
+
+def serve_once(app, request):
+    app.router = Router(app.routes).compile()
+    app.compile_middleware()
+    adapter = HttpAdapter("127.0.0.1", 0, None, ("127.0.0.1", 0), app.router)
+    return adapter.handle_request(request, app.router)
+
+
+def test_every_after_step_runs_when_before_short_circuits():
+    app = WeApRous()
+    app.metrics_path = None
+    recorder = app.use(Recorder())
+    app.use(CookieAuth())
+    app.use(Timing())
+
+    @app.route('/private')
+    def private(headers, body):
+        return {"secret": True}
+
+    response = serve_once(app, "GET /private HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    assert response_status(response) == 401
+    assert recorder.statuses == [401]
+    assert b"Server-Timing" not in response
+
+
+def test_timing_header_on_served_request():
+    app = WeApRous()
+    app.metrics_path = None
+    app.use(Timing())
+
+    @app.route('/public')
+    def public(headers, body):
+        return {"ok": True}
+
+    response = serve_once(app, "GET /public HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    assert response_status(response) == 200
+    assert "Server-Timing" in response.headers
+
+
+def test_request_metrics_bound_methods_and_count_failures():
+    registry = Registry()
+    app = WeApRous()
+    app.metrics_path = None
+    app.use(RequestMetrics(registry))
+
+    @app.route('/boom', methods=['GET', 'BREW'])
+    def boom(headers, body):
+        raise RuntimeError("boom")
+
+    response = serve_once(app, "GET /boom HTTP/1.1\r\nHost: localhost\r\n\r\n")
+    assert response_status(response) == 500
+    serve_once(app, "BREW /boom HTTP/1.1\r\nHost: localhost\r\n\r\n")
+
+    text = registry.render()
+    assert 'http_requests_total{route="/boom",method="GET",status="500"} 1' in text
+    assert 'http_requests_total{route="/boom",method="OTHER",status="500"} 1' in text
+    assert "BREW" not in text
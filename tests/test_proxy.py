@@ -0,0 +1,73 @@
+import socket
+import threading
+import time
+
+from daemon import proxy
+from daemon.balancer import get_upstream
+from daemon.proxycache import RESPONSE_CACHE
+
+
+def upstream_server(response, request_end=b"\r\n\r\n"):
+    """Answer every connection with ``response`` once the request received
+    ends with ``request_end``, and close it."""
+    server = socket.create_server(("127.0.0.1", 0))
+
+    def run():
+        while True:
+            conn, _ = server.accept()
+            with conn:
+                data = b""
+                while not data.endswith(request_end):
+                    data += conn.recv(65536)
+                conn.sendall(response)
+
+    threading.Thread(target=run, daemon=True).start()
+    return server.getsockname()[1]
+
+
+def proxy_request(routes, request, upload_delay=0):
+    client, server = socket.socketpair()
+    client.settimeout(5)
+    thread = threading.Thread(target=proxy.handle_client,
+                              args=("127.0.0.1", 0, server, ("127.0.0.1", 0), routes), daemon=True)
+    thread.start()
+    head, _, body = request.partition(b"\r\n\r\n")
+    client.sendall(head + b"\r\n\r\n")
+    time.sleep(upload_delay)
+    client.sendall(body)
+    data = b""
+    while True:
+        chunk = client.recv(65536)
+        if not chunk:
+            break
+        data += chunk
+    thread.join(5)
+    client.close()
+    return data
+
+
+def test_cacheable_response_cut_short_is_answered_with_502():
+    port = upstream_server(b"HTTP/1.1 200 OK\r\n"
+                           b"Cache-Control: max-age=60\r\n"
+                           b"Content-Length: 100\r\n"
+                           b"\r\n"
+                           b"only part of it")
+    routes = {"cut.local": (["127.0.0.1:{}".format(port)], "round-robin", {"cache": True})}
+    RESPONSE_CACHE.clear()
+
+    response = proxy_request(routes, b"GET /page HTTP/1.1\r\nHost: cut.local\r\n\r\n")
+
+    assert response.startswith(b"HTTP/1.1 502 ")
+    assert RESPONSE_CACHE.stats()["entries"] == 0
+
+
+def test_upstream_latency_excludes_the_client_upload():
+    port = upstream_server(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok", b"hello")
+    address = "127.0.0.1:{}".format(port)
+    routes = {"slow.local": ([address], "round-robin", {})}
+
+    response = proxy_request(routes, b"POST /upload HTTP/1.1\r\nHost: slow.local\r\n"
+                                     b"Content-Length: 5\r\n\r\nhello", upload_delay=0.3)
+
+    assert response.startswith(b"HTTP/1.1 200 ")
+    assert 0 < get_upstream(address).ewma < 0.2
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from daemon.proxycache import ResponseCache, HIT, MISS
+
+HEAD = (b"HTTP/1.1 200 OK\r\n"
+        b"Cache-Control: max-age=60\r\n"
+        b"Content-Length: 5")
+
+
+def request(target="/page", **headers):
+    return SimpleNamespace(method="GET", target=target, header=headers.get)
+
+
+def fetch(cache, parser, body, head=HEAD):
+    lookup = cache.lookup("app.local", parser)
+    entry = cache.admit(lookup, head)
+    assert entry is not None
+    cache.store(lookup, entry, body)
+    return lookup
+
+
+def test_replacing_an_entry_keeps_it_reachable():
+    cache = ResponseCache()
+    fetch(cache, request(), b"first")
+    # A no-cache request fetches anew and replaces the only variant.
+    fetch(cache, request(**{"cache-control": "no-cache"}), b"again")
+
+    lookup = cache.lookup("app.local", request())
+    assert lookup.state == HIT
+    assert lookup.entry.body == b"again"
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == lookup.entry.memory
+
+
+def test_changed_vary_drops_other_variants():
+    cache = ResponseCache()
+    fetch(cache, request(**{"accept-encoding": "gzip"}), b"gzip!",
+          HEAD + b"\r\nVary: Accept-Encoding")
+    fetch(cache, request(), b"plain")
+
+    assert cache.lookup("app.local", request(**{"accept-encoding": "gzip"})).entry.body == b"plain"
+    assert cache.stats()["entries"] == 1
+    assert cache.lookup("app.local", request("/other")).state == MISS
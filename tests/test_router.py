@@ -0,0 +1,74 @@
+import socket
+
+import pytest
+
+from daemon.router import Router
+from daemon.weaprous import WeApRous
+
+
+def handler(**params):
+    return params
+
+
+def other(**params):
+    return params
+
+
+def test_head_falls_back_to_get():
+    router = Router({("GET", "/static"): handler,
+                     ("GET", "/peers/<int:port>"): handler,
+                     ("GET", "/files/*"): handler,
+                     ("GET", "/both"): handler,
+                     ("HEAD", "/both"): other}).compile()
+
+    assert router.match("HEAD", "/static") == (handler, {}, None)
+    assert router.match("HEAD", "/peers/80") == (handler, {"port": 80}, None)
+    assert router.match("HEAD", "/files/a/b")[0] is handler
+    assert router.match("HEAD", "/both")[0] is other
+    assert router.match("DELETE", "/peers/80") == (None, None, ["GET", "HEAD"])
+
+
+def test_post_only_route_does_not_answer_head():
+    router = Router({("POST", "/submit"): handler}).compile()
+    assert router.match("HEAD", "/submit") == (None, None, ["POST"])
+
+
+@pytest.mark.parametrize("segment", ["nan", "inf", "-Infinity", "NaN"])
+def test_float_rejects_non_finite_values(segment):
+    router = Router({("GET", "/scale/<float:factor>"): handler}).compile()
+    assert router.match("GET", "/scale/" + segment) == (None, None, None)
+
+
+def test_float_accepts_finite_values():
+    router = Router({("GET", "/scale/<float:factor>"): handler}).compile()
+    assert router.match("GET", "/scale/1.5") == (handler, {"factor": 1.5}, None)
+
+
+def test_head_to_raw_string_hook_sends_no_body(start_backend):
+    app = WeApRous()
+    app.metrics_path = None
+
+    @app.route('/raw')
+    def raw(headers, body):
+        return "HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 5\r\n\r\nhello"
+
+    app.router = Router(app.routes).compile()
+    app.compile_middleware()
+    port = start_backend(app.router)
+
+    with socket.create_connection(("127.0.0.1", port), timeout=5) as sock:
+        sock.sendall(b"HEAD /raw HTTP/1.1\r\nHost: localhost\r\n\r\n"
+                     b"GET /raw HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n")
+        data = b""
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+
+    head, _, rest = data.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200 ")
+    assert b"\r\nContent-Length: 5" in head
+    assert b"\r\nConnection: keep-alive" in head
+    assert rest.startswith(b"HTTP/1.1 200 ")
+    assert rest.endswith(b"\r\n\r\nhello")
@@ -0,0 +1,91 @@
+import socket
+import threading
+
+import pytest
+
+from daemon.assetcache import ASSET_CACHE
+from daemon.httpadapter import HttpAdapter
+
+PATH = "/static/css/styles.css"
+
+
+def serve(routes=None):
+    """Run the threading engine on one end of a socket pair; return the other."""
+    client, server = socket.socketpair()
+    adapter = HttpAdapter("127.0.0.1", 0, server, ("127.0.0.1", 0), routes or {})
+    thread = threading.Thread(target=adapter.handle_client,
+                              args=(server, ("127.0.0.1", 0), routes or {}), daemon=True)
+    thread.start()
+    client.settimeout(5)
+    return client
+
+
+def read_response(sock, buf, head=False):
+    """Read one response off ``sock``; return (status, headers, body, rest)."""
+    while b"\r\n\r\n" not in buf:
+        data = sock.recv(65536)
+        assert data, "connection closed before the response header"
+        buf += data
+    head_end = buf.index(b"\r\n\r\n")
+    lines = buf[:head_end].decode('latin-1').split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = 0 if head else int(headers.get("content-length", 0))
+    buf = buf[head_end + 4:]
+    while len(buf) < length:
+        data = sock.recv(65536)
+        assert data, "connection closed before the response body"
+        buf += data
+    return int(lines[0].split()[1]), headers, buf[:length], buf[length:]
+
+
+@pytest.fixture(params=["cached", "sendfile"])
+def asset_mode(request, monkeypatch):
+    ASSET_CACHE.clear()
+    if request.param == "sendfile":
+        monkeypatch.setattr(ASSET_CACHE, "max_asset_size", 0)
+    yield request.param
+    ASSET_CACHE.clear()
+
+
+def test_head_then_get_on_keep_alive_connection(asset_mode):
+    with open(PATH.lstrip("/"), "rb") as f:
+        expected = f.read()
+    client = serve()
+    request = "{} {} HTTP/1.1\r\nHost: localhost\r\n\r\n"
+    client.sendall((request.format("HEAD", PATH) + request.format("GET", PATH)).encode())
+
+    status, headers, body, rest = read_response(client, b"", head=True)
+    assert status == 200
+    assert headers["content-length"] == str(len(expected))
+    assert headers["connection"] == "keep-alive"
+
+    status, headers, body, rest = read_response(client, rest)
+    assert status == 200
+    assert body == expected
+    assert rest == b""
+    client.close()
+
+
+def test_cached_asset_is_sent_without_copying_the_body(asset_mode):
+    if asset_mode != "cached":
+        pytest.skip("only cached assets are held in memory")
+    adapter = HttpAdapter("127.0.0.1", 0, None, ("127.0.0.1", 0), {})
+    response = adapter.handle_request("GET {} HTTP/1.1\r\nHost: localhost\r\n\r\n".format(PATH), {})
+    assert isinstance(response, list)
+    assert response[1] is ASSET_CACHE.get(PATH).content
+
+
+def test_range_of_cached_asset(asset_mode):
+    with open(PATH.lstrip("/"), "rb") as f:
+        expected = f.read()
+    client = serve()
+    client.sendall("GET {} HTTP/1.1\r\nHost: localhost\r\nRange: bytes=10-19\r\n\r\n"
+                   .format(PATH).encode())
+    status, headers, body, rest = read_response(client, b"")
+    assert status == 206
+    assert headers["connection"] == "keep-alive"
+    assert body == expected[10:20]
+    client.close()
@@ -0,0 +1,33 @@
+import http.client
+
+from daemon.router import Router
+from daemon.weaprous import WeApRous
+
+
+def make_app():
+    app = WeApRous()
+    app.metrics_path = None
+
+    @app.route('/echo', methods=['POST'])
+    def echo(request):
+        def chunks():
+            # Read only while the response is being sent.
+            for chunk in request.iter_body(4):
+                yield bytes(chunk).upper()
+        return chunks()
+
+    app.router = Router(app.routes).compile()
+    app.compile_middleware()
+    return app
+
+
+def test_stream_reads_chunked_request_body(start_backend):
+    conn = http.client.HTTPConnection("127.0.0.1", start_backend(make_app().router), timeout=5)
+    for _ in range(2):
+        # Twice on one connection: the body is released after the stream.
+        conn.request("POST", "/echo", body=iter([b"hello ", b"streamed ", b"world"]),
+                     encode_chunked=True)
+        response = conn.getresponse()
+        assert response.status == 200
+        assert response.read() == b"HELLO STREAMED WORLD"
+    conn.close()
@@ -0,0 +1,40 @@
+import threading
+
+import pytest
+
+from daemon.upstream import PoolTimeout, UpstreamPool
+
+
+def test_checkout_waits_for_a_checkin():
+    pool = UpstreamPool("127.0.0.1", 9, max_total=1)
+    first = pool.checkout()
+    got = []
+    waiter = threading.Thread(target=lambda: got.append(pool.checkout(timeout=5)))
+    waiter.start()
+    first.release(False)
+    waiter.join(5)
+    assert len(got) == 1
+    got[0].release(False)
+
+
+def test_checkout_times_out_on_a_full_pool():
+    pool = UpstreamPool("127.0.0.1", 9, max_total=1)
+    first = pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout(timeout=0.05)
+    first.release(False)
+    # The timed out checkout left no waiter behind: the slot is free again.
+    pool.checkout(timeout=0).release(False)
+
+
+def test_grant_racing_a_timeout_is_kept():
+    pool = UpstreamPool("127.0.0.1", 9, max_total=1)
+    first = pool.checkout()
+    granted = []
+    assert pool.acquire(granted.append) is None
+    first.release(False)
+    # The checkout timed out just after the hand-over: it cannot withdraw
+    # and must use the connection it was given.
+    assert not pool.cancel(granted.append)
+    assert len(granted) == 1
+    granted[0].release(False)